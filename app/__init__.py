@@ -1,3 +1,4 @@
+import logging
 import os
 from pathlib import Path
 from flask import Flask
@@ -21,18 +22,119 @@ def create_app(config=None):
     # Configuration
     app.config["MEDIA_ROOT"] = str(media_path)
     app.config["THUMBNAIL_CACHE_ROOT"] = str(thumbnail_cache_path)
+    # Disk cache budget in MiB (None for unbounded) and what to evict first ("lru" or "lfu")
+    app.config["THUMBNAIL_CACHE_MAX_MB"] = None
+    app.config["THUMBNAIL_CACHE_EVICTION"] = "lru"
+    # Disk cache layout: "files" (one file per entry) or "packed" (segment files + SQLite index)
+    app.config["THUMBNAIL_CACHE_BACKEND"] = "files"
+    # Set to a file path (e.g. instance/directory_index.sqlite3) to persist listings
+    app.config["DIRECTORY_INDEX_DB"] = None
+    # Set to a file path (e.g. instance/catalog.sqlite3) to enable /api/search
+    app.config["CATALOG_DB"] = None
+    # Per-process memory budget for hot thumbnails (0 disables)
+    app.config["THUMBNAIL_MEMORY_CACHE_MB"] = 64
+    # Allowed thumbnail sizes (?w=) and static formats in order of preference
+    app.config["THUMBNAIL_SIZES"] = (150, 300, 600)
+    app.config["THUMBNAIL_FORMATS"] = ("avif", "webp", "jpeg")
+    # Video thumbnails sample frames from this fraction of the duration onwards
+    app.config["VIDEO_THUMBNAIL_OFFSET"] = 0.1
+    app.config["VIDEO_THUMBNAIL_SAMPLES"] = 5
+    # Frames in the hover-scrub preview sprite sheet of each video
+    app.config["PREVIEW_FRAME_COUNT"] = 10
+    # Animated thumbnails: frame cap, size budget in bytes and format ("gif" or "webp")
+    app.config["ANIMATED_THUMBNAIL_MAX_FRAMES"] = 48
+    app.config["ANIMATED_THUMBNAIL_MAX_BYTES"] = 512 * 1024
+    app.config["ANIMATED_THUMBNAIL_FORMAT"] = "gif"
+    # Process pool for thumbnail/preview generation (None generates in the request thread);
+    # beyond THUMBNAIL_POOL_MAX_QUEUE pending jobs requests get 503 + Retry-After
+    app.config["THUMBNAIL_POOL_WORKERS"] = None
+    app.config["THUMBNAIL_POOL_MAX_QUEUE"] = 32
+    app.config["THUMBNAIL_POOL_TIMEOUT"] = 60
+    app.config["THUMBNAIL_RETRY_AFTER"] = 2
+    # Poll MEDIA_ROOT for changes every N seconds (None disables the watcher)
+    app.config["WATCH_INTERVAL"] = None
+    # Level of the app's log messages (DEBUG also logs every thumbnail cache hit and miss)
+    app.config["LOG_LEVEL"] = "INFO"
+    # Thumbnail pre-generation (interval in seconds, None disables the scheduler)
+    app.config["THUMBNAIL_WARM_WORKERS"] = None
+    app.config["THUMBNAIL_WARM_INTERVAL"] = None
+
+    # Settings from FLASK_* environment variables (e.g. FLASK_THUMBNAIL_POOL_WORKERS=2)
+    app.config.from_prefixed_env()
 
     if config:
         app.config.update(config)
 
+    # Log the app's modules to stderr unless the host (e.g. gunicorn) configured logging
+    app_logger = logging.getLogger("app")
+    app_logger.setLevel(app.config["LOG_LEVEL"])
+    if not app_logger.handlers and not logging.getLogger().handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+        app_logger.addHandler(handler)
+
     # Initialize thumbnail cache
-    from app.media_handler import set_thumbnail_cache_root
-    set_thumbnail_cache_root(app.config["THUMBNAIL_CACHE_ROOT"])
+    from app.media_handler import MEDIA_HANDLER_CONFIG_KEYS, configure_media_handler, set_thumbnail_pool
+    configure_media_handler(app.config)
+
+    # Start the thumbnail generation pool if configured
+    if app.config["THUMBNAIL_POOL_WORKERS"]:
+        from app.thumbnail_pool import ThumbnailPool
+        app.extensions["thumbnail_pool"] = ThumbnailPool(
+            app.config["THUMBNAIL_POOL_WORKERS"],
+            app.config["THUMBNAIL_POOL_MAX_QUEUE"],
+            {key: app.config[key] for key in MEDIA_HANDLER_CONFIG_KEYS},
+            timeout=app.config["THUMBNAIL_POOL_TIMEOUT"],
+        )
+    set_thumbnail_pool(app.extensions.get("thumbnail_pool"))
+
+    # Request timing and state gauges for /metrics
+    from app.metrics import (
+        THUMBNAIL_POOL_QUEUE_DEPTH,
+        THUMBNAIL_POOL_REJECTED,
+        THUMBNAIL_POOL_RESTARTS,
+        install_request_metrics,
+    )
+    install_request_metrics(app)
+    pool = app.extensions.get("thumbnail_pool")
+    if pool is not None:
+        THUMBNAIL_POOL_QUEUE_DEPTH.set_function(lambda: pool.queue_depth)
+        # Exported as 0 before the first event
+        THUMBNAIL_POOL_REJECTED.labels()
+        THUMBNAIL_POOL_RESTARTS.labels()
+
+    from app.thumbnail_cache import set_memory_cache_size
+    set_memory_cache_size(app.config["THUMBNAIL_MEMORY_CACHE_MB"])
+
+    # Initialize directory index
+    from app.directory_index import set_directory_index_db
+    set_directory_index_db(app.config["DIRECTORY_INDEX_DB"])
+
+    # Initialize media catalog
+    from app.catalog import set_catalog_db
+    set_catalog_db(app.config["CATALOG_DB"])
+
+    # Background tasks run in one process per instance directory: the first app
+    # process (e.g. gunicorn worker) to take the lock, not every one of them
+    if app.config["THUMBNAIL_WARM_INTERVAL"] or app.config["WATCH_INTERVAL"]:
+        from app.concurrency import hold_file_lock
+        background_lock = hold_file_lock(instance_path / ".background.lock")
+        if background_lock is None:
+            app_logger.info("Background tasks run in another process")
+        else:
+            app.extensions["background_lock"] = background_lock
+            start_background_tasks(app)
 
     # Register blueprints
     from app.routes import bp
     app.register_blueprint(bp)
 
+    # Register CLI commands
+    from app.cli import catalog_cli, media_cli, thumbnails_cli
+    app.cli.add_command(thumbnails_cli)
+    app.cli.add_command(catalog_cli)
+    app.cli.add_command(media_cli)
+
     # Error handlers
     @app.errorhandler(404)
     def not_found(error):
@@ -46,4 +148,28 @@ def create_app(config=None):
     def internal_error(error):
         return {"error": "Internal server error"}, 500
 
+    from app.thumbnail_pool import ThumbnailPoolSaturated
+
+    @app.errorhandler(ThumbnailPoolSaturated)
+    def thumbnail_pool_saturated(error):
+        return {"error": "Thumbnail generation is busy"}, 503, {"Retry-After": str(app.config["THUMBNAIL_RETRY_AFTER"])}
+
     return app
+
+
+def start_background_tasks(app):
+    """Start the thumbnail warm scheduler and the media watcher if configured."""
+    if app.config["THUMBNAIL_WARM_INTERVAL"]:
+        from app.thumbnail_worker import ThumbnailWarmScheduler
+        app.extensions["thumbnail_warm"] = ThumbnailWarmScheduler(
+            app.config["MEDIA_ROOT"],
+            app.config,
+            app.config["THUMBNAIL_WARM_INTERVAL"],
+            workers=app.config["THUMBNAIL_WARM_WORKERS"],
+        )
+        app.extensions["thumbnail_warm"].start()
+
+    if app.config["WATCH_INTERVAL"]:
+        from app.media_watcher import MediaWatcher
+        app.extensions["media_watcher"] = MediaWatcher(app.config["MEDIA_ROOT"], app.config["WATCH_INTERVAL"])
+        app.extensions["media_watcher"].start()
@@ -0,0 +1,364 @@
+"""On-disk catalog of all media files with a full-text name index."""
+import base64
+import json
+import logging
+import os
+import re
+import time
+from pathlib import Path
+
+from app.concurrency import ThreadLocalConnections
+from app.media_handler import SUPPORTED_IMAGE_FORMATS, SUPPORTED_MEDIA_FORMATS, get_media_dimensions
+
+logger = logging.getLogger(__name__)
+
+
+# Sort keys accepted by search, mapped to their (indexed) columns
+SORT_COLUMNS = {
+    "name": "name",
+    "path": "path",
+    "mtime": "mtime_ns",
+    "size": "size",
+}
+
+# Upper bound of search results per page
+MAX_SEARCH_LIMIT = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    dir TEXT NOT NULL,
+    name TEXT NOT NULL COLLATE NOCASE,
+    media_type TEXT NOT NULL,
+    suffix TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    width INTEGER,
+    height INTEGER
+);
+CREATE INDEX IF NOT EXISTS files_dir ON files (dir);
+CREATE INDEX IF NOT EXISTS files_name ON files (name, id);
+CREATE INDEX IF NOT EXISTS files_mtime ON files (mtime_ns, id);
+CREATE INDEX IF NOT EXISTS files_size ON files (size, id);
+CREATE INDEX IF NOT EXISTS files_type_name ON files (media_type, name, id);
+CREATE INDEX IF NOT EXISTS files_type_mtime ON files (media_type, mtime_ns, id);
+CREATE INDEX IF NOT EXISTS files_type_size ON files (media_type, size, id);
+
+CREATE TABLE IF NOT EXISTS directories (
+    path TEXT PRIMARY KEY,
+    parent TEXT,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS directories_parent ON directories (parent);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(
+    name, path, content='files', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS files_ai AFTER INSERT ON files BEGIN
+    INSERT INTO files_fts (rowid, name, path) VALUES (new.id, new.name, new.path);
+END;
+CREATE TRIGGER IF NOT EXISTS files_ad AFTER DELETE ON files BEGIN
+    INSERT INTO files_fts (files_fts, rowid, name, path) VALUES ('delete', old.id, old.name, old.path);
+END;
+CREATE TRIGGER IF NOT EXISTS files_au AFTER UPDATE OF name, path ON files BEGIN
+    INSERT INTO files_fts (files_fts, rowid, name, path) VALUES ('delete', old.id, old.name, old.path);
+    INSERT INTO files_fts (rowid, name, path) VALUES (new.id, new.name, new.path);
+END;
+"""
+
+
+def join_rel(rel_dir, name):
+    """Join a relative directory ('' for the root) and a name with '/'."""
+    return f"{rel_dir}/{name}" if rel_dir else name
+
+
+def encode_cursor(value, row_id):
+    """Encode the sort value and id of the last row into an opaque cursor."""
+    return base64.urlsafe_b64encode(json.dumps([value, row_id]).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor from encode_cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise ValueError("Invalid cursor") from None
+    if not isinstance(row_id, int) or not isinstance(value, (str, int)):
+        raise ValueError("Invalid cursor")
+    return value, row_id
+
+
+def build_match_query(q):
+    """Turn free text into an FTS5 query matching every word as a prefix."""
+    tokens = re.findall(r"\w+", q)
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+class MediaCatalog:
+    """
+    SQLite catalog of every media file below MEDIA_ROOT.
+
+    Rows hold the relative path, type, size, mtime and pixel dimensions; an
+    FTS5 table indexes names and paths. The catalog is filled by crawl(),
+    which only rescans directories whose mtime changed since the last crawl
+    (unless full=True); in unchanged directories it stats the cataloged
+    files to catch files rewritten in place. Re-crawling a large, mostly
+    unchanged tree costs about one stat per directory and file.
+
+    Each thread gets its own connection; the database uses WAL so searches
+    keep working while a crawl (possibly in another process) writes.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._connections = ThreadLocalConnections(self.db_path)
+        db = self._connect()
+        db.executescript(SCHEMA)
+        db.commit()
+
+    def _connect(self):
+        return self._connections.get()
+
+    def crawl(self, media_root, full=False, progress=None):
+        """
+        Bring the catalog up to date with the files below media_root.
+
+        Args:
+            media_root: Root media directory
+            full: Rescan every directory, not only those whose mtime changed
+            progress: Optional callback called with the stats dict after each directory
+
+        Returns:
+            Dict with directories, skipped (unchanged directories), added,
+            updated, removed and elapsed
+        """
+        media_root = Path(media_root).resolve()
+        db = self._connect()
+        stats = {"directories": 0, "skipped": 0, "added": 0, "updated": 0, "removed": 0, "elapsed": 0.0}
+        began = time.perf_counter()
+
+        known = dict(db.execute("SELECT path, mtime_ns FROM directories"))
+        seen = set()
+        pending = [""]
+        while pending:
+            rel_dir = pending.pop()
+            try:
+                mtime_ns = os.stat(media_root / rel_dir).st_mtime_ns
+            except OSError:
+                continue
+            seen.add(rel_dir)
+            stats["directories"] += 1
+
+            if not full and known.get(rel_dir) == mtime_ns:
+                # Entries are unchanged; files and subdirectories may still have changed
+                stats["skipped"] += 1
+                self._refresh_files(db, media_root, rel_dir, stats)
+                db.commit()
+                pending.extend(
+                    row[0] for row in db.execute("SELECT path FROM directories WHERE parent = ?", (rel_dir,))
+                )
+            else:
+                try:
+                    pending.extend(self._sync_directory(db, media_root, rel_dir, mtime_ns, stats))
+                except OSError as e:
+                    logger.warning("Failed to catalog %s: %s", rel_dir or ".", e)
+                db.commit()
+
+            stats["elapsed"] = time.perf_counter() - began
+            if progress:
+                progress(stats)
+
+        # Directories that disappeared since the last crawl
+        for rel_dir in set(known) - seen:
+            stats["removed"] += self._remove_directory_rows(db, rel_dir)
+        db.commit()
+
+        stats["elapsed"] = time.perf_counter() - began
+        return stats
+
+    def _sync_directory(self, db, media_root, rel_dir, mtime_ns, stats):
+        """Reconcile one directory's rows with its entries; return its subdirectories."""
+        existing = {
+            name: (size, file_mtime)
+            for name, size, file_mtime in db.execute(
+                "SELECT name, size, mtime_ns FROM files WHERE dir = ?", (rel_dir,)
+            )
+        }
+        subdirectories = []
+        present = set()
+
+        with os.scandir(media_root / rel_dir) as it:
+            for item in it:
+                name = item.name
+                if name.startswith('.'):
+                    continue
+                try:
+                    if item.is_dir():
+                        subdirectories.append(join_rel(rel_dir, name))
+                        continue
+                    suffix = os.path.splitext(name)[1].lower()
+                    if suffix not in SUPPORTED_MEDIA_FORMATS:
+                        continue
+                    st = item.stat()
+                except OSError:
+                    continue
+
+                present.add(name)
+                previous = existing.get(name)
+                if previous == (st.st_size, st.st_mtime_ns):
+                    continue
+                self._upsert_file(db, media_root, rel_dir, name, suffix, st)
+                stats["added" if previous is None else "updated"] += 1
+
+        for name in set(existing) - present:
+            db.execute("DELETE FROM files WHERE path = ?", (join_rel(rel_dir, name),))
+            stats["removed"] += 1
+
+        # Forget subdirectories that are gone so they are not revisited
+        known_subdirectories = {
+            row[0] for row in db.execute("SELECT path FROM directories WHERE parent = ?", (rel_dir,))
+        }
+        for gone in known_subdirectories - set(subdirectories):
+            stats["removed"] += self._remove_directory_rows(db, gone)
+
+        db.execute(
+            "INSERT INTO directories (path, parent, mtime_ns) VALUES (?, ?, ?) "
+            "ON CONFLICT(path) DO UPDATE SET mtime_ns = excluded.mtime_ns",
+            (rel_dir, None if rel_dir == "" else os.path.dirname(rel_dir), mtime_ns),
+        )
+        return subdirectories
+
+    def _refresh_files(self, db, media_root, rel_dir, stats):
+        """Update the rows of files rewritten in place in a directory whose entries are unchanged."""
+        rows = db.execute("SELECT name, suffix, size, mtime_ns FROM files WHERE dir = ?", (rel_dir,)).fetchall()
+        for name, suffix, size, file_mtime in rows:
+            try:
+                st = os.stat(media_root / join_rel(rel_dir, name))
+            except OSError:
+                # Removed meanwhile: the directory's mtime changed, so the next crawl rescans it
+                continue
+            if (st.st_size, st.st_mtime_ns) != (size, file_mtime):
+                self._upsert_file(db, media_root, rel_dir, name, suffix, st)
+                stats["updated"] += 1
+
+    def _upsert_file(self, db, media_root, rel_dir, name, suffix, st):
+        rel_path = join_rel(rel_dir, name)
+        width, height = get_media_dimensions(media_root / rel_path)
+        media_type = "image" if suffix in SUPPORTED_IMAGE_FORMATS else "video"
+        db.execute(
+            "INSERT INTO files (path, dir, name, media_type, suffix, size, mtime_ns, width, height) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(path) DO UPDATE SET size = excluded.size, mtime_ns = excluded.mtime_ns, "
+            "width = excluded.width, height = excluded.height",
+            (rel_path, rel_dir, name, media_type, suffix, st.st_size, st.st_mtime_ns, width, height),
+        )
+
+    def _remove_directory_rows(self, db, rel_dir):
+        """Delete a directory and everything below it; return the number of files removed."""
+        prefix = rel_dir + "/"
+        removed = db.execute(
+            "DELETE FROM files WHERE dir = ? OR substr(dir, 1, ?) = ?", (rel_dir, len(prefix), prefix)
+        ).rowcount
+        db.execute(
+            "DELETE FROM directories WHERE path = ? OR substr(path, 1, ?) = ?", (rel_dir, len(prefix), prefix)
+        )
+        return removed
+
+    def search(self, q=None, media_type=None, min_size=None, sort="name", descending=False, limit=50, cursor=None):
+        """
+        Search the catalog with keyset pagination.
+
+        Args:
+            q: Free text; every word must prefix-match a word of the name or path
+            media_type: "image" or "video"
+            min_size: Minimum file size in bytes
+            sort: One of SORT_COLUMNS
+            descending: Reverse the sort order
+            limit: Maximum number of results (capped at MAX_SEARCH_LIMIT)
+            cursor: next_cursor of the previous page
+
+        Returns:
+            Tuple of (list of result dicts, next cursor or None)
+
+        Raises:
+            ValueError: For an unknown sort key or a malformed cursor
+        """
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"Unknown sort key: {sort}")
+        column = SORT_COLUMNS[sort]
+        limit = max(1, min(limit, MAX_SEARCH_LIMIT))
+
+        clauses = []
+        params = []
+        match = build_match_query(q or "")
+        if match:
+            clauses.append("id IN (SELECT rowid FROM files_fts WHERE files_fts MATCH ?)")
+            params.append(match)
+        if media_type:
+            clauses.append("media_type = ?")
+            params.append(media_type)
+        if min_size:
+            clauses.append("size >= ?")
+            params.append(min_size)
+        if cursor:
+            value, row_id = decode_cursor(cursor)
+            clauses.append(f"({column}, id) {'<' if descending else '>'} (?, ?)")
+            params.extend([value, row_id])
+
+        direction = "DESC" if descending else "ASC"
+        sql = (
+            f"SELECT {column}, id, path, name, media_type, suffix, size, mtime_ns, width, height FROM files"
+            + (" WHERE " + " AND ".join(clauses) if clauses else "")
+            + f" ORDER BY {column} {direction}, id {direction} LIMIT ?"
+        )
+        rows = self._connect().execute(sql, params + [limit + 1]).fetchall()
+
+        results = []
+        for _, row_id, path, name, row_type, suffix, size, mtime_ns, width, height in rows[:limit]:
+            results.append({
+                "name": name,
+                "path": path,
+                "is_dir": False,
+                "is_media": True,
+                "type": "file",
+                "media_type": row_type,
+                "suffix": suffix,
+                "size": size,
+                "mtime": mtime_ns / 1e9,
+                "width": width,
+                "height": height,
+            })
+
+        # One extra row tells whether there is a next page
+        next_cursor = None
+        if len(rows) > limit:
+            sort_value, row_id = rows[limit - 1][:2]
+            next_cursor = encode_cursor(sort_value, row_id)
+        return results, next_cursor
+
+    def count(self):
+        """Get the number of cataloged files."""
+        return self._connect().execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+
+# Shared catalog (configured in create_app; None when CATALOG_DB is unset)
+CATALOG = None
+
+
+def set_catalog_db(db_path):
+    """Set the SQLite file of the media catalog (None disables search)."""
+    global CATALOG
+    CATALOG = MediaCatalog(db_path) if db_path else None
+
+
+def get_catalog():
+    """Get the shared media catalog, or None if disabled."""
+    return CATALOG
@@ -0,0 +1,141 @@
+"""Flask CLI commands."""
+from pathlib import Path
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from app.security import secure_path
+
+
+def throttled_progress(describe, interval=1.0):
+    """Get a progress callback that echoes describe(stats) at most once per interval seconds."""
+    last_report = [0.0]
+
+    def report(stats):
+        if stats["elapsed"] - last_report[0] < interval:
+            return
+        last_report[0] = stats["elapsed"]
+        click.echo(describe(stats))
+
+    return report
+
+
+thumbnails_cli = AppGroup("thumbnails", help="Manage the thumbnail cache.")
+
+
+@thumbnails_cli.command("warm")
+@click.argument("path", required=False, default="")
+@click.option("--workers", type=int, default=None, help="Worker processes (default: THUMBNAIL_WARM_WORKERS or CPU count).")
+def warm_command(path, workers):
+    """Pre-generate missing thumbnails below PATH (relative to MEDIA_ROOT)."""
+    from app.thumbnail_worker import warm_thumbnails
+
+    media_root = Path(current_app.config["MEDIA_ROOT"])
+    start = secure_path(media_root, path)
+    if start is None or not start.is_dir():
+        raise click.BadParameter(f"Not a directory inside MEDIA_ROOT: {path}", param_hint="PATH")
+
+    if workers is None:
+        workers = current_app.config["THUMBNAIL_WARM_WORKERS"]
+
+    def describe(stats):
+        done = stats["generated"] + stats["failed"] + stats["skipped"]
+        return f"{done}/{stats['total']} processed, {stats['generated']} generated, {stats['rate']:.1f} files/s"
+
+    stats = warm_thumbnails(
+        media_root,
+        current_app.config,
+        start=start,
+        workers=workers,
+        progress=throttled_progress(describe),
+    )
+    click.echo(
+        f"Done: {stats['total']} files, {stats['generated']} generated, "
+        f"{stats['skipped']} fresh, {stats['failed']} failed "
+        f"in {stats['elapsed']:.1f}s ({stats['rate']:.1f} files/s)"
+    )
+
+
+@thumbnails_cli.command("gc")
+@click.option("--max-mb", type=float, default=None, help="Size budget in MiB (default: THUMBNAIL_CACHE_MAX_MB).")
+@click.option("--max-age-days", type=float, default=None, help="Also evict entries not accessed for this many days.")
+def gc_command(max_mb, max_age_days):
+    """Evict cached thumbnails beyond the size budget, least valuable first."""
+    from app.media_handler import get_thumbnail_store
+
+    store = get_thumbnail_store()
+    if store is None:
+        raise click.UsageError("THUMBNAIL_CACHE_ROOT is not configured.")
+
+    max_bytes = int(max_mb * 1024 * 1024) if max_mb else None
+    max_age = max_age_days * 86400 if max_age_days else None
+    if not (max_bytes or store.max_bytes or max_age):
+        click.echo("No budget configured (THUMBNAIL_CACHE_MAX_MB, --max-mb or --max-age-days); only reporting usage.")
+
+    stats = store.gc(max_bytes=max_bytes, max_age=max_age)
+    click.echo(
+        f"Done: {stats['evicted']} entries evicted, {stats['bytes_reclaimed'] / 1024 / 1024:.1f} MiB reclaimed; "
+        f"{stats['entries']} entries, {stats['bytes'] / 1024 / 1024:.1f} MiB left "
+        f"in {stats['elapsed']:.1f}s ({store.eviction})"
+    )
+    if "segments_compacted" in stats:
+        click.echo(
+            f"Compacted {stats['segments_compacted']} segments, "
+            f"{stats['compacted_bytes'] / 1024 / 1024:.1f} MiB of disk space freed; "
+            f"{stats['segment_bytes'] / 1024 / 1024:.1f} MiB on disk"
+        )
+
+
+catalog_cli = AppGroup("catalog", help="Manage the media search catalog.")
+
+
+@catalog_cli.command("crawl")
+@click.option("--full", is_flag=True, help="Rescan every directory, not only those whose mtime changed.")
+def crawl_command(full):
+    """Bring the search catalog (CATALOG_DB) up to date with MEDIA_ROOT."""
+    from app.catalog import get_catalog
+
+    catalog = get_catalog()
+    if catalog is None:
+        raise click.UsageError("CATALOG_DB is not configured.")
+
+    def describe(stats):
+        return (
+            f"{stats['directories']} directories ({stats['skipped']} unchanged), "
+            f"{stats['added']} added, {stats['updated']} updated, {stats['removed']} removed"
+        )
+
+    stats = catalog.crawl(current_app.config["MEDIA_ROOT"], full=full, progress=throttled_progress(describe))
+    click.echo(
+        f"Done: {stats['directories']} directories ({stats['skipped']} unchanged), "
+        f"{stats['added']} added, {stats['updated']} updated, {stats['removed']} removed "
+        f"in {stats['elapsed']:.1f}s; {catalog.count()} files cataloged"
+    )
+
+
+media_cli = AppGroup("media", help="Watch the media directory.")
+
+
+@media_cli.command("watch")
+@click.option("--interval", type=float, default=None, help="Seconds between polls (default: WATCH_INTERVAL or 5).")
+def watch_command(interval):
+    """Apply changes below MEDIA_ROOT to the caches and catalog until interrupted."""
+    import time
+
+    from app.media_watcher import MediaWatcher
+
+    interval = interval or current_app.config["WATCH_INTERVAL"] or 5.0
+    watcher = MediaWatcher(current_app.config["MEDIA_ROOT"], interval)
+    click.echo(f"Watching {watcher.media_root} every {interval:g}s")
+    try:
+        while True:
+            stats = watcher.poll()
+            if stats["events"]:
+                click.echo(
+                    f"{stats['created']} created, {stats['modified']} modified, "
+                    f"{stats['deleted']} deleted, {stats['regenerated']} thumbnails generated"
+                )
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,87 @@
+"""Cross-process file locks and per-thread SQLite connections shared by the stores."""
+import sqlite3
+import threading
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: file locks do not exclude other processes
+    fcntl = None
+
+
+@contextmanager
+def file_lock(path, wait=True):
+    """
+    Hold an exclusive flock on a lock file.
+
+    Only other processes (and other open files) are excluded; threads of
+    one process should also share a threading lock.
+
+    Args:
+        path: Lock file path (created with its directory if missing)
+        wait: Wait for the current holder instead of giving up
+
+    Yields:
+        True if the lock is held, False if wait is False and it was taken
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a+b") as lock_file:
+        if fcntl is None:
+            yield True
+            return
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | (0 if wait else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def hold_file_lock(path):
+    """
+    Take an flock without waiting, to be held for the life of the process.
+
+    Used to elect one process of a group (e.g. gunicorn workers) for
+    background work; the lock is released when the holder exits, so a
+    restarted worker can take over.
+
+    Args:
+        path: Lock file path
+
+    Returns:
+        ExitStack holding the lock (close() releases it), or None if another process holds it
+    """
+    stack = ExitStack()
+    if stack.enter_context(file_lock(path, wait=False)):
+        return stack
+    stack.close()
+    return None
+
+
+class ThreadLocalConnections:
+    """
+    One SQLite connection per thread to a database in WAL mode.
+
+    WAL lets readers keep working while a writer (possibly in another
+    process) commits; writers wait up to timeout seconds for each other.
+    """
+
+    def __init__(self, db_path, timeout=30):
+        self.db_path = Path(db_path)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def get(self):
+        """Get the calling thread's connection, opening it on first use."""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(str(self.db_path), timeout=self.timeout)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
@@ -0,0 +1,357 @@
+"""Cached, pre-sorted directory listings keyed by directory mtime."""
+import base64
+import json
+import logging
+import os
+import sqlite3
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from pathlib import Path
+
+from app.concurrency import ThreadLocalConnections
+
+logger = logging.getLogger(__name__)
+
+
+# Number of directories kept in the in-process cache
+MAX_CACHED_DIRECTORIES = 256
+
+# Orders files of a listing can be sorted in (directories always come first, by name)
+SORT_FIELDS = ("name", "mtime", "size")
+
+
+class IndexEntry:
+    """A single directory entry with the stat results needed for listing."""
+
+    __slots__ = ("name", "is_dir", "size", "mtime_ns")
+
+    def __init__(self, name, is_dir, size, mtime_ns):
+        self.name = name
+        self.is_dir = is_dir
+        self.size = size
+        self.mtime_ns = mtime_ns
+
+    def to_row(self):
+        return [self.name, self.is_dir, self.size, self.mtime_ns]
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*row)
+
+
+def scan_directory(dirpath):
+    """
+    Read a directory in a single os.scandir pass.
+
+    Entry types come from the cached DirEntry data, so each entry costs at
+    most one stat call (for size and mtime).
+
+    Args:
+        dirpath: Path to directory
+
+    Returns:
+        List of IndexEntry objects sorted by sort_key
+    """
+    entries = []
+    with os.scandir(dirpath) as it:
+        for item in it:
+            name = item.name
+            if name.startswith('.'):
+                continue
+            try:
+                is_dir = item.is_dir()
+                st = item.stat()
+            except OSError:
+                continue
+            entries.append(IndexEntry(
+                name,
+                is_dir,
+                None if is_dir else st.st_size,
+                st.st_mtime_ns,
+            ))
+    entries.sort(key=sort_key)
+    return entries
+
+
+def sort_key(entry):
+    """Sort directories first, then by case-insensitive name."""
+    return (not entry.is_dir, entry.name.lower(), entry.name)
+
+
+def entry_key(entry, sort):
+    """Get the unique sort key of an entry within its group (directories or files)."""
+    name_key = (entry.name.lower(), entry.name)
+    if sort == "mtime":
+        return (entry.mtime_ns,) + name_key
+    if sort == "size":
+        return (entry.size,) + name_key
+    return name_key
+
+
+def encode_listing_cursor(sort, descending, entry):
+    """Encode the position after entry into an opaque cursor."""
+    group = "d" if entry.is_dir else "f"
+    key = entry_key(entry, "name" if entry.is_dir else sort)
+    data = json.dumps([sort, descending, group, key], separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def decode_listing_cursor(cursor, sort, descending):
+    """
+    Decode a cursor from encode_listing_cursor.
+
+    Returns:
+        Tuple of (group, key) where group is "d" or "f"
+
+    Raises:
+        ValueError: If the cursor is malformed or belongs to another sort order
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, cursor_descending, group, key = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise ValueError("Invalid cursor") from None
+    if cursor_sort != sort or cursor_descending != descending:
+        raise ValueError("Cursor belongs to a different sort order")
+
+    expected = (str, str) if group == "d" or sort == "name" else (int, str, str)
+    if group not in ("d", "f") or not isinstance(key, list) or len(key) != len(expected):
+        raise ValueError("Invalid cursor")
+    if not all(isinstance(value, kind) for value, kind in zip(key, expected)):
+        raise ValueError("Invalid cursor")
+    return group, tuple(key)
+
+
+class DirectoryListing:
+    """
+    The sorted entries of one directory version.
+
+    Entries are stored directories first, by name. File orders by mtime and
+    size are sorted once on first use and kept with their keys, so every
+    page is a bisect plus a bounded slice.
+    """
+
+    __slots__ = ("entries", "directory_count", "_orders", "_media")
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.directory_count = sum(1 for entry in entries if entry.is_dir)
+        self._orders = {}
+        self._media = None
+
+    def media(self, is_media):
+        """
+        Get the media files in name order with their positions, computed once.
+
+        Args:
+            is_media: Callable taking a file name and returning whether it is media
+
+        Returns:
+            Tuple of (list of names, dict of name -> position)
+        """
+        media = self._media
+        if media is None:
+            names = [entry.name for entry in self.entries[self.directory_count:] if is_media(entry.name)]
+            media = self._media = (names, {name: position for position, name in enumerate(names)})
+        return media
+
+    def _order(self, group, sort):
+        """Get (entries, keys) of a group sorted ascending, computed once."""
+        order = self._orders.get((group, sort))
+        if order is None:
+            if group == "d":
+                items = self.entries[:self.directory_count]
+            else:
+                items = self.entries[self.directory_count:]
+                if sort != "name":
+                    items = sorted(items, key=lambda entry: entry_key(entry, sort))
+            order = (items, [entry_key(entry, sort) for entry in items])
+            self._orders[(group, sort)] = order
+        return order
+
+    def page(self, sort="name", descending=False, offset=0, limit=20, after=None):
+        """
+        Get one page of entries: directories by name, then files by sort.
+
+        Args:
+            sort: One of SORT_FIELDS
+            descending: Reverse the order of files
+            offset: Position of the first entry (ignored when after is given)
+            limit: Maximum number of entries
+            after: Decoded cursor (group, key) of the previous page's last entry
+
+        Returns:
+            Tuple of (list of IndexEntry, position of the first entry)
+        """
+        directories, directory_keys = self._order("d", "name")
+        files, file_keys = self._order("f", sort)
+
+        if after is None:
+            start = max(offset, 0)
+        elif after[0] == "d":
+            start = bisect_right(directory_keys, after[1])
+        elif descending:
+            start = len(directories) + len(files) - bisect_left(file_keys, after[1])
+        else:
+            start = len(directories) + bisect_right(file_keys, after[1])
+
+        end = min(start + max(limit, 0), len(self.entries))
+        items = []
+        for position in range(start, end):
+            if position < len(directories):
+                items.append(directories[position])
+            else:
+                index = position - len(directories)
+                items.append(files[len(files) - 1 - index] if descending else files[index])
+        return items, start
+
+
+class DirectoryIndex:
+    """
+    In-process cache of sorted directory listings.
+
+    Each directory is stored together with the mtime it had when it was
+    scanned, so a listing is rebuilt only when entries are added, removed
+    or renamed. If a database path is given, listings are also persisted
+    to SQLite (shared by all processes) and survive restarts; database
+    errors are logged and the listing is served from the scan.
+    """
+
+    def __init__(self, db_path=None, max_directories=MAX_CACHED_DIRECTORIES):
+        self.db_path = Path(db_path) if db_path else None
+        self.max_directories = max_directories
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._connections = None
+
+        if self.db_path:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._connections = ThreadLocalConnections(self.db_path)
+            db = self._connections.get()
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS directories ("
+                "path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, entries TEXT NOT NULL)"
+            )
+            db.commit()
+
+    def get(self, dirpath):
+        """
+        Get the sorted entries of a directory, rescanning only if it changed.
+
+        Args:
+            dirpath: Path object to directory
+
+        Returns:
+            List of IndexEntry objects, or None if the directory is inaccessible
+        """
+        listing = self.get_listing(dirpath)
+        return listing.entries if listing is not None else None
+
+    def get_listing(self, dirpath):
+        """
+        Get the DirectoryListing of a directory, rescanning only if it changed.
+
+        Args:
+            dirpath: Path object to directory
+
+        Returns:
+            DirectoryListing, or None if the directory is inaccessible
+        """
+        key = str(dirpath)
+        try:
+            mtime_ns = os.stat(key).st_mtime_ns
+        except OSError:
+            return None
+
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] == mtime_ns:
+                self._cache.move_to_end(key)
+                return cached[1]
+
+        entries = self._load(key, mtime_ns)
+        if entries is None:
+            try:
+                entries = scan_directory(dirpath)
+            except PermissionError:
+                return None
+            self._store(key, mtime_ns, entries)
+
+        listing = DirectoryListing(entries)
+        with self._lock:
+            self._cache[key] = (mtime_ns, listing)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_directories:
+                self._cache.popitem(last=False)
+
+        return listing
+
+    def invalidate(self, dirpath=None):
+        """Drop one directory (or everything) from the index."""
+        with self._lock:
+            if dirpath is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(str(dirpath), None)
+
+        if self._connections is None:
+            return
+        db = self._connections.get()
+        try:
+            if dirpath is None:
+                db.execute("DELETE FROM directories")
+            else:
+                db.execute("DELETE FROM directories WHERE path = ?", (str(dirpath),))
+            db.commit()
+        except sqlite3.Error as e:
+            db.rollback()
+            logger.warning("Failed to invalidate directory index %s: %s", self.db_path, e)
+
+    def _load(self, key, mtime_ns):
+        if self._connections is None:
+            return None
+        try:
+            row = self._connections.get().execute(
+                "SELECT mtime_ns, entries FROM directories WHERE path = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("Failed to read directory index %s: %s", self.db_path, e)
+            return None
+        if row is None or row[0] != mtime_ns:
+            return None
+        # Rows persisted by older versions may use a coarser sort key
+        entries = [IndexEntry.from_row(r) for r in json.loads(row[1])]
+        entries.sort(key=sort_key)
+        return entries
+
+    def _store(self, key, mtime_ns, entries):
+        if self._connections is None:
+            return
+        data = json.dumps([e.to_row() for e in entries], separators=(",", ":"))
+        db = self._connections.get()
+        try:
+            db.execute(
+                "INSERT OR REPLACE INTO directories (path, mtime_ns, entries) VALUES (?, ?, ?)",
+                (key, mtime_ns, data),
+            )
+            db.commit()
+        except sqlite3.Error as e:
+            # The scan is still served; the next process to list the directory stores it
+            db.rollback()
+            logger.warning("Failed to write directory index %s: %s", self.db_path, e)
+
+
+# Shared index used by media_handler (configured in create_app)
+DIRECTORY_INDEX = DirectoryIndex()
+
+
+def set_directory_index_db(db_path):
+    """Set the SQLite file used to persist the directory index (None disables)."""
+    global DIRECTORY_INDEX
+    DIRECTORY_INDEX = DirectoryIndex(db_path)
+
+
+def get_directory_index():
+    """Get the shared directory index."""
+    return DIRECTORY_INDEX
@@ -0,0 +1,71 @@
+"""HTTP validators (ETag / Last-Modified) and conditional request handling."""
+from datetime import datetime, timezone
+
+from flask import make_response, request
+from werkzeug.http import http_date
+
+
+def last_modified_from_stat(st):
+    """Get a second-precision UTC datetime from a stat result's mtime."""
+    return datetime.fromtimestamp(int(st.st_mtime), tz=timezone.utc)
+
+
+def set_validators(response, etag, last_modified=None):
+    """Add strong ETag and Last-Modified headers to a response."""
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.headers['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def is_not_modified(etag, last_modified=None):
+    """
+    Check the request's If-None-Match / If-Modified-Since headers.
+
+    If-None-Match takes precedence; If-Modified-Since is only evaluated
+    when no If-None-Match header is present (RFC 7232, section 6).
+
+    Args:
+        etag: Current entity tag (unquoted)
+        last_modified: Current modification time as an aware datetime
+
+    Returns:
+        True if the client's cached copy is still valid
+    """
+    if request.method not in ("GET", "HEAD"):
+        return False
+
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+
+    if last_modified is not None and request.if_modified_since is not None:
+        return last_modified <= request.if_modified_since
+
+    return False
+
+
+def if_range_matches(etag, last_modified=None):
+    """
+    Check whether a Range request should be honoured given its If-Range header.
+
+    Returns True when there is no If-Range header, or when it matches the
+    current representation (strong ETag or exact Last-Modified date).
+    """
+    if_range = request.if_range
+    if if_range.etag is None and if_range.date is None:
+        return True
+    if if_range.etag is not None:
+        # If-Range requires strong comparison, so weak validators never match
+        if request.headers.get('If-Range', '').startswith('W/'):
+            return False
+        return if_range.etag == etag
+    return last_modified is not None and if_range.date == last_modified
+
+
+def not_modified_response(etag, last_modified=None, cache_control=None):
+    """Build an empty 304 Not Modified response carrying the validators."""
+    response = make_response("", 304)
+    set_validators(response, etag, last_modified)
+    if cache_control:
+        response.headers['Cache-Control'] = cache_control
+    return response
@@ -1,58 +1,399 @@
+import json
+import logging
 import os
+import stat
 from pathlib import Path
 from io import BytesIO
 import mimetypes
 
-from PIL import Image
-import cv2
+from app.directory_index import (
+    SORT_FIELDS,
+    decode_listing_cursor,
+    encode_listing_cursor,
+    get_directory_index,
+)
+from app.metrics import THUMBNAIL_CACHE_LOOKUPS, THUMBNAIL_GENERATION
+from app.single_flight import single_flight
+from app.packed_store import PackedThumbnailStore
+from app.thumbnail_store import FileThumbnailStore, make_cache_key
+from app.thumbnail_cache import get_memory_cache
+
+logger = logging.getLogger(__name__)
 
 
 SUPPORTED_IMAGE_FORMATS = {".png", ".jpg", ".jpeg", ".gif", ".bmp", ".webp", ".svg"}
 SUPPORTED_VIDEO_FORMATS = {".mp4", ".webm", ".mov", ".avi", ".mkv"}
 SUPPORTED_MEDIA_FORMATS = SUPPORTED_IMAGE_FORMATS | SUPPORTED_VIDEO_FORMATS
 
-# Thumbnail cache directory (set by routes.py)
+# Thumbnail cache directory and the store of cached files below it (set by create_app)
 THUMBNAIL_CACHE_ROOT = None
+THUMBNAIL_STORE = None
+
+# Disk cache layouts: one file per entry, or entries packed into segment files
+THUMBNAIL_STORE_BACKENDS = {
+    "files": FileThumbnailStore,
+    "packed": PackedThumbnailStore,
+}
+
+# Video thumbnails: fraction of the duration to start sampling at, and frame count
+VIDEO_THUMBNAIL_OFFSET = 0.1
+VIDEO_THUMBNAIL_SAMPLES = 5
+
+# Number of frames in a video preview sprite sheet
+PREVIEW_FRAME_COUNT = 10
+
+# Animated thumbnails: frame cap, size budget and output format ("gif" or "webp")
+ANIMATED_THUMBNAIL_MAX_FRAMES = 48
+ANIMATED_THUMBNAIL_MAX_BYTES = 512 * 1024
+ANIMATED_THUMBNAIL_FORMAT = "gif"
+
+# Allowed thumbnail sizes (bounding box edge in pixels), smallest is the default
+THUMBNAIL_SIZES = (150, 300, 600)
+
+# Static thumbnail formats in order of preference, as configured
+REQUESTED_THUMBNAIL_FORMATS = ("avif", "webp", "jpeg")
+
+# REQUESTED_THUMBNAIL_FORMATS that Pillow can encode, resolved on first use
+# (see get_thumbnail_formats) so that configuring the app does not load Pillow
+THUMBNAIL_FORMATS = None
+
+THUMBNAIL_MIMETYPES = {
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+    "avif": "image/avif",
+    "gif": "image/gif",
+}
+
+# Optional ThumbnailPool running generation in worker processes (None runs inline)
+THUMBNAIL_POOL = None
+
+# App config keys consumed by configure_media_handler
+MEDIA_HANDLER_CONFIG_KEYS = (
+    "THUMBNAIL_CACHE_ROOT",
+    "THUMBNAIL_CACHE_MAX_MB",
+    "THUMBNAIL_CACHE_EVICTION",
+    "THUMBNAIL_CACHE_BACKEND",
+    "THUMBNAIL_SIZES",
+    "THUMBNAIL_FORMATS",
+    "VIDEO_THUMBNAIL_OFFSET",
+    "VIDEO_THUMBNAIL_SAMPLES",
+    "PREVIEW_FRAME_COUNT",
+    "ANIMATED_THUMBNAIL_MAX_FRAMES",
+    "ANIMATED_THUMBNAIL_MAX_BYTES",
+    "ANIMATED_THUMBNAIL_FORMAT",
+)
+
+# JPEG draft decoding keeps at least this multiple of the thumbnail size
+DRAFT_OVERSAMPLE = 2
+
+# EXIF IFD1 tags locating the embedded JPEG thumbnail
+EXIF_THUMBNAIL_OFFSET_TAG = 0x0201
+EXIF_THUMBNAIL_LENGTH_TAG = 0x0202
+
+
+def configure_media_handler(config):
+    """
+    Apply thumbnail settings from app config (or a plain dict of it).
+
+    Also used to configure thumbnail pool worker processes, which do not
+    run create_app.
+    """
+    set_thumbnail_cache_root(
+        config["THUMBNAIL_CACHE_ROOT"],
+        config["THUMBNAIL_CACHE_MAX_MB"],
+        config["THUMBNAIL_CACHE_EVICTION"],
+        config["THUMBNAIL_CACHE_BACKEND"],
+    )
+    set_thumbnail_variants(config["THUMBNAIL_SIZES"], config["THUMBNAIL_FORMATS"])
+    set_video_thumbnail_options(config["VIDEO_THUMBNAIL_OFFSET"], config["VIDEO_THUMBNAIL_SAMPLES"])
+    set_preview_frame_count(config["PREVIEW_FRAME_COUNT"])
+    set_animated_thumbnail_options(
+        config["ANIMATED_THUMBNAIL_MAX_FRAMES"],
+        config["ANIMATED_THUMBNAIL_MAX_BYTES"],
+        config["ANIMATED_THUMBNAIL_FORMAT"],
+    )
+
+
+def set_thumbnail_pool(pool):
+    """Set the ThumbnailPool used for generation (None generates inline)."""
+    global THUMBNAIL_POOL
+    THUMBNAIL_POOL = pool
+
+
+def get_generation_kind(filepath):
+    """Get the metrics label of a media file's thumbnail generation: image, gif or video."""
+    suffix = Path(filepath).suffix.lower()
+    if suffix == ".gif":
+        return "gif"
+    return "image" if suffix in SUPPORTED_IMAGE_FORMATS else "video"
+
+
+def run_generation(kind, fn, *args, **kwargs):
+    """
+    Run a CPU-heavy generation function, in the thumbnail pool if configured.
+
+    Args:
+        kind: Label of the generation time metric (see get_generation_kind, or "preview")
+        fn: Generation function; must be picklable if a pool is configured
+
+    Raises:
+        ThumbnailPoolSaturated: If the pool's queue is full
+    """
+    with THUMBNAIL_GENERATION.labels(kind).time():
+        if THUMBNAIL_POOL is None:
+            return fn(*args, **kwargs)
+        return THUMBNAIL_POOL.run(fn, *args, **kwargs)
+
+
+def set_video_thumbnail_options(offset, samples):
+    """Set where video thumbnails are sampled and how many frames are compared."""
+    global VIDEO_THUMBNAIL_OFFSET, VIDEO_THUMBNAIL_SAMPLES
+    VIDEO_THUMBNAIL_OFFSET = offset
+    VIDEO_THUMBNAIL_SAMPLES = samples
+
+
+def set_animated_thumbnail_options(max_frames, max_bytes, output_format):
+    """Set the frame cap, byte budget and format of animated thumbnails."""
+    global ANIMATED_THUMBNAIL_MAX_FRAMES, ANIMATED_THUMBNAIL_MAX_BYTES, ANIMATED_THUMBNAIL_FORMAT
+    if output_format not in ("gif", "webp"):
+        raise ValueError(f"Unsupported animated thumbnail format: {output_format}")
+    ANIMATED_THUMBNAIL_MAX_FRAMES = max_frames
+    ANIMATED_THUMBNAIL_MAX_BYTES = max_bytes
+    ANIMATED_THUMBNAIL_FORMAT = output_format
+
+
+def set_thumbnail_variants(sizes, formats):
+    """
+    Set the allowed thumbnail sizes and preferred static formats.
+
+    Formats Pillow cannot encode here are dropped on first use; JPEG is
+    always kept as the last resort.
+    """
+    global THUMBNAIL_SIZES, REQUESTED_THUMBNAIL_FORMATS, THUMBNAIL_FORMATS
+    for output_format in formats:
+        if output_format not in THUMBNAIL_MIMETYPES or output_format == "gif":
+            raise ValueError(f"Unsupported thumbnail format: {output_format}")
+    THUMBNAIL_SIZES = tuple(sorted(int(size) for size in sizes))
+    REQUESTED_THUMBNAIL_FORMATS = tuple(formats)
+    THUMBNAIL_FORMATS = None
+
+
+def select_thumbnail_size(requested=None):
+    """Get the smallest allowed thumbnail size covering the requested width."""
+    if not requested:
+        return THUMBNAIL_SIZES[0]
+    for size in THUMBNAIL_SIZES:
+        if size >= requested:
+            return size
+    return THUMBNAIL_SIZES[-1]
+
+
+def negotiate_thumbnail_format(accepted_mimetypes):
+    """
+    Pick the preferred static thumbnail format the client explicitly accepts.
+
+    Args:
+        accepted_mimetypes: Set of MIME types listed in the Accept header
+
+    Returns:
+        Format name ("avif", "webp" or "jpeg")
+    """
+    for output_format in get_thumbnail_formats():
+        if THUMBNAIL_MIMETYPES[output_format] in accepted_mimetypes:
+            return output_format
+    return "jpeg"
+
+
+def get_thumbnail_sizes():
+    """Get the allowed thumbnail sizes, smallest first."""
+    return THUMBNAIL_SIZES
+
 
+def get_thumbnail_formats():
+    """Get the enabled static thumbnail formats, most preferred first."""
+    global THUMBNAIL_FORMATS
+    if THUMBNAIL_FORMATS is None:
+        from PIL import features
 
-def set_thumbnail_cache_root(cache_root):
-    """Set the root directory for thumbnail cache."""
-    global THUMBNAIL_CACHE_ROOT
+        available = [
+            output_format for output_format in REQUESTED_THUMBNAIL_FORMATS
+            if output_format == "jpeg" or features.check(output_format)
+        ]
+        if "jpeg" not in available:
+            available.append("jpeg")
+        THUMBNAIL_FORMATS = tuple(available)
+    return THUMBNAIL_FORMATS
+
+
+def get_preferred_thumbnail_format():
+    """Get the static format modern browsers are served (used for pre-generation)."""
+    return get_thumbnail_formats()[0]
+
+
+def get_animated_thumbnail_format(output_format):
+    """Animated WebP is only sent to clients that accept a modern static format."""
+    if ANIMATED_THUMBNAIL_FORMAT == "webp" and output_format != "jpeg":
+        return "webp"
+    return "gif"
+
+
+def get_thumbnail_variant(filepath, size, output_format):
+    """
+    Get the cache kind and suffix of a thumbnail variant.
+
+    Args:
+        filepath: Path to media file
+        size: Thumbnail size (one of THUMBNAIL_SIZES)
+        output_format: Negotiated static format
+
+    Returns:
+        Tuple of (kind, suffix) for get_thumbnail_cache_path
+    """
+    if Path(filepath).suffix.lower() == ".gif":
+        return f"thumb-{size}", f".{get_animated_thumbnail_format(output_format)}"
+    return f"thumb-{size}", f".{output_format}"
+
+
+def set_preview_frame_count(frame_count):
+    """Set the number of frames in video preview sprite sheets."""
+    global PREVIEW_FRAME_COUNT
+    PREVIEW_FRAME_COUNT = frame_count
+
+
+def get_preview_kind(frame_count=None):
+    """Get the cache kind of preview sprites and indexes, which includes the frame count."""
+    return f"preview-{frame_count or PREVIEW_FRAME_COUNT}"
+
+
+def set_thumbnail_cache_root(cache_root, max_mb=None, eviction="lru", backend="files"):
+    """
+    Set the root directory for thumbnail cache.
+
+    Args:
+        cache_root: Cache directory (None disables the disk cache)
+        max_mb: Size budget of the cache in MiB (None for unbounded)
+        eviction: What to evict first beyond the budget ("lru" or "lfu")
+        backend: Disk layout, one of THUMBNAIL_STORE_BACKENDS
+
+    Raises:
+        ValueError: For an unknown backend or eviction policy
+    """
+    if backend not in THUMBNAIL_STORE_BACKENDS:
+        raise ValueError(f"Unknown thumbnail cache backend: {backend}")
+    global THUMBNAIL_CACHE_ROOT, THUMBNAIL_STORE
     THUMBNAIL_CACHE_ROOT = Path(cache_root) if cache_root else None
+    THUMBNAIL_STORE = None
     if THUMBNAIL_CACHE_ROOT:
         THUMBNAIL_CACHE_ROOT.mkdir(parents=True, exist_ok=True)
+        max_bytes = int(max_mb * 1024 * 1024) if max_mb else None
+        THUMBNAIL_STORE = THUMBNAIL_STORE_BACKENDS[backend](
+            THUMBNAIL_CACHE_ROOT, max_bytes=max_bytes, eviction=eviction
+        )
+
+
+def get_thumbnail_store():
+    """Get the disk store of thumbnails and previews, or None if caching is disabled."""
+    return THUMBNAIL_STORE
 
 
-def get_thumbnail_cache_path(media_root, media_filepath):
+def format_source_fingerprint(mtime_ns, size):
+    """Build a cache fingerprint from a source file's mtime and size."""
+    return f"{mtime_ns:x}-{size:x}"
+
+
+def get_source_fingerprint(st):
+    """Build a cache fingerprint from a source file's stat result."""
+    return format_source_fingerprint(st.st_mtime_ns, st.st_size)
+
+
+def get_cache_key(media_root, media_filepath, st=None, kind="thumb", suffix=None, fingerprint=None):
     """
-    Get the cache path for a thumbnail.
+    Get the store key of a thumbnail or preview.
+
+    The key hashes the file's path relative to the media root, the source
+    file's mtime and size, the kind and the format, so a replaced media file
+    maps to new entries instead of reusing stale ones.
 
     Args:
         media_root: Root media directory
         media_filepath: Absolute path to media file
+        st: Optional stat result of the media file (avoids a second stat)
+        kind: Kind of derived file ("thumb-300", "preview-10")
+        suffix: Suffix of the stored format (defaults to the media suffix)
+        fingerprint: Source fingerprint to use instead of stat'ing the file
 
     Returns:
-        Path object for thumbnail cache location
+        Key string, or None if the disk cache is disabled
     """
-    if not THUMBNAIL_CACHE_ROOT:
+    if THUMBNAIL_STORE is None:
         return None
 
     media_root = Path(media_root).resolve()
     media_filepath = Path(media_filepath).resolve()
 
     try:
-        # Get relative path from media root
+        if fingerprint is None:
+            fingerprint = get_source_fingerprint(st if st is not None else media_filepath.stat())
         rel_path = media_filepath.relative_to(media_root)
-        # Create thumbnail filename with .thumb extension
-        thumb_name = rel_path.stem + '.thumb' + (rel_path.suffix or '.jpg')
-        # Build cache path mirroring media structure
-        cache_path = THUMBNAIL_CACHE_ROOT / rel_path.parent / thumb_name
-        return cache_path
+        return make_cache_key(rel_path.as_posix(), fingerprint, kind, suffix or rel_path.suffix or '.jpg')
     except (ValueError, OSError) as e:
-        print(f"Error calculating cache path for {media_filepath}: {e}")
+        logger.warning("Cannot compute cache key for %s: %s", media_filepath, e)
         return None
 
 
+def get_cached_variants(filepath):
+    """Get (kind, suffix) of every thumbnail and preview that can be cached for a media file."""
+    variants = {
+        get_thumbnail_variant(filepath, size, output_format)
+        for size in THUMBNAIL_SIZES
+        for output_format in get_thumbnail_formats()
+    }
+    if Path(filepath).suffix.lower() in SUPPORTED_VIDEO_FORMATS:
+        variants.update({(get_preview_kind(), ".jpg"), (get_preview_kind(), ".json")})
+    return variants
+
+
+def read_cached_thumbnail(cache_key):
+    """Read a cached file as bytes or a read-only memoryview, or None if it is missing or unreadable."""
+    return THUMBNAIL_STORE.get(cache_key) if THUMBNAIL_STORE is not None else None
+
+
+def remove_cached_files(media_root, media_filepath, fingerprint):
+    """
+    Delete the cached thumbnails and previews of one version of a media file.
+
+    Used when the media file was deleted or replaced. Variants of sizes or
+    formats that are no longer configured are left to gc.
+
+    Args:
+        media_root: Root media directory
+        media_filepath: Absolute path to media file (need not exist anymore)
+        fingerprint: Source fingerprint of the removed version
+
+    Returns:
+        Number of files removed
+    """
+    if THUMBNAIL_STORE is None:
+        return 0
+    removed = 0
+    for kind, suffix in get_cached_variants(media_filepath):
+        key = get_cache_key(media_root, media_filepath, kind=kind, suffix=suffix, fingerprint=fingerprint)
+        if key and THUMBNAIL_STORE.delete(key):
+            removed += 1
+    return removed
+
+
+def save_thumbnail_to_cache(filepath, media_root, thumb_data, kind="thumb", suffix=None):
+    """Atomically write thumbnail bytes to the disk cache."""
+    cache_key = get_cache_key(media_root, filepath, kind=kind, suffix=suffix)
+    if not cache_key:
+        return
+    try:
+        THUMBNAIL_STORE.put(cache_key, thumb_data)
+    except Exception as e:
+        logger.warning("Failed to cache thumbnail for %s: %s", filepath, e)
+
+
 def is_media_file(filepath):
     """Check if file is a supported media file."""
     if not isinstance(filepath, Path):
@@ -67,133 +408,390 @@ def is_directory(filepath):
     return filepath.is_dir()
 
 
-def get_file_info(filepath):
-    """Get metadata about a file."""
-    if not isinstance(filepath, Path):
-        filepath = Path(filepath)
-
-    if not filepath.exists():
-        return None
-
-    is_dir = filepath.is_dir()
-    is_media = is_media_file(filepath) if not is_dir else False
-    file_type = "directory" if is_dir else "file"
+def build_file_info(name, path, is_dir, size):
+    """Build the metadata dict for a file from already known stat results."""
+    suffix = os.path.splitext(name)[1].lower() if not is_dir else ""
 
     if not is_dir:
-        file_type_cat = "image" if filepath.suffix.lower() in SUPPORTED_IMAGE_FORMATS else "video"
+        file_type_cat = "image" if suffix in SUPPORTED_IMAGE_FORMATS else "video"
     else:
         file_type_cat = None
 
     return {
-        "name": filepath.name,
-        "path": str(filepath),
+        "name": name,
+        "path": str(path),
         "is_dir": is_dir,
-        "is_media": is_media,
-        "type": file_type,
+        "is_media": (suffix in SUPPORTED_MEDIA_FORMATS) if not is_dir else False,
+        "type": "directory" if is_dir else "file",
         "media_type": file_type_cat,
-        "suffix": filepath.suffix.lower(),
-        "size": filepath.stat().st_size if filepath.is_file() else None,
+        "suffix": suffix,
+        "size": size,
     }
 
 
-def list_directory(dirpath, offset=0, limit=20):
+def get_file_info(filepath):
+    """Get metadata about a file."""
+    if not isinstance(filepath, Path):
+        filepath = Path(filepath)
+
+    try:
+        st = filepath.stat()
+    except OSError:
+        return None
+
+    is_dir = stat.S_ISDIR(st.st_mode)
+    size = st.st_size if stat.S_ISREG(st.st_mode) else None
+    return build_file_info(filepath.name, filepath, is_dir, size)
+
+
+def get_media_dimensions(filepath):
+    """
+    Read the pixel dimensions of a media file without decoding it.
+
+    Images only have their header parsed; videos are opened but no frame is
+    decoded.
+
+    Returns:
+        Tuple of (width, height), or (None, None) if unknown
+    """
+    suffix = Path(filepath).suffix.lower()
+    try:
+        if suffix in SUPPORTED_IMAGE_FORMATS:
+            from PIL import Image
+
+            with Image.open(filepath) as img:
+                return img.size
+        if suffix in SUPPORTED_VIDEO_FORMATS:
+            import cv2
+
+            cap = cv2.VideoCapture(str(filepath))
+            try:
+                width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+                height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            finally:
+                cap.release()
+            if width and height:
+                return width, height
+    except Exception:
+        pass
+    return None, None
+
+
+def list_directory(dirpath, offset=0, limit=20, sort="name", descending=False, cursor=None):
     """
     List files in a directory with pagination.
 
+    Pages can be addressed by offset or by the cursor returned with the
+    previous page. Cursors point behind the last entry's sort key, so
+    entries added or removed while scrolling do not shift later pages.
+
     Args:
         dirpath: Path object to directory
-        offset: Pagination offset
+        offset: Pagination offset (ignored if cursor is given)
         limit: Items per page
+        sort: File order, "name", "mtime" or "size" (directories come first, by name)
+        descending: Reverse the file order
+        cursor: next_cursor of the previous page
 
     Returns:
         Dict with total count, items, and pagination info
+
+    Raises:
+        ValueError: For an unknown sort order or an invalid cursor
     """
     if not isinstance(dirpath, Path):
         dirpath = Path(dirpath)
 
+    if sort not in SORT_FIELDS:
+        raise ValueError(f"Unknown sort order: {sort}")
+    after = decode_listing_cursor(cursor, sort, descending) if cursor else None
+
     if not dirpath.is_dir():
         return None
 
-    try:
-        all_items = sorted(
-            (item for item in dirpath.iterdir() if not item.name.startswith('.')),
-            key=lambda x: (not x.is_dir(), x.name.lower())
-        )
-    except PermissionError:
+    # Sorted entries are cached per directory and rebuilt only on mtime change
+    listing = get_directory_index().get_listing(dirpath)
+    if listing is None:
         return None
 
-    total = len(all_items)
-    items = [get_file_info(item) for item in all_items[offset : offset + limit]]
+    total = len(listing.entries)
+    page, start = listing.page(sort=sort, descending=descending, offset=offset, limit=limit, after=after)
+    items = [
+        build_file_info(entry.name, dirpath / entry.name, entry.is_dir, entry.size)
+        for entry in page
+    ]
+    has_more = (start + len(page)) < total
 
     return {
         "total": total,
-        "offset": offset,
+        "offset": start,
         "limit": limit,
         "items": items,
-        "has_more": (offset + limit) < total,
+        "has_more": has_more,
+        "next_cursor": encode_listing_cursor(sort, descending, page[-1]) if has_more and page else None,
     }
 
 
-def generate_image_thumbnail(filepath, media_root=None, size=(150, 150)):
+def get_media_neighbours(filepath):
+    """
+    Find a media file's position among the media files of its directory.
+
+    Uses the cached directory listing, so stepping through a large folder
+    costs a dict lookup instead of a sort per view.
+
+    Args:
+        filepath: Path object to media file
+
+    Returns:
+        Tuple of (index, total, previous Path or None, next Path or None);
+        index is None if the file is not listed
+    """
+    if not isinstance(filepath, Path):
+        filepath = Path(filepath)
+
+    listing = get_directory_index().get_listing(filepath.parent)
+    if listing is None:
+        return None, 0, None, None
+
+    names, positions = listing.media(lambda name: os.path.splitext(name)[1].lower() in SUPPORTED_MEDIA_FORMATS)
+    index = positions.get(filepath.name)
+    if index is None:
+        return None, len(names), None, None
+    prev_file = filepath.parent / names[index - 1] if index > 0 else None
+    next_file = filepath.parent / names[index + 1] if index < len(names) - 1 else None
+    return index, len(names), prev_file, next_file
+
+
+def sample_animation_frames(img, max_frames):
+    """
+    Choose which frames of an animation to keep, preserving total duration.
+
+    Every frame's duration is read, but only every n-th frame is kept and
+    it absorbs the durations of the frames skipped after it.
+
+    Args:
+        img: Open animated PIL image
+        max_frames: Maximum number of frames to keep
+
+    Returns:
+        List of (frame index, duration in ms) tuples
+    """
+    frame_count = getattr(img, 'n_frames', 1)
+    step = max(1, -(-frame_count // max_frames))
+
+    sampled = []
+    for index in range(frame_count):
+        img.seek(index)
+        duration = img.info.get('duration', 100) or 100
+        if index % step == 0:
+            sampled.append([index, duration])
+        else:
+            sampled[-1][1] += duration
+    return [tuple(item) for item in sampled]
+
+
+def encode_animation(frames, durations, output_format):
+    """Encode RGBA frames as an animated GIF (shared palette) or WebP."""
+    from PIL import Image
+
+    output = BytesIO()
+
+    if output_format == "webp":
+        frames[0].save(
+            output,
+            format="WEBP",
+            save_all=True,
+            append_images=frames[1:],
+            duration=durations,
+            loop=0,
+            quality=70,
+            method=4,
+        )
+        return output.getvalue()
+
+    # Build one palette from a mosaic of all frames so every frame shares it
+    width, height = frames[0].size
+    mosaic = Image.new("RGB", (width * len(frames), height))
+    for i, frame in enumerate(frames):
+        mosaic.paste(frame.convert("RGB"), (i * width, 0))
+    palette = mosaic.quantize(colors=255, method=Image.Quantize.MEDIANCUT)
+
+    paletted = []
+    for frame in frames:
+        quantized = frame.convert("RGB").quantize(palette=palette, dither=Image.Dither.NONE)
+        # Index 255 is reserved for transparent pixels
+        transparent = frame.getchannel("A").point(lambda a: 255 if a < 128 else 0)
+        quantized.paste(255, mask=transparent)
+        paletted.append(quantized)
+
+    paletted[0].save(
+        output,
+        format="GIF",
+        save_all=True,
+        append_images=paletted[1:],
+        duration=durations,
+        loop=0,
+        transparency=255,
+        disposal=2,
+        optimize=False,
+    )
+    return output.getvalue()
+
+
+def generate_animated_thumbnail(img, size=(150, 150), output_format=None):
+    """
+    Generate an animated thumbnail within the configured frame and byte budget.
+
+    Frames are sampled down to ANIMATED_THUMBNAIL_MAX_FRAMES, resized with
+    a cheap filter and encoded as output_format (defaults to
+    ANIMATED_THUMBNAIL_FORMAT). If the result
+    exceeds ANIMATED_THUMBNAIL_MAX_BYTES, every other frame is dropped and
+    the animation is encoded again.
+
+    Args:
+        img: Open animated PIL image
+        size: Bounding box of the thumbnail
+        output_format: "gif" or "webp"
+
+    Returns:
+        Bytes of the animated thumbnail, or None if no frame could be read
+    """
+    from PIL import Image
+
+    output_format = output_format or ANIMATED_THUMBNAIL_FORMAT
+    frames = []
+    durations = []
+    for index, duration in sample_animation_frames(img, ANIMATED_THUMBNAIL_MAX_FRAMES):
+        img.seek(index)
+        frame = img.convert("RGBA")
+        frame.thumbnail(size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+        frames.append(frame)
+        durations.append(duration)
+
+    if not frames:
+        return None
+
+    while True:
+        thumb_data = encode_animation(frames, durations, output_format)
+        if len(thumb_data) <= ANIMATED_THUMBNAIL_MAX_BYTES or len(frames) <= 2:
+            return thumb_data
+        # Over budget - halve the frame count, keeping the total duration
+        durations = [sum(durations[i:i + 2]) for i in range(0, len(durations), 2)]
+        frames = frames[::2]
+
+
+def load_embedded_preview(img, size):
+    """
+    Load the EXIF-embedded JPEG thumbnail if it is big enough to use.
+
+    The preview must cover the final thumbnail size and have the same
+    aspect ratio as the full image (some cameras letterbox it).
+
+    Args:
+        img: Open PIL image (not yet decoded)
+        size: Bounding box of the thumbnail
+
+    Returns:
+        Decoded PIL image of the embedded preview, or None
+    """
+    from PIL import ExifTags, Image
+
+    raw_exif = img.info.get("exif")
+    if not raw_exif:
+        return None
+
+    try:
+        ifd1 = img.getexif().get_ifd(ExifTags.IFD.IFD1)
+        offset = ifd1.get(EXIF_THUMBNAIL_OFFSET_TAG)
+        length = ifd1.get(EXIF_THUMBNAIL_LENGTH_TAG)
+        if not offset or not length:
+            return None
+
+        # Offsets are relative to the TIFF header following "Exif\0\0"
+        header = 6 if raw_exif.startswith(b"Exif\x00\x00") else 0
+        preview = Image.open(BytesIO(raw_exif[header + offset:header + offset + length]))
+        preview.load()
+    except Exception:
+        return None
+
+    width, height = img.size
+    scale = min(size[0] / width, size[1] / height, 1.0)
+    if preview.width < width * scale or preview.height < height * scale:
+        return None
+    if abs(preview.width / preview.height - width / height) > 0.02 * (width / height):
+        return None
+    return preview
+
+
+def reduce_for_thumbnail(img, size):
+    """
+    Get a cheaply decoded version of a static image for thumbnailing.
+
+    Tries, in order: the EXIF-embedded preview, JPEG draft mode (DCT
+    scaling by 1/2, 1/4 or 1/8 while decoding) and finally the image
+    itself, which is then fully decoded by the caller.
+
+    Args:
+        img: Open PIL image (not yet decoded)
+        size: Bounding box of the thumbnail
+
+    Returns:
+        PIL image to resize into the thumbnail
+    """
+    if img.format != "JPEG":
+        return img
+
+    preview = load_embedded_preview(img, size)
+    if preview is not None:
+        return preview
+
+    # Keep some headroom above the target so the final resample stays sharp
+    img.draft("RGB", (size[0] * DRAFT_OVERSAMPLE, size[1] * DRAFT_OVERSAMPLE))
+    return img
+
+
+def encode_static_thumbnail(img, output_format):
+    """Encode a resized RGB image as JPEG, WebP or AVIF bytes."""
+    output = BytesIO()
+    if output_format == "avif":
+        img.save(output, format="AVIF", quality=60, speed=8)
+    elif output_format == "webp":
+        img.save(output, format="WEBP", quality=80, method=4)
+    else:
+        img.save(output, format="JPEG", quality=85)
+    return output.getvalue()
+
+
+def generate_image_thumbnail(filepath, media_root=None, size=(150, 150), output_format="jpeg"):
     """
     Generate thumbnail for an image file. Handles animated GIFs.
     Caches thumbnails to disk if media_root is provided.
     """
+    from PIL import Image
+
     try:
         filepath = Path(filepath)
+        kind, suffix = get_thumbnail_variant(filepath, size[0], output_format)
 
         with Image.open(filepath) as img:
             # Check if image is animated GIF
             is_animated = hasattr(img, 'is_animated') and img.is_animated
 
             if is_animated:
-                # Create animated GIF thumbnail
-                frames = []
-                durations = []
-
-                try:
-                    while True:
-                        # Extract frame and duration
-                        frame = img.convert("RGBA")
-                        durations.append(img.info.get('duration', 100))
-
-                        # Resize frame
-                        frame.thumbnail(size, Image.Resampling.LANCZOS)
-                        frames.append(frame)
-
-                        # Move to next frame
-                        img.seek(img.tell() + 1)
-                except EOFError:
-                    pass
-
-                if frames:
-                    output = BytesIO()
-                    frames[0].save(
-                        output,
-                        format="GIF",
-                        save_all=True,
-                        append_images=frames[1:],
-                        duration=durations,
-                        loop=0,
-                        optimize=False,
-                    )
-                    output.seek(0)
-                    thumb_data = output.getvalue()
-
+                thumb_data = generate_animated_thumbnail(
+                    img, size, get_animated_thumbnail_format(output_format)
+                )
+                if thumb_data:
                     # Save to cache if enabled
                     if media_root:
-                        cache_path = get_thumbnail_cache_path(media_root, filepath)
-                        if cache_path:
-                            try:
-                                cache_path.parent.mkdir(parents=True, exist_ok=True)
-                                with open(cache_path, 'wb') as f:
-                                    f.write(thumb_data)
-                            except Exception as e:
-                                print(f"Warning: Failed to cache thumbnail for {filepath}: {e}")
+                        save_thumbnail_to_cache(filepath, media_root, thumb_data, kind=kind, suffix=suffix)
 
                     return thumb_data
             else:
-                # Static image - convert to JPEG
+                # Avoid a full decode of large JPEGs where possible
+                img = reduce_for_thumbnail(img, size)
+
+                # Static image - flatten transparency onto white
                 if img.mode in ("RGBA", "LA", "P"):
                     bg = Image.new("RGB", img.size, (255, 255, 255))
                     bg.paste(img, mask=img.split()[-1] if img.mode == "RGBA" else None)
@@ -201,73 +799,275 @@ def generate_image_thumbnail(filepath, media_root=None, size=(150, 150)):
 
                 img.thumbnail(size, Image.Resampling.LANCZOS)
 
-                output = BytesIO()
-                img.save(output, format="JPEG", quality=85)
-                output.seek(0)
-                thumb_data = output.getvalue()
+                # Still GIFs are cached under the animated variant, so keep them JPEG
+                static_format = "jpeg" if filepath.suffix.lower() == ".gif" else output_format
+                thumb_data = encode_static_thumbnail(img, static_format)
 
                 # Save to cache if enabled
                 if media_root:
-                    cache_path = get_thumbnail_cache_path(media_root, filepath)
-                    if cache_path:
-                        try:
-                            cache_path.parent.mkdir(parents=True, exist_ok=True)
-                            with open(cache_path, 'wb') as f:
-                                f.write(thumb_data)
-                        except Exception as e:
-                            print(f"Warning: Failed to cache thumbnail for {filepath}: {e}")
+                    save_thumbnail_to_cache(filepath, media_root, thumb_data, kind=kind, suffix=suffix)
 
                 return thumb_data
     except Exception as e:
-        print(f"Error generating image thumbnail for {filepath}: {e}")
+        logger.warning("Failed to generate image thumbnail for %s: %s", filepath, e)
         return None
 
 
-def generate_video_thumbnail(filepath, media_root=None, size=(150, 150)):
+def score_video_frame(frame):
     """
-    Generate thumbnail from first frame of video file.
+    Score how representative a decoded frame is for a thumbnail.
+
+    Uses the variance of a downsampled grayscale copy, so flat black,
+    white or single-colour frames (fades, title cards) score low.
+
+    Args:
+        frame: BGR frame as a NumPy array
+
+    Returns:
+        Float score, higher is better
+    """
+    step = max(1, frame.shape[1] // 64)
+    small = frame[::step, ::step].mean(axis=2)
+    brightness = small.mean()
+    score = float(small.std())
+    if brightness < 20 or brightness > 235:
+        score *= 0.1
+    return score
+
+
+def read_representative_frame(cap, offset=None, samples=None):
+    """
+    Seek to several positions of an open video and return the best frame.
+
+    Args:
+        cap: Open cv2.VideoCapture
+        offset: Fraction of the duration where sampling starts
+        samples: Number of frames sampled between offset and the end
+
+    Returns:
+        BGR frame as a NumPy array, or None if nothing could be decoded
+    """
+    import cv2
+
+    offset = VIDEO_THUMBNAIL_OFFSET if offset is None else offset
+    samples = VIDEO_THUMBNAIL_SAMPLES if samples is None else samples
+
+    best_frame = None
+    best_score = -1.0
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+
+    if frame_count > 1:
+        for i in range(max(1, samples)):
+            position = int(frame_count * (offset + (1 - offset) * i / max(1, samples)))
+            cap.set(cv2.CAP_PROP_POS_FRAMES, min(position, frame_count - 1))
+            ret, frame = cap.read()
+            if not ret:
+                continue
+            score = score_video_frame(frame)
+            if score > best_score:
+                best_frame, best_score = frame, score
+
+    # Unknown length or seeking unsupported - fall back to the first frame
+    if best_frame is None:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        ret, frame = cap.read()
+        if ret:
+            best_frame = frame
+
+    return best_frame
+
+
+def generate_video_thumbnail(filepath, media_root=None, size=(150, 150), output_format="jpeg"):
+    """
+    Generate thumbnail from a representative frame of a video file.
     Caches thumbnail to disk if media_root is provided.
     """
+    import cv2
+    from PIL import Image
+
     try:
         filepath = Path(filepath)
         cap = cv2.VideoCapture(str(filepath))
-        ret, frame = cap.read()
-        cap.release()
+        try:
+            frame = read_representative_frame(cap)
+        finally:
+            cap.release()
 
-        if not ret:
+        if frame is None:
             return None
 
+        # Downscale with OpenCV before handing the (now small) frame to Pillow
+        height, width = frame.shape[:2]
+        scale = min(size[0] / width, size[1] / height, 1.0)
+        if scale < 1.0:
+            new_size = (max(1, round(width * scale)), max(1, round(height * scale)))
+            frame = cv2.resize(frame, new_size, interpolation=cv2.INTER_AREA)
+
         # Convert BGR to RGB
         frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
         img = Image.fromarray(frame)
 
-        # Resize thumbnail
-        img.thumbnail(size, Image.Resampling.LANCZOS)
+        thumb_data = encode_static_thumbnail(img, output_format)
+
+        # Save to cache if enabled
+        if media_root:
+            kind, suffix = get_thumbnail_variant(filepath, size[0], output_format)
+            save_thumbnail_to_cache(filepath, media_root, thumb_data, kind=kind, suffix=suffix)
+
+        return thumb_data
+    except Exception as e:
+        logger.warning("Failed to generate video thumbnail for %s: %s", filepath, e)
+        return None
+
 
-        # Convert to JPEG bytes
+def generate_video_preview(filepath, media_root=None, frame_count=None, size=(160, 90)):
+    """
+    Generate a sprite sheet of evenly spaced frames for hover scrubbing.
+
+    Frames are placed left to right in a single row. A frame that fails to
+    decode repeats the nearest earlier decoded frame (the first decoded one
+    for leading failures), so the sprite always has frame_count tiles. The
+    JSON index lists the frame count, the timestamp of each frame and the
+    tile size. Both are cached to disk if media_root is provided.
+
+    Args:
+        filepath: Path to video file
+        media_root: Root media directory (enables caching)
+        frame_count: Number of frames in the sprite (defaults to PREVIEW_FRAME_COUNT)
+        size: Bounding box of a single frame
+
+    Returns:
+        Tuple of (JPEG bytes, index dict), or None if failed
+    """
+    import cv2
+    from PIL import Image
+
+    frame_count = frame_count or PREVIEW_FRAME_COUNT
+    try:
+        filepath = Path(filepath)
+        cap = cv2.VideoCapture(str(filepath))
+        try:
+            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+            fps = cap.get(cv2.CAP_PROP_FPS) or 0
+            if total_frames < 1:
+                return None
+
+            frames = []
+            timestamps = []
+            skipped = 0
+            for i in range(frame_count):
+                position = min(int(total_frames * (i + 0.5) / frame_count), total_frames - 1)
+                cap.set(cv2.CAP_PROP_POS_FRAMES, position)
+                ret, frame = cap.read()
+                if not ret:
+                    if frames:
+                        frames.append(frames[-1])
+                        timestamps.append(timestamps[-1])
+                    else:
+                        skipped += 1
+                    continue
+                height, width = frame.shape[:2]
+                scale = min(size[0] / width, size[1] / height)
+                tile = (max(1, round(width * scale)), max(1, round(height * scale)))
+                frames.append(cv2.resize(frame, tile, interpolation=cv2.INTER_AREA))
+                timestamps.append(round(position / fps, 3) if fps else None)
+        finally:
+            cap.release()
+
+        if not frames:
+            return None
+        frames[:0] = frames[:1] * skipped
+        timestamps[:0] = timestamps[:1] * skipped
+
+        # All frames of one video share the same tile size
+        sprite = cv2.cvtColor(cv2.hconcat(frames), cv2.COLOR_BGR2RGB)
         output = BytesIO()
-        img.save(output, format="JPEG", quality=85)
-        output.seek(0)
-        thumb_data = output.getvalue()
+        Image.fromarray(sprite).save(output, format="JPEG", quality=80)
+        sprite_data = output.getvalue()
+
+        tile_height, tile_width = frames[0].shape[:2]
+        index = {
+            "frames": len(frames),
+            "frame_width": tile_width,
+            "frame_height": tile_height,
+            "duration": round(total_frames / fps, 3) if fps else None,
+            "timestamps": timestamps,
+        }
 
         # Save to cache if enabled
         if media_root:
-            cache_path = get_thumbnail_cache_path(media_root, filepath)
-            if cache_path:
-                try:
-                    cache_path.parent.mkdir(parents=True, exist_ok=True)
-                    with open(cache_path, 'wb') as f:
-                        f.write(thumb_data)
-                except Exception as e:
-                    print(f"Warning: Failed to cache thumbnail for {filepath}: {e}")
+            kind = get_preview_kind(frame_count)
+            save_thumbnail_to_cache(filepath, media_root, sprite_data, kind=kind, suffix=".jpg")
+            save_thumbnail_to_cache(filepath, media_root, json.dumps(index).encode(), kind=kind, suffix=".json")
 
-        return thumb_data
+        return sprite_data, index
     except Exception as e:
-        print(f"Error generating video thumbnail for {filepath}: {e}")
+        logger.warning("Failed to generate video preview for %s: %s", filepath, e)
         return None
 
 
-def get_thumbnail(filepath, media_root=None):
+def get_video_preview(filepath, media_root=None):
+    """
+    Get or generate the preview sprite sheet and index of a video.
+
+    Args:
+        filepath: Path to video file
+        media_root: Root media directory (enables caching)
+
+    Returns:
+        Tuple of (JPEG bytes, index dict), or None if failed
+
+    Raises:
+        ThumbnailPoolSaturated: If generation is needed and the pool is full
+    """
+    filepath = Path(filepath).resolve()
+    if filepath.suffix.lower() not in SUPPORTED_VIDEO_FORMATS:
+        return None
+
+    try:
+        st = filepath.stat()
+    except OSError:
+        return None
+
+    # Passed explicitly, so the sprite always matches the frame count of the cache key
+    frame_count = PREVIEW_FRAME_COUNT
+    if not media_root:
+        return run_generation("preview", generate_video_preview, filepath, frame_count=frame_count)
+
+    kind = get_preview_kind(frame_count)
+    sprite_key = get_cache_key(media_root, filepath, st, kind=kind, suffix=".jpg")
+    index_key = get_cache_key(media_root, filepath, st, kind=kind, suffix=".json")
+    if not sprite_key or not index_key:
+        return run_generation(
+            "preview", generate_video_preview, filepath, media_root=media_root, frame_count=frame_count
+        )
+
+    def read_cached_preview():
+        # The index is written after the sprite, so a readable index implies a complete sprite
+        index_data = read_cached_thumbnail(index_key)
+        sprite_data = read_cached_thumbnail(sprite_key) if index_data is not None else None
+        if sprite_data is None:
+            return None
+        try:
+            return bytes(sprite_data), json.loads(bytes(index_data))
+        except ValueError:
+            return None
+
+    cached = read_cached_preview()
+    if cached is not None:
+        return cached
+
+    # Concurrent requests for the same video wait for a single generation
+    with single_flight(sprite_key, THUMBNAIL_CACHE_ROOT):
+        cached = read_cached_preview()
+        if cached is not None:
+            return cached
+        return run_generation(
+            "preview", generate_video_preview, filepath, media_root=media_root, frame_count=frame_count
+        )
+
+
+def get_thumbnail(filepath, media_root=None, width=None, output_format="jpeg"):
     """
     Get or generate thumbnail for media file.
     Checks cache first, generates if needed, then caches for future use.
@@ -275,53 +1075,176 @@ def get_thumbnail(filepath, media_root=None):
     Args:
         filepath: Path to media file
         media_root: Root media directory (enables caching)
+        width: Requested size (snapped to THUMBNAIL_SIZES)
+        output_format: Static thumbnail format ("jpeg", "webp" or "avif")
 
     Returns:
         Bytes of thumbnail image or None if failed
     """
+    entry = get_thumbnail_entry(filepath, media_root=media_root, width=width, output_format=output_format)
+    return entry.data if entry is not None else None
+
+
+def get_thumbnail_etag(st, width=None, output_format="jpeg"):
+    """Get the ETag of a thumbnail variant, derived from its source file's stat."""
+    return f"t-{get_source_fingerprint(st)}-{select_thumbnail_size(width)}-{output_format}"
+
+
+def get_thumbnail_entry(filepath, media_root=None, st=None, width=None, output_format="jpeg", generate=True):
+    """
+    Get or generate thumbnail for media file as a ThumbnailEntry.
+    Checks the in-memory LRU, then the disk cache, then generates (once per
+    variant, concurrent requests wait for that generation).
+
+    Args:
+        filepath: Path to media file
+        media_root: Root media directory (enables disk caching)
+        st: Optional stat result of the media file
+        width: Requested size (snapped to THUMBNAIL_SIZES)
+        output_format: Static thumbnail format ("jpeg", "webp" or "avif")
+        generate: Generate on a cache miss (False only returns cached thumbnails)
+
+    Returns:
+        ThumbnailEntry with bytes, ETag, length and MIME type, or None if
+        failed (or not cached and generate is False)
+
+    Raises:
+        ThumbnailPoolSaturated: If generation is needed and the pool is full
+    """
     if not isinstance(filepath, Path):
         filepath = Path(filepath)
 
     filepath = filepath.resolve()
+    size = select_thumbnail_size(width)
 
-    if not filepath.exists():
-        return None
+    if st is None:
+        try:
+            st = filepath.stat()
+        except OSError:
+            return None
 
-    # Check cache first
+    cache_key = None
     if media_root:
-        cache_path = get_thumbnail_cache_path(media_root, filepath)
-        if cache_path:
-            if cache_path.exists():
-                try:
-                    with open(cache_path, 'rb') as f:
-                        thumb_data = f.read()
-                        import sys
-                        print(f"[CACHE HIT] {filepath.name}", file=sys.stderr)
-                        return thumb_data
-                except Exception as e:
-                    import sys
-                    print(f"[CACHE ERROR] Failed to read {cache_path}: {e}", file=sys.stderr)
-                    # Fall through to generate
-            else:
-                import sys
-                print(f"[CACHE MISS] {cache_path}", file=sys.stderr)
-        else:
-            import sys
-            print(f"[CACHE DISABLED] media_root={media_root}, cache_root={THUMBNAIL_CACHE_ROOT}", file=sys.stderr)
+        kind, suffix = get_thumbnail_variant(filepath, size, output_format)
+        cache_key = get_cache_key(media_root, filepath, st, kind=kind, suffix=suffix)
+
+    # Hot thumbnails are served from memory without touching the disk cache;
+    # the hit still counts as an access for disk cache eviction
+    memory_cache = get_memory_cache()
+    memory_key = (str(filepath), get_source_fingerprint(st), size, output_format)
+    entry = memory_cache.get(memory_key)
+    if entry is not None:
+        THUMBNAIL_CACHE_LOOKUPS.labels("memory", "hit").inc()
+        if cache_key:
+            THUMBNAIL_STORE.touch(cache_key)
+        return entry
+    THUMBNAIL_CACHE_LOOKUPS.labels("memory", "miss").inc()
+
+    # Check disk cache
+    if cache_key:
+        thumb_data = read_cached_thumbnail(cache_key)
+        if thumb_data is not None:
+            THUMBNAIL_CACHE_LOOKUPS.labels("disk", "hit").inc()
+            logger.debug("thumbnail cache hit path=%s key=%s", filepath, cache_key)
+            return memory_cache.put(memory_key, thumb_data, get_thumbnail_etag(st, size, output_format))
+        THUMBNAIL_CACHE_LOOKUPS.labels("disk", "miss").inc()
+        logger.debug("thumbnail cache miss path=%s key=%s", filepath, cache_key)
     else:
-        import sys
-        print(f"[NO MEDIA_ROOT] {filepath.name}", file=sys.stderr)
+        logger.debug("thumbnail disk cache disabled path=%s media_root=%s", filepath, media_root)
+
+    if not generate:
+        return None
+
+    # Concurrent requests for the same variant wait for a single generation,
+    # across processes too when the disk cache is enabled
+    lock_key = cache_key or repr(memory_key)
+    with single_flight(lock_key, THUMBNAIL_CACHE_ROOT if cache_key else None):
+        entry = memory_cache.peek(memory_key)
+        if entry is not None:
+            return entry
+
+        thumb_data = read_cached_thumbnail(cache_key) if cache_key else None
+        if thumb_data is None:
+            thumb_data = run_generation(
+                get_generation_kind(filepath), generate_thumbnail,
+                filepath, media_root=media_root, width=size, output_format=output_format,
+            )
+            if thumb_data is None:
+                return None
 
-    suffix = filepath.suffix.lower()
+        return memory_cache.put(memory_key, thumb_data, get_thumbnail_etag(st, size, output_format))
+
+
+def generate_thumbnail(filepath, media_root=None, width=None, output_format="jpeg"):
+    """
+    Generate thumbnail for a media file without consulting the cache.
+    Caches the result to disk if media_root is provided.
+
+    Args:
+        filepath: Path to media file
+        media_root: Root media directory (enables caching)
+        width: Requested size (snapped to THUMBNAIL_SIZES)
+        output_format: Static thumbnail format ("jpeg", "webp" or "avif")
+
+    Returns:
+        Bytes of thumbnail image or None if failed
+    """
+    suffix = Path(filepath).suffix.lower()
+    size = select_thumbnail_size(width)
 
     if suffix in SUPPORTED_IMAGE_FORMATS:
-        return generate_image_thumbnail(filepath, media_root=media_root)
+        return generate_image_thumbnail(
+            filepath, media_root=media_root, size=(size, size), output_format=output_format
+        )
     elif suffix in SUPPORTED_VIDEO_FORMATS:
-        return generate_video_thumbnail(filepath, media_root=media_root)
+        return generate_video_thumbnail(
+            filepath, media_root=media_root, size=(size, size), output_format=output_format
+        )
 
     return None
 
 
+def ensure_thumbnail(filepath, media_root, width=None, output_format=None):
+    """
+    Generate a cached thumbnail variant unless it already exists.
+
+    Used for pre-generation; shares the single-flight lock with requests, so
+    a thumbnail being generated for a request is not generated twice.
+    Generation runs in the thumbnail pool if one is configured.
+
+    Returns:
+        True if the thumbnail is cached (or was generated), False if generation failed
+
+    Raises:
+        ThumbnailPoolSaturated: If the pool is full
+    """
+    output_format = output_format or get_preferred_thumbnail_format()
+    size = select_thumbnail_size(width)
+    kind, suffix = get_thumbnail_variant(filepath, size, output_format)
+    cache_key = get_cache_key(media_root, filepath, kind=kind, suffix=suffix)
+    if cache_key is None:
+        return run_generation(
+            get_generation_kind(filepath), generate_thumbnail,
+            filepath, media_root=media_root, width=size, output_format=output_format,
+        ) is not None
+
+    with single_flight(cache_key, THUMBNAIL_CACHE_ROOT):
+        if THUMBNAIL_STORE.contains(cache_key):
+            return True
+        return run_generation(
+            get_generation_kind(filepath), generate_thumbnail,
+            filepath, media_root=media_root, width=size, output_format=output_format,
+        ) is not None
+
+
+def is_thumbnail_fresh(filepath, media_root, width=None, output_format=None):
+    """Check whether a cached thumbnail exists for the current version of a media file."""
+    output_format = output_format or get_preferred_thumbnail_format()
+    kind, suffix = get_thumbnail_variant(filepath, select_thumbnail_size(width), output_format)
+    cache_key = get_cache_key(media_root, filepath, kind=kind, suffix=suffix)
+    return cache_key is not None and THUMBNAIL_STORE.contains(cache_key)
+
+
 def get_mime_type(filepath):
     """Get MIME type for a file."""
     if not isinstance(filepath, Path):
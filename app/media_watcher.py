@@ -0,0 +1,191 @@
+"""Polling watcher that turns changes below MEDIA_ROOT into cache updates."""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+from app.catalog import get_catalog, join_rel
+from app.directory_index import get_directory_index
+from app.media_handler import (
+    SUPPORTED_MEDIA_FORMATS,
+    ensure_thumbnail,
+    format_source_fingerprint,
+    remove_cached_files,
+)
+from app.thumbnail_pool import ThumbnailPoolSaturated
+
+logger = logging.getLogger(__name__)
+
+
+class MediaWatcher:
+    """
+    Detect created, modified and deleted media files by polling mtimes.
+
+    Each poll stats every known directory and only rescans those whose
+    mtime changed, so idle polls of large trees stay cheap. Files rewritten
+    in place (same name, directory mtime unchanged) are therefore not seen;
+    most tools write a temporary file and rename it, which is.
+
+    Changes are applied as:
+    - changed directories are invalidated in the directory index
+    - cached thumbnails and previews of the previous version of deleted or
+      modified files are removed
+    - created and modified files get their default thumbnail generated
+    - the search catalog (if configured) is re-crawled incrementally
+
+    The first poll only records the current state; use `flask thumbnails
+    warm` for files that existed before the watcher started.
+    """
+
+    def __init__(self, media_root, interval=5.0, regenerate=True):
+        self.media_root = Path(media_root).resolve()
+        self.interval = interval
+        self.regenerate = regenerate
+        self.last_stats = None
+        self._directories = {}
+        self._pending = deque()
+        self._primed = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="media-watcher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.last_stats = self.poll()
+                if self.last_stats["events"]:
+                    logger.info(
+                        "media watcher poll created=%d modified=%d deleted=%d regenerated=%d",
+                        self.last_stats["created"], self.last_stats["modified"],
+                        self.last_stats["deleted"], self.last_stats["regenerated"],
+                    )
+            except Exception:
+                logger.exception("media watcher poll failed")
+            self._stop.wait(self.interval)
+
+    def scan(self):
+        """
+        Compare the tree with the previous scan.
+
+        Returns:
+            List of (event, relative path, previous (size, mtime_ns) or None)
+            tuples, where event is one of created, modified, deleted (files),
+            changed_dir or deleted_dir
+        """
+        events = []
+        seen = set()
+        pending = [""]
+        while pending:
+            rel_dir = pending.pop()
+            try:
+                mtime_ns = os.stat(self.media_root / rel_dir).st_mtime_ns
+            except OSError:
+                continue
+            seen.add(rel_dir)
+
+            known = self._directories.get(rel_dir)
+            if known is not None and known[0] == mtime_ns:
+                pending.extend(known[2])
+                continue
+
+            try:
+                files, subdirectories = self._read_directory(rel_dir)
+            except OSError:
+                continue
+            previous_files = known[1] if known is not None else {}
+            self._directories[rel_dir] = (mtime_ns, files, subdirectories)
+            pending.extend(subdirectories)
+
+            events.append(("changed_dir", rel_dir, None))
+            for name, signature in files.items():
+                if name not in previous_files:
+                    events.append(("created", join_rel(rel_dir, name), None))
+                elif previous_files[name] != signature:
+                    events.append(("modified", join_rel(rel_dir, name), previous_files[name]))
+            for name in previous_files.keys() - files.keys():
+                events.append(("deleted", join_rel(rel_dir, name), previous_files[name]))
+
+        for rel_dir in self._directories.keys() - seen:
+            _, files, _ = self._directories.pop(rel_dir)
+            events.extend(("deleted", join_rel(rel_dir, name), signature) for name, signature in files.items())
+            events.append(("deleted_dir", rel_dir, None))
+
+        # The first scan is the baseline, not a burst of creations
+        if not self._primed:
+            self._primed = True
+            return []
+        return events
+
+    def _read_directory(self, rel_dir):
+        files = {}
+        subdirectories = []
+        with os.scandir(self.media_root / rel_dir) as it:
+            for item in it:
+                name = item.name
+                if name.startswith('.'):
+                    continue
+                try:
+                    if item.is_dir():
+                        subdirectories.append(join_rel(rel_dir, name))
+                    elif os.path.splitext(name)[1].lower() in SUPPORTED_MEDIA_FORMATS:
+                        st = item.stat()
+                        files[name] = (st.st_size, st.st_mtime_ns)
+                except OSError:
+                    continue
+        return files, subdirectories
+
+    def poll(self):
+        """
+        Scan once and apply the resulting events.
+
+        Returns:
+            Dict with events, created, modified, deleted, regenerated and elapsed
+        """
+        began = time.perf_counter()
+        events = self.scan()
+        stats = {"events": len(events), "created": 0, "modified": 0, "deleted": 0, "regenerated": 0}
+        index = get_directory_index()
+
+        for event, rel_path, previous in events:
+            path = self.media_root / rel_path
+            if event in ("changed_dir", "deleted_dir"):
+                index.invalidate(path)
+                continue
+
+            stats[event] += 1
+            if previous is not None:
+                size, mtime_ns = previous
+                remove_cached_files(self.media_root, path, format_source_fingerprint(mtime_ns, size))
+            if event in ("created", "modified") and self.regenerate:
+                self._pending.append(path)
+
+        stats["regenerated"] = self._regenerate()
+
+        catalog = get_catalog()
+        if catalog is not None and events:
+            catalog.crawl(self.media_root)
+
+        stats["elapsed"] = time.perf_counter() - began
+        return stats
+
+    def _regenerate(self):
+        """Generate thumbnails of queued files; keep them queued while the pool is saturated."""
+        generated = 0
+        while self._pending:
+            path = self._pending[0]
+            try:
+                if path.exists() and ensure_thumbnail(path, self.media_root):
+                    generated += 1
+            except ThumbnailPoolSaturated:
+                break
+            except Exception as e:
+                logger.warning("media watcher failed to generate thumbnail for %s: %s", path, e)
+            self._pending.popleft()
+        return generated
@@ -0,0 +1,256 @@
+"""In-process metrics rendered in the Prometheus text format."""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+
+# Default latency buckets in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Metrics are rendered in registration order
+REGISTRY = []
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label_value(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Metric:
+    """
+    Base of the metric types: a family of children, one per label tuple.
+
+    Children are created on first use and updated under a single lock per
+    metric, so an update costs a dict lookup and an uncontended lock.
+    """
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def labels(self, *values):
+        """Get the child of a label tuple, creating it on first use."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def samples(self):
+        """Yield (suffix, label names, label values, value) for rendering."""
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, names, values, value in self.samples():
+            lines.append(f"{self.name}{suffix}{format_labels(names, values)} {format_value(value)}")
+        return "\n".join(lines)
+
+
+class CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self, lock):
+        self.value = 0
+        self._lock = lock
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(Metric):
+    """Monotonically increasing count."""
+
+    kind = "counter"
+
+    def _new_child(self):
+        return CounterChild(self._lock)
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            yield "_total", self.labelnames, values, child.value
+
+
+class Gauge(Metric):
+    """
+    Value read at render time from a callback.
+
+    The callback returns a number, or a dict of label tuple -> number.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+
+    def set_function(self, function):
+        self.function = function
+
+    def samples(self):
+        if self.function is None:
+            return
+        value = self.function()
+        if isinstance(value, dict):
+            for values, number in value.items():
+                yield "", self.labelnames, values, number
+        elif value is not None:
+            yield "", self.labelnames, (), value
+
+
+class HistogramChild:
+    __slots__ = ("upper_bounds", "counts", "sum", "_lock")
+
+    def __init__(self, upper_bounds, lock):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self._lock = lock
+
+    def observe(self, value):
+        index = bisect_left(self.upper_bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        """Observe the duration of the with block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Histogram(Metric):
+    """Distribution of observations in cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.upper_bounds = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return HistogramChild(self.upper_bounds, self._lock)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def samples(self):
+        names = self.labelnames + ("le",)
+        for values, child in list(self._children.items()):
+            with self._lock:
+                counts = list(child.counts)
+                total = child.sum
+            cumulative = 0
+            for bound, count in zip(self.upper_bounds + (float("inf"),), counts):
+                cumulative += count
+                yield "_bucket", names, values + (format_value(bound),), cumulative
+            yield "_sum", self.labelnames, values, total
+            yield "_count", self.labelnames, values, cumulative
+
+
+def render_metrics():
+    """Render every registered metric in the Prometheus text exposition format."""
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+REQUEST_DURATION = Histogram(
+    "mediavault_request_duration_seconds",
+    "Time to build the response, by route and status (streamed bodies not included)",
+    ("route", "method", "status"),
+)
+THUMBNAIL_GENERATION = Histogram(
+    "mediavault_thumbnail_generation_seconds",
+    "Thumbnail and preview generation time as seen by the caller (including pool wait)",
+    ("kind",),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+THUMBNAIL_CACHE_LOOKUPS = Counter(
+    "mediavault_thumbnail_cache_lookups",
+    "Thumbnail lookups by cache tier and result",
+    ("tier", "result"),
+)
+THUMBNAIL_CACHE_HIT_RATIO = Gauge(
+    "mediavault_thumbnail_cache_hit_ratio",
+    "Share of thumbnail lookups answered by each cache tier",
+    ("tier",),
+)
+MEDIA_BYTES_SERVED = Counter(
+    "mediavault_media_bytes_served",
+    "Bytes of media responses (by Content-Length), by response kind",
+    ("kind",),
+)
+THUMBNAIL_POOL_QUEUE_DEPTH = Gauge(
+    "mediavault_thumbnail_pool_queue_depth",
+    "Jobs running or waiting in the thumbnail pool",
+)
+THUMBNAIL_POOL_REJECTED = Counter(
+    "mediavault_thumbnail_pool_rejected",
+    "Jobs rejected because the thumbnail pool was saturated",
+)
+THUMBNAIL_POOL_RESTARTS = Counter(
+    "mediavault_thumbnail_pool_restarts",
+    "Thumbnail pool restarts after a worker process died",
+)
+
+
+def get_cache_hit_ratios():
+    """Get tier -> hit ratio from the lookup counters."""
+    lookups = {}
+    for (tier, result), child in list(THUMBNAIL_CACHE_LOOKUPS._children.items()):
+        hits, total = lookups.get(tier, (0, 0))
+        lookups[tier] = (hits + (child.value if result == "hit" else 0), total + child.value)
+    return {(tier,): hits / total for tier, (hits, total) in lookups.items() if total}
+
+
+THUMBNAIL_CACHE_HIT_RATIO.set_function(get_cache_hit_ratios)
+
+
+def install_request_metrics(app):
+    """Time every request of app into REQUEST_DURATION."""
+    from flask import g, request
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def observe_request_duration(response):
+        started = g.pop("request_started", None)
+        if started is not None:
+            # The URL rule keeps the label set bounded, unlike the path
+            route = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+            REQUEST_DURATION.labels(route, request.method, str(response.status_code)).observe(
+                time.perf_counter() - started
+            )
+        return response
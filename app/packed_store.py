@@ -0,0 +1,251 @@
+"""Packed thumbnail store: append-only segment files with an SQLite offset index."""
+import mmap
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from app.concurrency import ThreadLocalConnections, file_lock
+from app.thumbnail_store import ThumbnailStore
+
+
+PACKS_DIRNAME = "packs"
+INDEX_NAME = "index.sqlite3"
+
+# New entries go to a new segment once the active one reaches this size
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+
+# Segments with at least this fraction of dead bytes are rewritten by compaction
+COMPACT_DEAD_FRACTION = 0.25
+
+# Mappings of segments removed by another process's compaction are dropped this often
+UNMAP_CHECK_SECONDS = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    segment INTEGER NOT NULL,
+    start INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    stored REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_segment ON entries (segment);
+"""
+
+
+class PackedThumbnailStore(ThumbnailStore):
+    """
+    Entries appended to a few large segment files below root/packs.
+
+    The index (key -> segment, offset, length) lives in SQLite, shared by
+    all processes. Reads are memoryview slices of a read-only mmap of the
+    segment, so a cold read costs an index lookup and page faults instead
+    of an open/read/close per file, and millions of thumbnails take a
+    handful of inodes. Appends are serialized across processes with flock.
+
+    Deleted and evicted entries only leave their index row; compact() (run
+    after every gc) rewrites segments with COMPACT_DEAD_FRACTION or more
+    dead bytes into the active segment and removes them.
+    """
+
+    backend = "packed"
+
+    def __init__(self, root, max_bytes=None, eviction="lru"):
+        super().__init__(root, max_bytes, eviction)
+        self.packs = self.root / PACKS_DIRNAME
+        self.packs.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.packs / INDEX_NAME
+        self._connections = ThreadLocalConnections(self.db_path)
+        self._maps = {}
+        self._maps_lock = threading.Lock()
+        self._thread_write_lock = threading.Lock()
+        self._unmap_checked = time.monotonic()
+        db = self._connect()
+        db.executescript(SCHEMA)
+        db.commit()
+
+    def _connect(self):
+        return self._connections.get()
+
+    def get_segment_path(self, segment):
+        return self.packs / f"{segment:08d}.pack"
+
+    def list_segments(self):
+        segments = []
+        with os.scandir(self.packs) as it:
+            for item in it:
+                stem, _, suffix = item.name.partition(".")
+                if suffix == "pack" and stem.isdigit():
+                    segments.append(int(stem))
+        return sorted(segments)
+
+    @contextmanager
+    def write_lock(self):
+        """Serialize appends and compaction across threads and processes."""
+        with self._thread_write_lock, file_lock(self.packs / ".write.lock"):
+            yield
+
+    def _active_segment(self):
+        """Get the segment to append to (call with the write lock held)."""
+        segments = self.list_segments()
+        if not segments:
+            return 1
+        segment = segments[-1]
+        if self.get_segment_path(segment).stat().st_size >= SEGMENT_MAX_BYTES:
+            return segment + 1
+        return segment
+
+    def _append(self, segment, data):
+        """Append bytes to a segment and return their offset (call with the write lock held)."""
+        with open(self.get_segment_path(segment), "ab") as f:
+            start = f.tell()
+            f.write(data)
+        return start
+
+    def put(self, key, data):
+        with self.write_lock():
+            segment = self._active_segment()
+            start = self._append(segment, data)
+            # The data is complete before the index points at it
+            db = self._connect()
+            db.execute(
+                "INSERT OR REPLACE INTO entries (key, segment, start, length, stored) VALUES (?, ?, ?, ?, ?)",
+                (key, segment, start, len(data), time.time()),
+            )
+            db.commit()
+        self.record_write(key, len(data))
+
+    def _map(self, segment, end):
+        """Get a read-only mmap of a segment covering at least end bytes, or None."""
+        with self._maps_lock:
+            self._drop_removed_maps()
+            mapped = self._maps.get(segment)
+            if mapped is None or len(mapped) < end:
+                # Segments only grow, so a longer mapping replaces the old one;
+                # views handed out earlier keep the old mapping alive
+                try:
+                    with open(self.get_segment_path(segment), "rb") as f:
+                        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                except (FileNotFoundError, ValueError):
+                    return None
+                self._maps[segment] = mapped
+            return mapped if len(mapped) >= end else None
+
+    def _drop_removed_maps(self):
+        # An open mapping keeps a compacted segment's disk space allocated
+        now = time.monotonic()
+        if now - self._unmap_checked < UNMAP_CHECK_SECONDS:
+            return
+        self._unmap_checked = now
+        for segment in [s for s in self._maps if not self.get_segment_path(s).exists()]:
+            del self._maps[segment]
+
+    def get(self, key):
+        db = self._connect()
+        # A second lookup covers entries moved by a concurrent compaction
+        for _ in range(2):
+            row = db.execute("SELECT segment, start, length FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            segment, start, length = row
+            mapped = self._map(segment, start + length)
+            if mapped is not None:
+                self.access_log.record(key)
+                return memoryview(mapped)[start:start + length]
+        return None
+
+    def contains(self, key):
+        db = self._connect()
+        return db.execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone() is not None
+
+    def delete(self, key):
+        db = self._connect()
+        # SELECT, then DELETE: DELETE ... RETURNING needs SQLite 3.35
+        row = db.execute("SELECT length FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return 0
+        db.execute("DELETE FROM entries WHERE key = ?", (key,))
+        db.commit()
+        return row[0]
+
+    def iter_entries(self):
+        db = self._connect()
+        yield from db.execute("SELECT key, length, stored FROM entries").fetchall()
+
+    def _collect(self, max_bytes, max_age):
+        stats = super()._collect(max_bytes, max_age)
+        stats.update(self.compact())
+        return stats
+
+    def compact(self, dead_fraction=COMPACT_DEAD_FRACTION):
+        """
+        Rewrite segments with many dead bytes and remove them.
+
+        Live entries are appended to the active segment and their index rows
+        moved in one transaction per segment before the old file is removed.
+        If the active segment itself qualifies (a cache whose budget is
+        below SEGMENT_MAX_BYTES never leaves its first segment), a new
+        active segment is started and the old one compacted into it.
+
+        Returns:
+            Dict with segments_compacted, compacted_bytes (disk space freed)
+            and segment_bytes (disk space used afterwards)
+        """
+        stats = {"segments_compacted": 0, "compacted_bytes": 0}
+        db = self._connect()
+        with self.write_lock():
+            live = dict(db.execute("SELECT segment, SUM(length) FROM entries GROUP BY segment").fetchall())
+            sizes = {segment: self.get_segment_path(segment).stat().st_size for segment in self.list_segments()}
+            last = max(sizes, default=0)
+            candidates = [
+                segment for segment, size in sizes.items()
+                # An empty segment is only kept while it is the last one
+                if ((size - live.get(segment, 0)) / size >= dead_fraction if size else segment != last)
+            ]
+
+            # Tracked here instead of re-scanning the packs directory per entry
+            target = self._active_segment()
+            target_size = sizes.get(target, 0)
+            if target in candidates:
+                # Segment numbers are never reused, so the new one is created even if nothing moves
+                target, target_size = target + 1, 0
+                self.get_segment_path(target).touch()
+            for segment in sorted(candidates):
+                path = self.get_segment_path(segment)
+                size = sizes[segment]
+                live_bytes = live.get(segment, 0)
+
+                rows = db.execute(
+                    "SELECT key, start, length FROM entries WHERE segment = ? ORDER BY start", (segment,)
+                ).fetchall()
+                moved = []
+                if rows:
+                    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as source:
+                        for key, start, length in rows:
+                            if target_size >= SEGMENT_MAX_BYTES:
+                                target, target_size = target + 1, 0
+                            moved.append((target, self._append(target, source[start:start + length]), key, segment))
+                            target_size += length
+                db.executemany("UPDATE entries SET segment = ?, start = ? WHERE key = ? AND segment = ?", moved)
+                db.commit()
+
+                path.unlink()
+                with self._maps_lock:
+                    self._maps.pop(segment, None)
+                stats["segments_compacted"] += 1
+                stats["compacted_bytes"] += size - live_bytes
+        stats["segment_bytes"] = sum(self.get_segment_path(s).stat().st_size for s in self.list_segments())
+        return stats
+
+    def stats(self):
+        db = self._connect()
+        entries, live_bytes = db.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM entries").fetchone()
+        segments = self.list_segments()
+        stats = super().stats()
+        stats.update({
+            "entries": entries,
+            "live_bytes": live_bytes,
+            "segments": len(segments),
+            "segment_bytes": sum(self.get_segment_path(s).stat().st_size for s in segments),
+        })
+        return stats
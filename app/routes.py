@@ -1,22 +1,39 @@
+import stat
 from pathlib import Path
-from flask import Blueprint, render_template, current_app, send_file, jsonify, request
+from flask import Blueprint, Response, render_template, current_app, jsonify, request
 from urllib.parse import quote
 
 from app.video_streaming import stream_file_with_ranges
+from app.http_cache import is_not_modified, last_modified_from_stat, not_modified_response, set_validators
 
+from app.catalog import get_catalog
+from app.metrics import render_metrics
 from app.security import secure_path
 from app.media_handler import (
+    SUPPORTED_IMAGE_FORMATS,
     list_directory,
     get_file_info,
-    get_thumbnail,
+    get_thumbnail_entry,
+    get_thumbnail_etag,
+    get_source_fingerprint,
+    get_thumbnail_formats,
+    get_thumbnail_sizes,
+    get_thumbnail_store,
+    get_video_preview,
+    negotiate_thumbnail_format,
     is_directory,
-    is_media_file,
+    get_media_neighbours,
     get_mime_type,
     set_thumbnail_cache_root,
 )
+from app.thumbnail_cache import get_memory_cache
+from app.thumbnail_pool import ThumbnailPoolSaturated
 
 bp = Blueprint("main", __name__)
 
+# Maximum number of paths accepted by one batch thumbnail request
+MAX_THUMBNAIL_BATCH = 100
+
 
 def get_breadcrumbs(rel_path):
     """Generate breadcrumb navigation from path."""
@@ -34,6 +51,96 @@ def get_breadcrumbs(rel_path):
     return breadcrumbs
 
 
+def requested_thumbnail_format(requested=None):
+    """
+    Get the thumbnail format for this request.
+
+    An explicitly requested, enabled format wins (data URIs in JSON responses
+    cannot rely on the Accept header of an <img> request). Otherwise only
+    explicitly listed types count, */* would accept every format.
+    """
+    if requested in get_thumbnail_formats():
+        return requested
+    accepted = {mimetype for mimetype, quality in request.accept_mimetypes if quality > 0}
+    return negotiate_thumbnail_format(accepted)
+
+
+def list_response(directory, media_root):
+    """
+    Build the JSON listing of a directory page.
+
+    Pages are addressed by ?cursor= (next_cursor of the previous page) or
+    ?offset=. ?sort= is name, mtime or size, prefixed with - for descending.
+
+    With ?thumbnails=1 every media item whose thumbnail is cached carries it
+    as a data URI (size from ?w=, format from ?format= or Accept), so a page
+    of the gallery needs a single request instead of one per item. Missing
+    thumbnails are not generated here (that would serialize a page's worth
+    of generation in one request); they are left null for the per-item URL,
+    and limit is capped at MAX_THUMBNAIL_BATCH.
+    """
+    offset = request.args.get("offset", 0, type=int)
+    limit = request.args.get("limit", 20, type=int)
+    sort = request.args.get("sort", "name")
+    embed_thumbnails = request.args.get("thumbnails", 0, type=int) == 1
+    if embed_thumbnails:
+        limit = min(limit, MAX_THUMBNAIL_BATCH)
+    width = request.args.get("w", type=int)
+    output_format = requested_thumbnail_format(request.args.get("format")) if embed_thumbnails else None
+
+    try:
+        result = list_directory(
+            directory,
+            offset=offset,
+            limit=limit,
+            sort=sort.lstrip("-"),
+            descending=sort.startswith("-"),
+            cursor=request.args.get("cursor") or None,
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if result is None:
+        return jsonify({"error": "Cannot access directory"}), 400
+
+    # Convert absolute paths to relative paths in items for API response
+    items_with_rel_paths = []
+    for item in result["items"]:
+        item_copy = item.copy()
+        item_path = Path(item["path"])
+        item_copy["path"] = str(item_path.relative_to(media_root))
+        if embed_thumbnails and item["is_media"]:
+            # Items left without a thumbnail fall back to the per-item URL
+            entry = get_thumbnail_entry(
+                item_path, media_root=media_root, width=width, output_format=output_format, generate=False
+            )
+            item_copy["thumbnail"] = entry.data_uri() if entry is not None else None
+        items_with_rel_paths.append(item_copy)
+
+    return jsonify({
+        "total": result["total"],
+        "offset": result["offset"],
+        "limit": result["limit"],
+        "items": items_with_rel_paths,
+        "has_more": result["has_more"],
+        "next_cursor": result["next_cursor"],
+    })
+
+
+def get_display_url(rel_path):
+    """
+    Get the URL the viewer loads to display an image, for prefetching.
+
+    Returns:
+        URL string, or None for files not shown as an image (videos)
+    """
+    suffix = Path(rel_path).suffix.lower()
+    if suffix not in SUPPORTED_IMAGE_FORMATS:
+        return None
+    if suffix in (".gif", ".svg"):
+        return f"/media/{quote(rel_path)}"
+    return f"/api/thumbnails/{quote(rel_path)}?w={get_thumbnail_sizes()[-1]}"
+
+
 @bp.route("/")
 def index():
     """Browse root media directory."""
@@ -62,6 +169,9 @@ def index():
         has_more=result["has_more"],
         breadcrumbs=get_breadcrumbs(""),
         current_path="",
+        preview_frames=current_app.config["PREVIEW_FRAME_COUNT"],
+        thumbnail_sizes=get_thumbnail_sizes(),
+        thumbnail_formats=get_thumbnail_formats(),
     )
 
 
@@ -106,6 +216,9 @@ def browse(filepath):
         has_more=result["has_more"],
         breadcrumbs=get_breadcrumbs(str(rel_path)),
         current_path=filepath,
+        preview_frames=current_app.config["PREVIEW_FRAME_COUNT"],
+        thumbnail_sizes=get_thumbnail_sizes(),
+        thumbnail_formats=get_thumbnail_formats(),
     )
 
 
@@ -132,48 +245,23 @@ def view(filepath):
     rel_path = safe.relative_to(media_root)
     parent_path = rel_path.parent
 
-    # Calculate prev/next navigation
-    parent_dir = safe.parent
-    prev_file = None
-    next_file = None
-    current_index = None
-    total_media_files = 0
-
-    try:
-        # Get all items in parent directory, sorted same as browse page
-        all_items = sorted(
-            (item for item in parent_dir.iterdir() if not item.name.startswith('.')),
-            key=lambda x: (not x.is_dir(), x.name.lower())
-        )
-        # Filter to media files only
-        media_items = [item for item in all_items if is_media_file(item)]
-        total_media_files = len(media_items)
-
-        # Find current file in media list
-        for idx, item in enumerate(media_items):
-            if item == safe:
-                current_index = idx
-                break
-
-        # Calculate prev/next relative paths
-        if current_index is not None:
-            if current_index > 0:
-                prev_file = str(media_items[current_index - 1].relative_to(media_root))
-            if current_index < len(media_items) - 1:
-                next_file = str(media_items[current_index + 1].relative_to(media_root))
-    except PermissionError:
-        pass
+    # Prev/next navigation from the cached, name-ordered media index
+    current_index, total_media_files, prev_media, next_media = get_media_neighbours(safe)
+    prev_file = str(prev_media.relative_to(media_root)) if prev_media else None
+    next_file = str(next_media.relative_to(media_root)) if next_media else None
 
     return render_template(
         "view.html",
         file_info=file_info,
         file_path=str(rel_path),
+        display_size=get_thumbnail_sizes()[-1],
         parent_path=str(parent_path) if str(parent_path) != "." else "",
         breadcrumbs=get_breadcrumbs(str(rel_path)),
         prev_file=prev_file,
         next_file=next_file,
         current_index=current_index,
         total_media_files=total_media_files,
+        next_display_url=get_display_url(next_file) if next_file else None,
     )
 
 
@@ -181,28 +269,7 @@ def view(filepath):
 def api_list_root():
     """API endpoint for root directory listing."""
     media_root = Path(current_app.config["MEDIA_ROOT"])
-    offset = request.args.get("offset", 0, type=int)
-    limit = request.args.get("limit", 20, type=int)
-
-    result = list_directory(media_root, offset=offset, limit=limit)
-    if result is None:
-        return jsonify({"error": "Cannot access directory"}), 400
-
-    # Convert absolute paths to relative paths in items for API response
-    items_with_rel_paths = []
-    for item in result["items"]:
-        item_copy = item.copy()
-        item_path = Path(item["path"])
-        item_copy["path"] = str(item_path.relative_to(media_root))
-        items_with_rel_paths.append(item_copy)
-
-    return jsonify({
-        "total": result["total"],
-        "offset": result["offset"],
-        "limit": result["limit"],
-        "items": items_with_rel_paths,
-        "has_more": result["has_more"],
-    })
+    return list_response(media_root, media_root)
 
 
 @bp.route("/api/list/<path:filepath>")
@@ -219,33 +286,53 @@ def api_list(filepath):
     if not is_directory(safe):
         return jsonify({"error": "Not a directory"}), 400
 
-    offset = request.args.get("offset", 0, type=int)
-    limit = request.args.get("limit", 20, type=int)
+    return list_response(safe, media_root)
 
-    result = list_directory(safe, offset=offset, limit=limit)
-    if result is None:
-        return jsonify({"error": "Cannot access directory"}), 400
 
-    # Convert absolute paths to relative paths in items for API response
-    items_with_rel_paths = []
-    for item in result["items"]:
-        item_copy = item.copy()
-        item_path = Path(item["path"])
-        item_copy["path"] = str(item_path.relative_to(media_root))
-        items_with_rel_paths.append(item_copy)
+@bp.route("/api/thumbnails", methods=["POST"])
+def api_thumbnail_batch():
+    """
+    API endpoint for fetching many thumbnails in one request.
 
-    return jsonify({
-        "total": result["total"],
-        "offset": result["offset"],
-        "limit": result["limit"],
-        "items": items_with_rel_paths,
-        "has_more": result["has_more"],
-    })
+    Expects a JSON body {"paths": [...], "w": 300, "format": "webp"} (w and
+    format optional) and returns {"thumbnails": {path: data URI or null}}.
+    """
+    media_root = Path(current_app.config["MEDIA_ROOT"])
+    body = request.get_json(silent=True) or {}
+    paths = body.get("paths")
+    if not isinstance(paths, list) or not all(isinstance(path, str) for path in paths):
+        return jsonify({"error": "Expected a list of paths"}), 400
+    if len(paths) > MAX_THUMBNAIL_BATCH:
+        return jsonify({"error": f"At most {MAX_THUMBNAIL_BATCH} paths per request"}), 400
+
+    width = body.get("w") if isinstance(body.get("w"), int) else None
+    output_format = requested_thumbnail_format(body.get("format"))
+
+    thumbnails = {}
+    for path in paths:
+        thumbnails[path] = None
+        safe = secure_path(media_root, path)
+        if safe is None:
+            continue
+        try:
+            st = safe.stat()
+        except OSError:
+            continue
+        if stat.S_ISDIR(st.st_mode):
+            continue
+        try:
+            entry = get_thumbnail_entry(safe, media_root=media_root, st=st, width=width, output_format=output_format)
+        except ThumbnailPoolSaturated:
+            continue
+        if entry is not None:
+            thumbnails[path] = entry.data_uri()
+
+    return jsonify({"thumbnails": thumbnails})
 
 
 @bp.route("/api/thumbnails/<path:filepath>")
 def api_thumbnail(filepath):
-    """API endpoint for thumbnail generation with caching."""
+    """API endpoint for thumbnail generation with caching (?w= picks the size, ?format= overrides Accept)."""
     media_root = Path(current_app.config["MEDIA_ROOT"])
 
     # Validate path
@@ -253,27 +340,130 @@ def api_thumbnail(filepath):
     if safe is None:
         return jsonify({"error": "Invalid path"}), 400
 
-    if not safe.exists():
+    try:
+        st = safe.stat()
+    except OSError:
         return jsonify({"error": "File not found"}), 404
 
-    if is_directory(safe):
+    if stat.S_ISDIR(st.st_mode):
         return jsonify({"error": "Cannot thumbnail directory"}), 400
 
-    # Get thumbnail (with caching)
-    thumbnail_data = get_thumbnail(safe, media_root=media_root)
-    if thumbnail_data is None:
+    width = request.args.get("w", type=int)
+    output_format = requested_thumbnail_format(request.args.get("format"))
+
+    # Revalidation is answered from the source stat alone
+    etag = get_thumbnail_etag(st, width, output_format)
+    last_modified = last_modified_from_stat(st)
+    if is_not_modified(etag, last_modified):
+        response = not_modified_response(etag, last_modified)
+        response.vary.add("Accept")
+        return response
+
+    # Get thumbnail (with memory and disk caching)
+    entry = get_thumbnail_entry(safe, media_root=media_root, st=st, width=width, output_format=output_format)
+    if entry is None:
         return jsonify({"error": "Cannot generate thumbnail"}), 400
 
-    # Determine MIME type based on source file
-    # GIF thumbnails are returned as animated GIFs, others as JPEG
-    is_gif = safe.suffix.lower() == ".gif"
-    mimetype = "image/gif" if is_gif else "image/jpeg"
+    # AVIF, WebP, JPEG or GIF depending on source and Accept (detected when cached)
+    response = Response(entry.data, mimetype=entry.mimetype)
+    response.headers['Content-Length'] = str(entry.length)
+    response.vary.add("Accept")
+    return set_validators(response, entry.etag, last_modified)
 
-    return send_file(
-        BytesIO(thumbnail_data),
-        mimetype=mimetype,
-        as_attachment=False,
-    )
+
+@bp.route("/api/previews/<path:filepath>")
+def api_preview(filepath):
+    """API endpoint for video preview sprite sheets (?format=json for the frame index)."""
+    media_root = Path(current_app.config["MEDIA_ROOT"])
+
+    # Validate path
+    safe = secure_path(media_root, filepath)
+    if safe is None:
+        return jsonify({"error": "Invalid path"}), 400
+
+    try:
+        st = safe.stat()
+    except OSError:
+        return jsonify({"error": "File not found"}), 404
+
+    if stat.S_ISDIR(st.st_mode):
+        return jsonify({"error": "Cannot preview directory"}), 400
+
+    # The frame count is part of the validator, so a changed PREVIEW_FRAME_COUNT is refetched
+    etag = f"p-{get_source_fingerprint(st)}-{current_app.config['PREVIEW_FRAME_COUNT']}"
+    last_modified = last_modified_from_stat(st)
+    if is_not_modified(etag, last_modified):
+        return not_modified_response(etag, last_modified)
+
+    preview = get_video_preview(safe, media_root=media_root)
+    if preview is None:
+        return jsonify({"error": "Cannot generate preview"}), 400
+
+    sprite_data, index = preview
+    if request.args.get("format") == "json":
+        response = jsonify(index)
+    else:
+        response = Response(sprite_data, mimetype="image/jpeg")
+        response.headers['Content-Length'] = str(len(sprite_data))
+    return set_validators(response, etag, last_modified)
+
+
+@bp.route("/api/search")
+def api_search():
+    """
+    API endpoint for searching the media catalog.
+
+    Query parameters: q (words matched as prefixes of name/path words),
+    type (image or video), min_size (bytes), sort (name, path, mtime or
+    size; prefix with - for descending), limit and cursor (next_cursor of
+    the previous page).
+    """
+    catalog = get_catalog()
+    if catalog is None:
+        return jsonify({"error": "Search catalog is not configured"}), 404
+
+    media_type = request.args.get("type") or None
+    if media_type not in (None, "image", "video"):
+        return jsonify({"error": "type must be image or video"}), 400
+
+    sort = request.args.get("sort", "name")
+    descending = sort.startswith("-")
+    try:
+        items, next_cursor = catalog.search(
+            q=request.args.get("q", ""),
+            media_type=media_type,
+            min_size=request.args.get("min_size", type=int),
+            sort=sort.lstrip("-"),
+            descending=descending,
+            limit=request.args.get("limit", 50, type=int),
+            cursor=request.args.get("cursor") or None,
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({
+        "items": items,
+        "next_cursor": next_cursor,
+        "has_more": next_cursor is not None,
+    })
+
+
+@bp.route("/api/stats")
+def api_stats():
+    """API endpoint exposing cache and thumbnail pool counters."""
+    pool = current_app.extensions.get("thumbnail_pool")
+    store = get_thumbnail_store()
+    return jsonify({
+        "thumbnail_memory_cache": get_memory_cache().stats(),
+        "thumbnail_pool": pool.stats() if pool is not None else None,
+        "thumbnail_store": store.stats() if store is not None else None,
+    })
+
+
+@bp.route("/metrics")
+def metrics():
+    """Prometheus metrics of this process."""
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
 
 
 @bp.route("/media/<path:filepath>")
@@ -294,7 +484,3 @@ def serve_media(filepath):
 
     mime_type = get_mime_type(safe)
     return stream_file_with_ranges(safe, mime_type)
-
-
-# Import BytesIO at the end to avoid circular imports
-from io import BytesIO
@@ -0,0 +1,74 @@
+"""Single-flight locking so concurrent requests generate a cached file once."""
+import hashlib
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from app.concurrency import file_lock
+
+
+# Lock files are striped by key hash so the lock directory stays bounded
+LOCK_STRIPES = 256
+LOCK_DIRNAME = ".locks"
+
+
+class KeyedLocks:
+    """
+    Per-key locks for threads of one process.
+
+    Locks are reference counted and dropped once nobody holds or waits on
+    them, so the table only grows with the number of concurrent keys.
+    """
+
+    def __init__(self):
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    @contextmanager
+    def hold(self, key):
+        with self._guard:
+            entry = self._locks.get(key)
+            if entry is None:
+                entry = self._locks[key] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._guard:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
+
+
+_KEYED_LOCKS = KeyedLocks()
+
+
+def get_lock_file_path(lock_root, key):
+    """Get the striped lock file below lock_root that guards a key."""
+    digest = hashlib.sha1(key.encode("utf-8")).digest()
+    stripe = int.from_bytes(digest[:2], "big") % LOCK_STRIPES
+    return Path(lock_root) / LOCK_DIRNAME / f"{stripe:02x}.lock"
+
+
+@contextmanager
+def single_flight(key, lock_root=None):
+    """
+    Hold the generation lock of a key.
+
+    Threads of this process wait on a per-key lock. If lock_root is given,
+    other processes (gunicorn workers, the warm pool) are excluded with
+    flock on a lock file below it. Callers should re-check the cache after
+    acquiring the lock, since the previous holder may have filled it.
+
+    Args:
+        key: String identifying the generated file (e.g. its cache path)
+        lock_root: Directory for cross-process lock files (None for in-process only)
+    """
+    with _KEYED_LOCKS.hold(key):
+        if lock_root is None:
+            yield
+            return
+
+        with file_lock(get_lock_file_path(lock_root, key)):
+            yield
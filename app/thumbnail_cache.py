@@ -0,0 +1,122 @@
+"""In-memory LRU cache for hot thumbnails."""
+import base64
+import threading
+from collections import OrderedDict
+
+
+# Default memory budget for cached thumbnails, in megabytes
+DEFAULT_MEMORY_CACHE_MB = 64
+
+
+def sniff_image_mimetype(data):
+    """Get the MIME type of thumbnail bytes from their signature."""
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[4:12] in (b"ftypavif", b"ftypavis"):
+        return "image/avif"
+    return "image/jpeg"
+
+
+class ThumbnailEntry:
+    """Thumbnail bytes together with precomputed response headers."""
+
+    __slots__ = ("data", "etag", "length", "mimetype")
+
+    def __init__(self, data, etag):
+        # WSGI servers only send bytes; views of a packed store are copied once here
+        self.data = data if isinstance(data, bytes) else bytes(data)
+        self.etag = etag
+        self.length = len(data)
+        self.mimetype = sniff_image_mimetype(data)
+
+    def data_uri(self):
+        """Get the thumbnail as a base64 data URI for embedding in JSON."""
+        return f"data:{self.mimetype};base64,{base64.b64encode(self.data).decode('ascii')}"
+
+
+class MemoryThumbnailCache:
+    """
+    Byte-size-bounded LRU cache of thumbnail entries.
+
+    The cache is per process; each gunicorn worker holds its own copy.
+    A budget of 0 disables caching.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Get an entry and mark it as recently used, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def peek(self, key):
+        """Get an entry without touching recency or hit counters, or None."""
+        with self._lock:
+            return self._entries.get(key)
+
+    def put(self, key, data, etag):
+        """Store thumbnail bytes and return the resulting entry."""
+        entry = ThumbnailEntry(data, etag)
+        if entry.length > self.max_bytes:
+            return entry
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= previous.length
+            self._entries[key] = entry
+            self.current_bytes += entry.length
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= evicted.length
+                self.evictions += 1
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        """Get hit/miss/eviction counters and current usage."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Shared cache used by media_handler (configured in create_app)
+MEMORY_CACHE = MemoryThumbnailCache(DEFAULT_MEMORY_CACHE_MB * 1024 * 1024)
+
+
+def set_memory_cache_size(size_mb):
+    """Set the memory budget (in megabytes) of the shared thumbnail cache."""
+    global MEMORY_CACHE
+    MEMORY_CACHE = MemoryThumbnailCache(int(size_mb * 1024 * 1024))
+
+
+def get_memory_cache():
+    """Get the shared in-memory thumbnail cache."""
+    return MEMORY_CACHE
@@ -0,0 +1,140 @@
+"""Bounded process pool for CPU-heavy thumbnail and preview generation."""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app.metrics import THUMBNAIL_POOL_REJECTED, THUMBNAIL_POOL_RESTARTS
+
+logger = logging.getLogger(__name__)
+
+
+class ThumbnailPoolSaturated(Exception):
+    """Raised when the pool's queue is full; the request should be retried later."""
+
+
+def get_worker_context():
+    """
+    Get the multiprocessing context for generation workers.
+
+    Forkserver (spawn where unavailable), because forking a threaded server
+    process is unsafe. Workers start fresh and must be configured with
+    configure_media_handler.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def _init_worker(config):
+    from app.media_handler import configure_media_handler
+    configure_media_handler(config)
+
+
+class ThumbnailPool:
+    """
+    Process pool that sheds load instead of queueing without bound.
+
+    Request threads hand generation work to the pool and wait for the
+    result, so serving threads stay free for I/O-bound routes. At most
+    max_queue jobs (running or waiting) are accepted; beyond that run()
+    raises ThumbnailPoolSaturated.
+
+    Workers are started with forkserver (spawn where unavailable) because
+    forking a threaded server process is unsafe. If a worker dies (OOM, a
+    crash in a decoder), the broken executor is replaced by a new one.
+    """
+
+    def __init__(self, workers, max_queue, config, timeout=None):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.rejected = 0
+        self.restarts = 0
+        self._config = config
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = self._start_executor()
+
+    def _start_executor(self):
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=get_worker_context(),
+            initializer=_init_worker,
+            initargs=(self._config,),
+        )
+
+    def _replace_broken(self, executor):
+        """Replace a broken executor, unless another thread already did."""
+        with self._lock:
+            if self._executor is not executor:
+                return
+            logger.warning("A thumbnail pool worker died; restarting the pool")
+            self._executor = self._start_executor()
+            self.restarts += 1
+            THUMBNAIL_POOL_RESTARTS.inc()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def run(self, fn, *args, **kwargs):
+        """
+        Run a picklable function in a worker process and return its result.
+
+        Raises:
+            ThumbnailPoolSaturated: If max_queue jobs are already pending, the
+                result took longer than the pool timeout, or the worker
+                running the job died
+        """
+        with self._lock:
+            if self._pending >= self.max_queue:
+                self.rejected += 1
+                THUMBNAIL_POOL_REJECTED.inc()
+                raise ThumbnailPoolSaturated()
+            self._pending += 1
+
+        try:
+            executor, future = self._submit(fn, *args, **kwargs)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            # The job keeps its queue slot until it finishes
+            raise ThumbnailPoolSaturated() from None
+        except BrokenProcessPool:
+            # Not retried: the job may be what killed the worker
+            self._replace_broken(executor)
+            raise ThumbnailPoolSaturated() from None
+
+    def _submit(self, fn, *args, **kwargs):
+        """Submit a job, restarting the executor if an earlier job broke it; returns (executor, future)."""
+        executor = self._executor
+        try:
+            future = executor.submit(fn, *args, **kwargs)
+        except BrokenProcessPool:
+            self._replace_broken(executor)
+            executor = self._executor
+            future = executor.submit(fn, *args, **kwargs)
+        return executor, future
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+
+    @property
+    def queue_depth(self):
+        """Number of jobs running or waiting in the pool."""
+        return self._pending
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "queue_depth": self._pending,
+            "rejected": self.rejected,
+            "restarts": self.restarts,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
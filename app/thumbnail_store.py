@@ -0,0 +1,373 @@
+"""Content-addressed disk store for thumbnails and previews with size-bounded eviction."""
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from app.concurrency import file_lock
+
+logger = logging.getLogger(__name__)
+
+
+# Eviction policies: least recently or least frequently used first
+EVICTION_POLICIES = ("lru", "lfu")
+
+# Collections evict down to this fraction of the budget, so they do not run on every write
+GC_LOW_WATER = 0.9
+
+# A collection is started after this fraction of the budget was written
+GC_TRIGGER_FRACTION = 0.1
+
+# Buffered accesses are appended to the log after this many keys or seconds
+ACCESS_FLUSH_KEYS = 256
+ACCESS_FLUSH_SECONDS = 30
+
+# The access log is compacted to one line per key once it grows beyond this size,
+# so it stays bounded without a size budget (gc also rewrites it)
+ACCESS_LOG_MAX_BYTES = 16 * 1024 * 1024
+
+OBJECTS_DIRNAME = "objects"
+ACCESS_LOG_NAME = "access.log"
+
+KEY_PATTERN = re.compile(r"^[0-9a-f]{32}\.[a-z0-9]+$")
+
+
+def make_cache_key(rel_path, fingerprint, kind, suffix):
+    """
+    Build the store key of a derived file.
+
+    Args:
+        rel_path: Media file path relative to MEDIA_ROOT
+        fingerprint: Source fingerprint (mtime and size) of the media file
+        kind: Kind of derived file ("thumb-300", "preview-10")
+        suffix: Suffix of the stored format (".webp", ".json")
+
+    Returns:
+        Hex digest of the inputs followed by the suffix
+    """
+    digest = hashlib.blake2b(f"{rel_path}\0{fingerprint}\0{kind}".encode("utf-8"), digest_size=16)
+    return digest.hexdigest() + suffix.lower()
+
+
+def write_file_atomic(path, data):
+    """
+    Write bytes to a temporary file next to path and rename it into place.
+
+    Readers see either the previous file or the complete new one, never a
+    partially written file. The temporary name starts with a dot so it is
+    never mistaken for a cached thumbnail.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class AccessLog:
+    """
+    Append-only log of cache accesses shared by all processes.
+
+    Accesses are buffered per process as key -> (last access, count) and
+    appended as "<time> <key> <count>" lines in a single write, so hits do
+    not cost a write each. Lines of all processes are summed when read, and
+    the log is compacted once it exceeds ACCESS_LOG_MAX_BYTES.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._pending = {}
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, key):
+        now = int(time.time())
+        with self._lock:
+            count = self._pending.get(key, (0, 0))[1]
+            self._pending[key] = (now, count + 1)
+            due = (
+                len(self._pending) >= ACCESS_FLUSH_KEYS
+                or time.monotonic() - self._last_flush >= ACCESS_FLUSH_SECONDS
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+        data = "".join(f"{last} {key} {count}\n" for key, (last, count) in pending.items())
+        try:
+            # O_APPEND keeps lines of concurrent writers intact
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, data.encode("ascii"))
+                oversized = os.fstat(fd).st_size > ACCESS_LOG_MAX_BYTES
+            finally:
+                os.close(fd)
+            if oversized:
+                self.compact()
+        except OSError as e:
+            logger.warning("Failed to write access log %s: %s", self.path, e)
+
+    def compact(self):
+        """Rewrite the log as one summary line per key, unless another process is at it."""
+        with file_lock(self.path.with_name(self.path.name + ".lock"), wait=False) as locked:
+            if locked:
+                # Lines appended by other processes meanwhile are lost, which only ages those keys
+                self.rewrite(self.read())
+
+    def read(self):
+        """Get key -> [last access, count] summed over all lines."""
+        accesses = {}
+        try:
+            with open(self.path, "r", encoding="ascii", errors="replace") as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) != 3:
+                        continue
+                    try:
+                        last, count = int(parts[0]), int(parts[2])
+                    except ValueError:
+                        continue
+                    entry = accesses.get(parts[1])
+                    if entry is None:
+                        accesses[parts[1]] = [last, count]
+                    else:
+                        entry[0] = max(entry[0], last)
+                        entry[1] += count
+        except FileNotFoundError:
+            pass
+        return accesses
+
+    def rewrite(self, accesses):
+        """Replace the log with one summary line per key."""
+        data = "".join(f"{last} {key} {count}\n" for key, (last, count) in accesses.items())
+        write_file_atomic(self.path, data.encode("ascii"))
+
+
+class ThumbnailStore:
+    """
+    Base class of thumbnail cache backends.
+
+    Keys come from make_cache_key. Values are immutable: a changed source
+    file yields new keys, and entries of old versions are reclaimed by gc().
+    Backends implement get, put, contains, delete and iter_entries; access
+    tracking and eviction are shared.
+
+    With max_bytes set, gc() evicts entries by policy until the store is
+    below GC_LOW_WATER of the budget. It runs in a background thread once
+    GC_TRIGGER_FRACTION of the budget has been written by this process, and
+    on demand via `flask thumbnails gc`.
+    """
+
+    backend = None
+
+    def __init__(self, root, max_bytes=None, eviction="lru"):
+        if eviction not in EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy: {eviction}")
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.eviction = eviction
+        self.access_log = AccessLog(self.root / ACCESS_LOG_NAME)
+        self.last_gc = None
+        self._written = 0
+        self._gc_thread = None
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Get the bytes (or a read-only bytes-like view) stored under key, or None."""
+        raise NotImplementedError
+
+    def put(self, key, data):
+        """Store bytes under key, replacing an existing value."""
+        raise NotImplementedError
+
+    def contains(self, key):
+        """Check whether key is stored, without counting an access."""
+        raise NotImplementedError
+
+    def delete(self, key):
+        """Remove key; returns the number of bytes freed."""
+        raise NotImplementedError
+
+    def iter_entries(self):
+        """Yield (key, size, time stored) of every entry."""
+        raise NotImplementedError
+
+    def touch(self, key):
+        """Record an access to key that was served from elsewhere (e.g. memory)."""
+        self.access_log.record(key)
+
+    def record_write(self, key, size):
+        """Count a stored entry as accessed and collect once enough was written."""
+        self.access_log.record(key)
+        if not self.max_bytes:
+            return
+        with self._lock:
+            self._written += size
+            due = self._written >= self.max_bytes * GC_TRIGGER_FRACTION
+            if due:
+                self._written = 0
+        if due:
+            self.start_gc()
+
+    def start_gc(self):
+        """Collect in a background thread unless a collection is already running."""
+        with self._lock:
+            if self._gc_thread is not None and self._gc_thread.is_alive():
+                return
+            self._gc_thread = threading.Thread(
+                target=self.gc, kwargs={"wait": False}, name="thumbnail-gc", daemon=True
+            )
+            self._gc_thread.start()
+
+    def gc(self, max_bytes=None, max_age=None, wait=True):
+        """
+        Evict entries beyond the size budget or not accessed for max_age seconds.
+
+        Only one process collects at a time (flock on root/.locks/gc.lock).
+
+        Args:
+            max_bytes: Size budget (defaults to the store's max_bytes)
+            max_age: Evict entries whose last access is older than this many seconds
+            wait: Wait for a collection running in another process instead of skipping
+
+        Returns:
+            Dict with entries, bytes, evicted, bytes_reclaimed and elapsed,
+            or None if another collection was running and wait is False
+        """
+        max_bytes = max_bytes if max_bytes is not None else self.max_bytes
+        with file_lock(self.root / ".locks" / "gc.lock", wait=wait) as locked:
+            if not locked:
+                return None
+            stats = self._collect(max_bytes, max_age)
+        self.last_gc = stats
+        return stats
+
+    def _collect(self, max_bytes, max_age):
+        began = time.perf_counter()
+        self.access_log.flush()
+        logged = self.access_log.read()
+
+        entries = []
+        total = 0
+        for key, size, stored in self.iter_entries():
+            last, count = logged.get(key, (int(stored), 1))
+            entries.append((key, size, last, count))
+            total += size
+
+        if self.eviction == "lfu":
+            entries.sort(key=lambda entry: (entry[3], entry[2]))
+        else:
+            entries.sort(key=lambda entry: entry[2])
+
+        stats = {"entries": len(entries), "bytes": total, "evicted": 0, "bytes_reclaimed": 0}
+        cutoff = time.time() - max_age if max_age else None
+        target = max_bytes * GC_LOW_WATER if max_bytes and total > max_bytes else None
+        kept = {}
+        for key, size, last, count in entries:
+            if (target is not None and total > target) or (cutoff is not None and last < cutoff):
+                freed = self.delete(key)
+                total -= freed
+                stats["evicted"] += 1
+                stats["bytes_reclaimed"] += freed
+            else:
+                kept[key] = (last, count)
+
+        # Keep the log bounded: one line per stored entry. Lines appended by
+        # other processes meanwhile are lost, which only ages those entries.
+        self.access_log.rewrite(kept)
+
+        stats["bytes"] = total
+        stats["entries"] -= stats["evicted"]
+        stats["elapsed"] = time.perf_counter() - began
+        return stats
+
+    def stats(self):
+        return {
+            "backend": self.backend,
+            "max_bytes": self.max_bytes,
+            "eviction": self.eviction,
+            "last_gc": self.last_gc,
+        }
+
+
+class FileThumbnailStore(ThumbnailStore):
+    """
+    One file per entry below root/objects, sharded by the first two bytes
+    of the key (objects/ab/cd/abcd...webp), so no directory grows beyond
+    1/65536 of the cache and the layout does not depend on the media tree.
+    """
+
+    backend = "files"
+
+    def __init__(self, root, max_bytes=None, eviction="lru"):
+        super().__init__(root, max_bytes, eviction)
+        self.objects = self.root / OBJECTS_DIRNAME
+        self.objects.mkdir(parents=True, exist_ok=True)
+
+    def get_path(self, key):
+        return self.objects / key[:2] / key[2:4] / key
+
+    def get(self, key):
+        try:
+            with open(self.get_path(key), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning("Failed to read cached entry %s: %s", key, e)
+            return None
+        self.access_log.record(key)
+        return data
+
+    def put(self, key, data):
+        path = self.get_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_file_atomic(path, data)
+        self.record_write(key, len(data))
+
+    def contains(self, key):
+        return self.get_path(key).exists()
+
+    def delete(self, key):
+        path = self.get_path(key)
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except OSError:
+            return 0
+        return size
+
+    def iter_entries(self):
+        """Yield (key, size, mtime) of every stored entry; files never logged count as accessed at their mtime."""
+        with os.scandir(self.objects) as firsts:
+            for first in firsts:
+                if not first.is_dir():
+                    continue
+                with os.scandir(first.path) as seconds:
+                    for second in seconds:
+                        if not second.is_dir():
+                            continue
+                        with os.scandir(second.path) as items:
+                            for item in items:
+                                if not KEY_PATTERN.match(item.name):
+                                    continue
+                                try:
+                                    st = item.stat()
+                                except OSError:
+                                    continue
+                                yield item.name, st.st_size, st.st_mtime
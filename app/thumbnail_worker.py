@@ -0,0 +1,163 @@
+"""Background thumbnail pre-generation using a process pool."""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from app.media_handler import (
+    MEDIA_HANDLER_CONFIG_KEYS,
+    SUPPORTED_MEDIA_FORMATS,
+    configure_media_handler,
+    ensure_thumbnail,
+    get_thumbnail_store,
+    is_thumbnail_fresh,
+)
+from app.thumbnail_pool import get_worker_context
+
+logger = logging.getLogger(__name__)
+
+
+def iter_media_files(root):
+    """
+    Walk a directory tree and yield every supported media file.
+
+    Hidden files and directories are skipped, matching the browse listing.
+
+    Args:
+        root: Directory to walk
+
+    Yields:
+        Path objects of media files
+    """
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+        for name in sorted(filenames):
+            if name.startswith('.'):
+                continue
+            if os.path.splitext(name)[1].lower() in SUPPORTED_MEDIA_FORMATS:
+                yield Path(dirpath) / name
+
+
+def get_worker_config(config):
+    """
+    Get the media handler settings of warm workers.
+
+    Workers start fresh, so they need the app's sizes, formats and store
+    settings, but without a size budget: each would otherwise run its own
+    background gc, racing the single gc of the parent after the run.
+    """
+    worker_config = {key: config[key] for key in MEDIA_HANDLER_CONFIG_KEYS}
+    worker_config["THUMBNAIL_CACHE_MAX_MB"] = None
+    return worker_config
+
+
+def _init_worker(config):
+    configure_media_handler(config)
+
+
+def _generate_one(args):
+    """Generate a single thumbnail inside a pool worker."""
+    filepath, media_root = args
+    try:
+        return ensure_thumbnail(filepath, media_root)
+    except Exception as e:
+        logger.warning("Failed to pre-generate thumbnail for %s: %s", filepath, e)
+        return False
+
+
+def warm_thumbnails(media_root, config, start=None, workers=None, progress=None):
+    """
+    Pre-generate missing thumbnails below a directory.
+
+    The default size is generated in the preferred format (what modern
+    browsers are served). Files whose cached thumbnail is already fresh are
+    skipped; the rest are generated in a ProcessPoolExecutor.
+
+    Args:
+        media_root: Root media directory
+        config: App config (or a dict with every key of MEDIA_HANDLER_CONFIG_KEYS)
+        start: Directory to walk (defaults to media_root)
+        workers: Number of worker processes (defaults to CPU count)
+        progress: Optional callback called with the stats dict after each file
+
+    Returns:
+        Dict with total, generated, skipped, failed, elapsed and rate (files/s)
+    """
+    media_root = Path(media_root).resolve()
+    start = Path(start).resolve() if start else media_root
+
+    stats = {"total": 0, "generated": 0, "skipped": 0, "failed": 0, "elapsed": 0.0, "rate": 0.0}
+    began = time.perf_counter()
+
+    pending = []
+    for filepath in iter_media_files(start):
+        stats["total"] += 1
+        if is_thumbnail_fresh(filepath, media_root):
+            stats["skipped"] += 1
+        else:
+            pending.append((filepath, media_root))
+
+    def update():
+        stats["elapsed"] = time.perf_counter() - began
+        processed = stats["generated"] + stats["failed"]
+        stats["rate"] = processed / stats["elapsed"] if stats["elapsed"] > 0 else 0.0
+        if progress:
+            progress(stats)
+
+    update()
+    store = get_thumbnail_store()
+
+    if pending:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=get_worker_context(),
+            initializer=_init_worker,
+            initargs=(get_worker_config(config),),
+        ) as executor:
+            for ok in executor.map(_generate_one, pending, chunksize=4):
+                if ok:
+                    stats["generated"] += 1
+                else:
+                    stats["failed"] += 1
+                update()
+
+    # Workers run without a budget (see get_worker_config); apply it once after the run
+    if pending and store is not None and store.max_bytes:
+        store.gc()
+
+    update()
+    return stats
+
+
+class ThumbnailWarmScheduler:
+    """Daemon thread that periodically pre-generates missing thumbnails."""
+
+    def __init__(self, media_root, config, interval, workers=None):
+        self.media_root = media_root
+        self.config = {key: config[key] for key in MEDIA_HANDLER_CONFIG_KEYS}
+        self.interval = interval
+        self.workers = workers
+        self.last_stats = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="thumbnail-warm", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.last_stats = warm_thumbnails(self.media_root, self.config, workers=self.workers)
+                if self.last_stats["generated"] or self.last_stats["failed"]:
+                    logger.info(
+                        "thumbnail warm run generated=%d failed=%d rate=%.1f",
+                        self.last_stats["generated"], self.last_stats["failed"], self.last_stats["rate"],
+                    )
+            except Exception:
+                logger.exception("thumbnail warm run failed")
+            self._stop.wait(self.interval)
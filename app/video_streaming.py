@@ -1,57 +1,222 @@
 """Video streaming support with HTTP Range requests."""
+import secrets
 from pathlib import Path
 from flask import Response, make_response, request, send_file
 
+from app.http_cache import (
+    if_range_matches,
+    is_not_modified,
+    last_modified_from_stat,
+    not_modified_response,
+    set_validators,
+)
+from app.media_handler import get_source_fingerprint
+from app.metrics import MEDIA_BYTES_SERVED
 
-def parse_range_header(range_header: str, file_size: int) -> tuple[int, int] | None:
+
+# Size of the chunks ranged responses are read and sent in
+STREAM_CHUNK_SIZE = 256 * 1024
+
+# Maximum number of ranges accepted in one Range header; more are ignored
+MAX_RANGES = 16
+
+# Ranges separated by fewer bytes than this are merged into one part
+RANGE_COALESCE_GAP = 80
+
+
+def iter_file_range(filepath: Path, start: int, length: int, chunk_size: int = STREAM_CHUNK_SIZE):
     """
-    Parse Range header and return (start, end) tuple.
+    Yield a byte range of a file in fixed-size chunks.
+
+    Args:
+        filepath: Path to the file
+        start: First byte to send
+        length: Number of bytes to send
+        chunk_size: Maximum size of each chunk
+
+    Yields:
+        Bytes chunks, at most chunk_size each
+    """
+    with open(filepath, 'rb') as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+class FileRangeReader:
+    """
+    Read-only file object limited to a byte range, for wsgi.file_wrapper.
+
+    fileno() exposes the underlying file (positioned at the range start), so
+    the server can send the range with sendfile(). read() stops at the end
+    of the range for servers that iterate the wrapper instead (SSL, sendfile
+    disabled), which would otherwise read to EOF and discard the rest.
+    """
+
+    def __init__(self, f, length: int):
+        self._file = f
+        self.remaining = length
 
-    Handles:
+    def fileno(self):
+        return self._file.fileno()
+
+    def read(self, size: int = -1) -> bytes:
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self._file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self._file.close()
+
+
+def stream_file_range(filepath: Path, start: int, length: int):
+    """
+    Get a response body for a byte range of a file.
+
+    Under gunicorn the server's wsgi.file_wrapper is used, which sends the
+    range with sendfile() and stops at the response's Content-Length, or
+    iterates the range reader when sendfile is unavailable.
+    Other servers get a chunked generator.
+    """
+    file_wrapper = request.environ.get('wsgi.file_wrapper')
+    if file_wrapper is not None and 'gunicorn' in request.environ.get('SERVER_SOFTWARE', ''):
+        f = open(filepath, 'rb')
+        f.seek(start)
+        return file_wrapper(FileRangeReader(f, length), STREAM_CHUNK_SIZE)
+    return iter_file_range(filepath, start, length)
+
+
+def parse_range_header(range_header: str, file_size: int) -> list[tuple[int, int]] | None:
+    """
+    Parse a Range header (RFC 7233) into a list of (start, end) tuples.
+
+    Handles any comma-separated combination of:
     - bytes=0-     (from start to end)
     - bytes=-500   (last 500 bytes)
     - bytes=100-   (from byte 100 to end)
     - bytes=0-499  (bytes 0 to 499)
 
+    Ranges that start beyond the end of the file are dropped, ends are
+    clamped to the file size, and overlapping or nearly adjacent ranges
+    are coalesced.
+
     Args:
         range_header: The Range header value from the request
         file_size: Total size of the file in bytes
 
     Returns:
-        Tuple of (start, end) byte positions, or None if invalid
+        Sorted list of (start, end) byte positions (empty if no range is
+        satisfiable), or None if the header is malformed or asks for more
+        than MAX_RANGES ranges and should be ignored
     """
-    if not range_header or not range_header.startswith('bytes='):
+    if not range_header:
         return None
 
-    range_spec = range_header[6:]  # Remove 'bytes='
+    unit, _, range_set = range_header.partition('=')
+    if unit.strip().lower() != 'bytes' or not range_set.strip():
+        return None
 
-    if '-' in range_spec:
-        parts = range_spec.split('-')
+    specs = [spec.strip() for spec in range_set.split(',')]
+    specs = [spec for spec in specs if spec]
+    if not specs or len(specs) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for spec in specs:
+        first, sep, last = spec.partition('-')
+        first = first.strip()
+        last = last.strip()
+        if not sep or (first and not first.isdigit()) or (last and not last.isdigit()):
+            return None
 
-        # bytes=0- (from start to end)
-        if parts[0] and not parts[1]:
-            start = int(parts[0])
-            end = file_size - 1
         # bytes=-500 (last 500 bytes)
-        elif not parts[0] and parts[1]:
-            end = file_size - 1
-            start = max(0, file_size - int(parts[1]))
-        # bytes=0-499 (specific range)
-        else:
-            start = int(parts[0])
-            end = min(int(parts[1]), file_size - 1)
+        if not first:
+            if not last:
+                return None
+            suffix_length = int(last)
+            if suffix_length == 0 or file_size == 0:
+                continue
+            ranges.append((max(0, file_size - suffix_length), file_size - 1))
+            continue
 
-        # Validate range
-        if start > end or start < 0:
+        start = int(first)
+        # bytes=0- (from start to end) or bytes=0-499 (specific range)
+        end = int(last) if last else None
+        if end is not None and end < start:
             return None
-        return (start, end)
+        if start >= file_size:
+            continue
+        ranges.append((start, file_size - 1 if end is None else min(end, file_size - 1)))
+
+    return coalesce_ranges(ranges)
+
+
+def coalesce_ranges(ranges: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    """
+    Merge overlapping ranges and ranges separated by small gaps.
+
+    Gaps smaller than a multipart part header are cheaper to send than to
+    split into a separate part.
+    """
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1 + RANGE_COALESCE_GAP:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def multipart_byteranges(filepath: Path, ranges: list[tuple[int, int]], mimetype: str, file_size: int):
+    """
+    Build a streamed multipart/byteranges body.
+
+    Args:
+        filepath: Path to the file
+        ranges: Sorted, non-overlapping (start, end) tuples
+        mimetype: MIME type of the file
+        file_size: Total size of the file in bytes
+
+    Returns:
+        Tuple of (boundary, content_length, body iterator)
+    """
+    boundary = secrets.token_hex(16)
+    part_headers = [
+        (
+            f"--{boundary}\r\n"
+            f"Content-Type: {mimetype}\r\n"
+            f"Content-Range: bytes {start}-{end}/{file_size}\r\n\r\n"
+        ).encode("ascii")
+        for start, end in ranges
+    ]
+    closing = f"--{boundary}--\r\n".encode("ascii")
+
+    content_length = len(closing)
+    for header, (start, end) in zip(part_headers, ranges):
+        content_length += len(header) + (end - start + 1) + 2
 
-    return None
+    def generate():
+        for header, (start, end) in zip(part_headers, ranges):
+            yield header
+            yield from iter_file_range(filepath, start, end - start + 1)
+            yield b"\r\n"
+        yield closing
+
+    return boundary, content_length, generate()
 
 
 def stream_file_with_ranges(filepath: Path, mimetype: str, cache_max_age: int = 31536000) -> Response:
     """
-    Serve a file with HTTP Range request support.
+    Serve a file with HTTP Range and conditional request support.
 
     Args:
         filepath: Path to the file to serve
@@ -62,46 +227,67 @@ def stream_file_with_ranges(filepath: Path, mimetype: str, cache_max_age: int =
         Flask response with appropriate headers for streaming
 
     The function handles:
-    - 200 OK with full file if no Range header
+    - 304 Not Modified if If-None-Match / If-Modified-Since match
+    - 200 OK with full file if no (valid) Range header or If-Range does not match
     - 206 Partial Content with requested range if Range header present
-    - 416 Range Not Satisfiable if range is invalid
+    - 206 multipart/byteranges if several ranges are requested
+    - 416 Range Not Satisfiable if no requested range is satisfiable
     """
-    from io import BytesIO
-    from flask import make_response
+    st = filepath.stat()
+    file_size = st.st_size
+    etag = get_source_fingerprint(st)
+    last_modified = last_modified_from_stat(st)
+    cache_control = f'public, max-age={cache_max_age}'
 
-    file_size = filepath.stat().st_size
+    if is_not_modified(etag, last_modified):
+        return not_modified_response(etag, last_modified, cache_control)
 
-    # Check for Range header
+    # Check for Range header (ignored if If-Range names an older version)
     range_header = request.headers.get('Range')
+    ranges = None
 
-    if range_header:
-        range_tuple = parse_range_header(range_header, file_size)
+    if range_header and if_range_matches(etag, last_modified):
+        ranges = parse_range_header(range_header, file_size)
 
-        if range_tuple is None:
-            # Invalid range - return 416
-            response = make_response("Range Not Satisfiable", 416)
-            response.headers['Content-Range'] = f'bytes */{file_size}'
-            return response
+    if ranges == []:
+        # No satisfiable range - return 416
+        response = make_response("Range Not Satisfiable", 416)
+        response.headers['Content-Range'] = f'bytes */{file_size}'
+        return response
 
-        start, end = range_tuple
+    if ranges and len(ranges) == 1:
+        start, end = ranges[0]
         content_length = end - start + 1
 
-        # Read only the requested range
-        with open(filepath, 'rb') as f:
-            f.seek(start)
-            data = f.read(content_length)
-
-        response = make_response(data, 206)
-        response.headers['Content-Type'] = mimetype
+        # Stream only the requested range with constant memory use
+        response = Response(
+            stream_file_range(filepath, start, content_length),
+            206,
+            mimetype=mimetype,
+            direct_passthrough=True,
+        )
         response.headers['Content-Range'] = f'bytes {start}-{end}/{file_size}'
         response.headers['Content-Length'] = str(content_length)
+        MEDIA_BYTES_SERVED.labels("range").inc(content_length)
         response.headers['Accept-Ranges'] = 'bytes'
-        response.headers['Cache-Control'] = f'public, max-age={cache_max_age}'
-        return response
+        response.headers['Cache-Control'] = cache_control
+        return set_validators(response, etag, last_modified)
+
+    if ranges:
+        # Several ranges - stream them as one multipart/byteranges response
+        boundary, content_length, body = multipart_byteranges(filepath, ranges, mimetype, file_size)
+        response = Response(body, 206, direct_passthrough=True)
+        response.headers['Content-Type'] = f'multipart/byteranges; boundary={boundary}'
+        response.headers['Content-Length'] = str(content_length)
+        MEDIA_BYTES_SERVED.labels("multipart").inc(content_length)
+        response.headers['Accept-Ranges'] = 'bytes'
+        response.headers['Cache-Control'] = cache_control
+        return set_validators(response, etag, last_modified)
 
     # No range request - serve full file
-    response = make_response(send_file(filepath, mimetype=mimetype), 200)
+    response = make_response(send_file(filepath, mimetype=mimetype, conditional=False, etag=False), 200)
     response.headers['Accept-Ranges'] = 'bytes'
     response.headers['Content-Length'] = str(file_size)
-    response.headers['Cache-Control'] = f'public, max-age={cache_max_age}'
-    return response
+    response.headers['Cache-Control'] = cache_control
+    MEDIA_BYTES_SERVED.labels("full").inc(file_size)
+    return set_validators(response, etag, last_modified)
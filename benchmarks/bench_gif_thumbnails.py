@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+Benchmark for animated GIF thumbnails.
+
+Synthesizes animated GIFs with many frames and compares the previous
+thumbnailer (every frame converted to RGBA, LANCZOS-resized and written
+with optimize=False) against generate_animated_thumbnail in GIF and WebP
+mode. Reports CPU time per GIF and output size.
+
+Usage:
+    python benchmarks/bench_gif_thumbnails.py [--frames 200 2000] [--resolution 480x360]
+"""
+import argparse
+import sys
+import tempfile
+import time
+from io import BytesIO
+from pathlib import Path
+
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import app.media_handler as media_handler  # noqa: E402
+
+
+def write_gif(path, frame_count, width, height):
+    """Write an animated GIF of a bouncing ball over a gradient."""
+    background = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    frames = []
+    for i in range(frame_count):
+        frame = background.copy()
+        draw = ImageDraw.Draw(frame)
+        x = (i * 7) % width
+        y = abs((i * 5) % (2 * height) - height)
+        draw.ellipse((x - 20, y - 20, x + 20, y + 20), fill=(255, (i * 3) % 256, 0))
+        frames.append(frame.quantize(colors=64))
+    frames[0].save(path, save_all=True, append_images=frames[1:], duration=40, loop=0)
+
+
+def legacy_thumbnail(path, size=(150, 150)):
+    """The animated thumbnail code generate_image_thumbnail used previously."""
+    with Image.open(path) as img:
+        frames = []
+        durations = []
+        try:
+            while True:
+                frame = img.convert("RGBA")
+                durations.append(img.info.get('duration', 100))
+                frame.thumbnail(size, Image.Resampling.LANCZOS)
+                frames.append(frame)
+                img.seek(img.tell() + 1)
+        except EOFError:
+            pass
+        output = BytesIO()
+        frames[0].save(output, format="GIF", save_all=True, append_images=frames[1:],
+                       duration=durations, loop=0, optimize=False)
+        return output.getvalue()
+
+
+def current_thumbnail(output_format):
+    def run(path):
+        media_handler.ANIMATED_THUMBNAIL_FORMAT = output_format
+        with Image.open(path) as img:
+            return media_handler.generate_animated_thumbnail(img)
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, nargs="+", default=[200, 2000])
+    parser.add_argument("--resolution", default="480x360")
+    args = parser.parse_args()
+    width, height = (int(v) for v in args.resolution.split("x"))
+
+    engines = (
+        ("legacy", legacy_thumbnail),
+        ("gif", current_thumbnail("gif")),
+        ("webp", current_thumbnail("webp")),
+    )
+
+    print(f"{'frames':>7} {'engine':>7} {'CPU s':>7} {'out KB':>8} {'out frames':>10} {'duration ms':>11}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for frame_count in args.frames:
+            path = Path(tmp) / f"anim_{frame_count}.gif"
+            write_gif(path, frame_count, width, height)
+            for name, func in engines:
+                start = time.process_time()
+                data = func(path)
+                cpu = time.process_time() - start
+                with Image.open(BytesIO(data)) as out:
+                    total_duration = 0
+                    for i in range(out.n_frames):
+                        out.seek(i)
+                        out.load()
+                        total_duration += out.info.get('duration', 0)
+                    print(f"{frame_count:>7} {name:>7} {cpu:>7.2f} {len(data) / 1024:>8.1f} "
+                          f"{out.n_frames:>10} {total_duration:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+"""
+Benchmark for static image thumbnail decoding.
+
+Writes large JPEGs and thumbnails them three ways:
+- full:     decode every pixel, then resize
+- previous: the previous code path (Image.thumbnail, which already applies
+            draft mode implicitly through its reducing_gap)
+- current:  generate_image_thumbnail (embedded EXIF preview, then explicit
+            draft mode)
+The images are written with and without an embedded EXIF preview. Each run
+is a fresh subprocess so peak RSS is measured in isolation. Reports
+latency, peak RSS and both per megapixel.
+
+Usage:
+    python benchmarks/bench_image_decode.py [--megapixels 12 24 48]
+"""
+import argparse
+import json
+import resource
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from io import BytesIO
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+def exif_with_preview(preview_jpeg):
+    """Build a minimal little-endian EXIF block whose IFD1 holds a JPEG preview."""
+    ifd0 = struct.pack('<HI', 0, 14)
+    data_offset = 14 + 2 + 2 * 12 + 4
+    ifd1 = (
+        struct.pack('<H', 2)
+        + struct.pack('<HHII', 0x0201, 4, 1, data_offset)
+        + struct.pack('<HHII', 0x0202, 4, 1, len(preview_jpeg))
+        + struct.pack('<I', 0)
+    )
+    return b'Exif\x00\x00II*\x00' + struct.pack('<I', 8) + ifd0 + ifd1 + preview_jpeg
+
+
+def write_jpeg(path, megapixels, embed_preview):
+    """Write a 3:2 JPEG with gradients and noise (compresses like a photo)."""
+    import numpy as np
+    from PIL import Image
+
+    width = int((megapixels * 1_000_000 * 1.5) ** 0.5)
+    height = int(width / 1.5)
+    rng = np.random.default_rng(0)
+    xs = np.linspace(0, 255, width, dtype=np.float32)
+    ys = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    base = (xs + ys) / 2
+    pixels = np.empty((height, width, 3), dtype=np.uint8)
+    for channel in range(3):
+        noise = rng.integers(0, 32, size=(height, width), dtype=np.uint8)
+        pixels[..., channel] = (base * (channel + 1) / 3).astype(np.uint8) + noise
+    image = Image.fromarray(pixels)
+
+    exif = b""
+    if embed_preview:
+        preview = image.resize((240, 160))
+        buffer = BytesIO()
+        preview.save(buffer, "JPEG", quality=80)
+        exif = exif_with_preview(buffer.getvalue())
+    image.save(path, "JPEG", quality=90, exif=exif)
+
+
+def full_decode(path, size=(150, 150)):
+    """Decode every pixel before resizing."""
+    from PIL import Image
+
+    with Image.open(path) as img:
+        img.load()
+        img.thumbnail(size, Image.Resampling.LANCZOS)
+        output = BytesIO()
+        img.save(output, format="JPEG", quality=85)
+        return output.getvalue()
+
+
+def previous(path, size=(150, 150)):
+    """The static image path generate_image_thumbnail used previously."""
+    from PIL import Image
+
+    with Image.open(path) as img:
+        img.thumbnail(size, Image.Resampling.LANCZOS)
+        output = BytesIO()
+        img.save(output, format="JPEG", quality=85)
+        return output.getvalue()
+
+
+def peak_rss_mb():
+    """
+    Peak RSS of this process in MB.
+
+    VmHWM is used instead of ru_maxrss because ru_maxrss survives exec and
+    would report the parent's peak (which generated the image).
+    """
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_mode(mode, path):
+    from app.media_handler import generate_image_thumbnail
+
+    func = {"full": full_decode, "previous": previous, "current": generate_image_thumbnail}[mode]
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    func(path)
+    elapsed = time.perf_counter() - start
+    return {"seconds": elapsed, "rss_growth_mb": peak_rss_mb() - baseline}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--megapixels", type=int, nargs="+", default=[12, 24, 48])
+    parser.add_argument("--mode", choices=["full", "previous", "current"], help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.path)))
+        return
+
+    print(f"{'MP':>4} {'EXIF':>5} {'decode':>8} {'ms':>8} {'ms/MP':>7} {'RSS MB':>7} {'RSS MB/MP':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for megapixels in args.megapixels:
+            for embed_preview in (False, True):
+                path = Path(tmp) / f"image_{megapixels}mp_{int(embed_preview)}.jpg"
+                write_jpeg(path, megapixels, embed_preview)
+                for mode in ("full", "previous", "current"):
+                    output = subprocess.check_output(
+                        [sys.executable, __file__, "--mode", mode, "--path", str(path)], cwd=ROOT
+                    )
+                    result = json.loads(output.decode().strip().splitlines()[-1])
+                    ms = result["seconds"] * 1000
+                    rss = result["rss_growth_mb"]
+                    print(
+                        f"{megapixels:>4} {'yes' if embed_preview else 'no':>5} {mode:>8} {ms:>8.1f} "
+                        f"{ms / megapixels:>7.2f} {rss:>7.1f} {rss / megapixels:>9.2f}"
+                    )
+
+
+if __name__ == "__main__":
+    main()
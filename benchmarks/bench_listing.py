@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark for directory listing.
+
+Compares the original Path-based listing (iterdir + sort on is_dir() +
+get_file_info per item) with the os.scandir engine used by list_directory.
+Reports filesystem calls per item and listing latency for directories of
+1k, 10k and 100k entries.
+
+Usage:
+    python benchmarks/bench_listing.py [--sizes 1000 10000 100000] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.directory_index import scan_directory  # noqa: E402
+from app.media_handler import build_file_info, SUPPORTED_IMAGE_FORMATS, SUPPORTED_MEDIA_FORMATS  # noqa: E402
+
+
+class CallCounter:
+    """Count stat-family calls made through the os module and DirEntry objects."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __enter__(self):
+        self._stat = os.stat
+        self._lstat = os.lstat
+        self._scandir = os.scandir
+        counter = self
+
+        def counted_stat(*args, **kwargs):
+            counter.calls += 1
+            return counter._stat(*args, **kwargs)
+
+        def counted_lstat(*args, **kwargs):
+            counter.calls += 1
+            return counter._lstat(*args, **kwargs)
+
+        class CountedEntry:
+            def __init__(self, entry):
+                self._entry = entry
+                self._stat_result = None
+                self.name = entry.name
+                self.path = entry.path
+
+            def is_dir(self, **kwargs):
+                # d_type is filled in by readdir, no syscall on Linux
+                return self._entry.is_dir(**kwargs)
+
+            def stat(self, **kwargs):
+                if self._stat_result is None:
+                    counter.calls += 1
+                    self._stat_result = self._entry.stat(**kwargs)
+                return self._stat_result
+
+        class CountedScandir:
+            def __init__(self, path):
+                self._it = counter._scandir(path)
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                self._it.close()
+
+            def __iter__(self):
+                for entry in self._it:
+                    yield CountedEntry(entry)
+
+        os.stat = counted_stat
+        os.lstat = counted_lstat
+        os.scandir = CountedScandir
+        return self
+
+    def __exit__(self, *exc):
+        os.stat = self._stat
+        os.lstat = self._lstat
+        os.scandir = self._scandir
+
+
+def legacy_listing(dirpath):
+    """The listing algorithm list_directory used before the scandir engine."""
+    all_items = sorted(
+        (item for item in dirpath.iterdir() if not item.name.startswith('.')),
+        key=lambda x: (not x.is_dir(), x.name.lower())
+    )
+    items = []
+    for filepath in all_items:
+        if not filepath.exists():
+            continue
+        is_dir = filepath.is_dir()
+        suffix = filepath.suffix.lower()
+        items.append({
+            "name": filepath.name,
+            "path": str(filepath),
+            "is_dir": is_dir,
+            "is_media": suffix in SUPPORTED_MEDIA_FORMATS if not is_dir else False,
+            "type": "directory" if is_dir else "file",
+            "media_type": None if is_dir else ("image" if suffix in SUPPORTED_IMAGE_FORMATS else "video"),
+            "suffix": suffix,
+            "size": filepath.stat().st_size if filepath.is_file() else None,
+        })
+    return items
+
+
+def scandir_listing(dirpath):
+    """The scandir engine followed by building every item dict."""
+    return [
+        build_file_info(entry.name, dirpath / entry.name, entry.is_dir, entry.size)
+        for entry in scan_directory(dirpath)
+    ]
+
+
+def make_directory(root, count):
+    """Create a directory with `count` empty media files and a few subdirectories."""
+    dirpath = Path(root) / f"dir_{count}"
+    dirpath.mkdir()
+    for i in range(count // 100):
+        (dirpath / f"subdir_{i:05d}").mkdir()
+    for i in range(count - count // 100):
+        (dirpath / f"file_{i:06d}.jpg").touch()
+    return dirpath
+
+
+def measure(func, dirpath, repeat):
+    with CallCounter() as counter:
+        items = func(dirpath)
+    calls_per_item = counter.calls / max(len(items), 1)
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(dirpath)
+        timings.append(time.perf_counter() - start)
+    return calls_per_item, min(timings), sorted(timings)[len(timings) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'entries':>8} {'engine':>8} {'stat/item':>10} {'best ms':>10} {'median ms':>10}")
+    with tempfile.TemporaryDirectory() as root:
+        for size in args.sizes:
+            dirpath = make_directory(root, size)
+            for name, func in (("legacy", legacy_listing), ("scandir", scandir_listing)):
+                calls, best, median = measure(func, dirpath, args.repeat)
+                print(f"{size:>8} {name:>8} {calls:>10.2f} {best * 1000:>10.1f} {median * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+"""
+Benchmark of app startup time and per-process memory.
+
+Each run starts a fresh interpreter (like a new gunicorn worker), times
+importing the app and create_app, and reports the resident set size after
+startup, after serving a ranged /media request and after generating a
+thumbnail, along with which media libraries are loaded at each point.
+
+The eager mode imports OpenCV, NumPy and Pillow before the app, as
+media_handler did at module load before the backends were loaded lazily.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+MEDIA_LIBRARIES = ("cv2", "numpy", "PIL.Image")
+
+
+def current_rss_mb():
+    """Resident set size of this process from /proc (Linux)."""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def loaded_libraries():
+    return [name for name in MEDIA_LIBRARIES if name in sys.modules]
+
+
+def run_once(mode, media_dir, cache_dir):
+    start = time.perf_counter()
+    if mode == "eager":
+        import cv2  # noqa: F401
+        import numpy  # noqa: F401
+        from PIL import Image  # noqa: F401
+
+    from app import create_app
+
+    flask_app = create_app({"MEDIA_ROOT": media_dir, "THUMBNAIL_CACHE_ROOT": cache_dir, "LOG_LEVEL": "WARNING"})
+    startup = time.perf_counter() - start
+    result = {"mode": mode, "startup_ms": startup * 1000, "rss_startup_mb": current_rss_mb()}
+    result["libraries_startup"] = loaded_libraries()
+
+    client = flask_app.test_client()
+    response = client.get("/media/video.mp4", headers={"Range": "bytes=0-65535"})
+    assert response.status_code == 206, response.status_code
+    result["rss_media_mb"] = current_rss_mb()
+    result["libraries_media"] = loaded_libraries()
+
+    start = time.perf_counter()
+    response = client.get("/api/thumbnails/photo.jpg?w=300")
+    assert response.status_code == 200, response.status_code
+    result["first_thumbnail_ms"] = (time.perf_counter() - start) * 1000
+    result["rss_thumbnail_mb"] = current_rss_mb()
+    return result
+
+
+def write_media(media_dir):
+    from PIL import Image
+
+    Image.new("RGB", (1600, 1200), (90, 140, 200)).save(Path(media_dir) / "photo.jpg", quality=90)
+    (Path(media_dir) / "video.mp4").write_bytes(bytes(1024 * 1024))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--mode", choices=["eager", "lazy"], help=argparse.SUPPRESS)
+    parser.add_argument("--media-dir", help=argparse.SUPPRESS)
+    parser.add_argument("--cache-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_once(args.mode, args.media_dir, args.cache_dir)))
+        return
+
+    with tempfile.TemporaryDirectory() as media_dir:
+        write_media(media_dir)
+        print(
+            f"{'mode':>6} {'startup ms':>11} {'RSS MB':>7} {'after /media':>13} {'after thumb':>12} "
+            f"{'1st thumb ms':>13}  loaded at startup"
+        )
+        for mode in ("eager", "lazy"):
+            runs = []
+            for _ in range(args.runs):
+                # A fresh cache each run, so the first thumbnail is generated
+                with tempfile.TemporaryDirectory() as cache_dir:
+                    output = subprocess.check_output(
+                        [sys.executable, __file__, "--mode", mode, "--media-dir", media_dir, "--cache-dir", cache_dir],
+                        cwd=ROOT,
+                    )
+                runs.append(json.loads(output.decode().strip().splitlines()[-1]))
+
+            def median(key):
+                return statistics.median(run[key] for run in runs)
+
+            print(
+                f"{mode:>6} {median('startup_ms'):>11.0f} {median('rss_startup_mb'):>7.1f} "
+                f"{median('rss_media_mb'):>13.1f} {median('rss_thumbnail_mb'):>12.1f} "
+                f"{median('first_thumbnail_ms'):>13.0f}  {', '.join(runs[0]['libraries_startup']) or '-'}"
+            )
+
+
+if __name__ == "__main__":
+    main()
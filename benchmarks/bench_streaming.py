@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""
+Benchmark for large ranged /media responses.
+
+Serves `bytes=0-` of a large file through the Flask test client, once with
+the previous implementation (read the whole range into memory) and once
+with the chunked streaming used by stream_file_with_ranges. Each mode runs
+in a fresh subprocess so peak RSS is measured in isolation.
+
+Usage:
+    python benchmarks/bench_streaming.py [--size-mb 1024]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_mode(mode, media_dir):
+    from flask import make_response
+
+    from app import create_app
+    import app.video_streaming as video_streaming
+
+    if mode == "legacy":
+        def read_whole_range(filepath, start, length):
+            with open(filepath, 'rb') as f:
+                f.seek(start)
+                return make_response(f.read(length)).response
+        video_streaming.stream_file_range = read_whole_range
+
+    flask_app = create_app({"MEDIA_ROOT": media_dir, "THUMBNAIL_CACHE_ROOT": None})
+    client = flask_app.test_client()
+
+    baseline_rss = peak_rss_mb()
+    start = time.perf_counter()
+    response = client.get("/media/large.bin", headers={"Range": "bytes=0-"}, buffered=False)
+    sent = 0
+    for chunk in response.response:
+        sent += len(chunk)
+    response.close()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "mode": mode,
+        "status": response.status_code,
+        "bytes": sent,
+        "seconds": elapsed,
+        "throughput_mb_s": sent / 1024 / 1024 / elapsed,
+        "peak_rss_mb": peak_rss_mb(),
+        "rss_growth_mb": peak_rss_mb() - baseline_rss,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=1024)
+    parser.add_argument("--mode", choices=["legacy", "chunked"], help=argparse.SUPPRESS)
+    parser.add_argument("--media-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.media_dir)))
+        return
+
+    with tempfile.TemporaryDirectory() as media_dir:
+        with open(os.path.join(media_dir, "large.bin"), "wb") as f:
+            block = os.urandom(1024 * 1024)
+            for _ in range(args.size_mb):
+                f.write(block)
+
+        print(f"{'mode':>8} {'status':>6} {'MB':>8} {'MB/s':>8} {'peak RSS MB':>12} {'RSS growth MB':>14}")
+        for mode in ("legacy", "chunked"):
+            output = subprocess.check_output(
+                [sys.executable, __file__, "--mode", mode, "--media-dir", media_dir],
+                cwd=ROOT,
+            )
+            result = json.loads(output.decode().strip().splitlines()[-1])
+            print(
+                f"{result['mode']:>8} {result['status']:>6} {result['bytes'] / 1024 / 1024:>8.0f} "
+                f"{result['throughput_mb_s']:>8.0f} {result['peak_rss_mb']:>12.0f} {result['rss_growth_mb']:>14.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+"""
+Benchmark of the thumbnail cache layouts.
+
+Writes the same set of small random entries (~5 KB, like thumbnails) to the
+per-file store and to the packed store, then reports write throughput,
+warm and cold random reads, the time of a gc scan, and disk usage in bytes
+and inodes.
+
+Cold reads drop the page cache of the stored data with posix_fadvise
+before reading through a fresh store instance. Directory and inode caches
+cannot be dropped without root, so cold reads of the per-file layout are
+still cheaper here than on a server that has not touched the files.
+
+Usage:
+    python benchmarks/bench_thumbnail_store.py [--entries 20000] [--size-kb 5] [--reads 5000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.packed_store import PackedThumbnailStore  # noqa: E402
+from app.thumbnail_store import FileThumbnailStore, make_cache_key  # noqa: E402
+
+BACKENDS = {"files": FileThumbnailStore, "packed": PackedThumbnailStore}
+
+
+def disk_usage(root):
+    """Get (allocated bytes, inodes) of everything below root."""
+    allocated = 0
+    inodes = 0
+    for dirpath, dirnames, filenames in os.walk(root):
+        inodes += len(dirnames) + len(filenames)
+        for name in filenames:
+            allocated += os.lstat(os.path.join(dirpath, name)).st_blocks * 512
+    return allocated, inodes
+
+
+def drop_page_cache(root):
+    """Evict the files below root from the page cache."""
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            fd = os.open(os.path.join(dirpath, name), os.O_RDONLY)
+            try:
+                os.fsync(fd)
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            except OSError:
+                pass
+            finally:
+                os.close(fd)
+
+
+def time_reads(store, keys):
+    """Read keys the way the app does (one bytes copy) and return microseconds per read."""
+    start = time.perf_counter()
+    for key in keys:
+        data = store.get(key)
+        bytes(data)
+    return (time.perf_counter() - start) / len(keys) * 1e6
+
+
+def run(backend, root, entries, size, reads):
+    rng = random.Random(0)
+    keys = [make_cache_key(f"gallery/{i:07d}.jpg", "1-1", "thumb-300", ".webp") for i in range(entries)]
+    payload = os.urandom(size * 2)
+
+    store = BACKENDS[backend](root)
+    start = time.perf_counter()
+    for key in keys:
+        length = rng.randint(size // 2, size * 3 // 2)
+        offset = rng.randrange(0, len(payload) - length)
+        store.put(key, payload[offset:offset + length])
+    write_rate = entries / (time.perf_counter() - start)
+
+    sample = rng.sample(keys, min(reads, entries))
+    time_reads(store, sample)
+    warm = time_reads(store, sample)
+
+    drop_page_cache(root)
+    cold = time_reads(BACKENDS[backend](root), rng.sample(keys, min(reads, entries)))
+
+    start = time.perf_counter()
+    store.gc()
+    gc_seconds = time.perf_counter() - start
+
+    allocated, inodes = disk_usage(root)
+    print(
+        f"{backend:>7} {write_rate:>9.0f} {warm:>9.1f} {cold:>9.1f} {gc_seconds * 1000:>8.0f} "
+        f"{allocated / 1024 / 1024:>8.1f} {inodes:>7}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=20000)
+    parser.add_argument("--size-kb", type=float, default=5)
+    parser.add_argument("--reads", type=int, default=5000)
+    parser.add_argument("--backends", nargs="+", choices=list(BACKENDS), default=list(BACKENDS))
+    args = parser.parse_args()
+
+    size = int(args.size_kb * 1024)
+    print(f"{args.entries} entries of ~{size} bytes, {args.reads} random reads")
+    print(f"{'backend':>7} {'writes/s':>9} {'warm us':>9} {'cold us':>9} {'gc ms':>8} {'disk MB':>8} {'inodes':>7}")
+    for backend in args.backends:
+        with tempfile.TemporaryDirectory() as tmp:
+            run(backend, Path(tmp), args.entries, size, args.reads)
+
+
+if __name__ == "__main__":
+    main()
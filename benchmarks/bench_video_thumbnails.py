@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+"""
+Benchmark for video thumbnail extraction.
+
+Writes synthetic MP4s that fade in from black (so the first frame is
+black, like many real files) and compares the previous first-frame
+extraction with the seek-and-score engine used by generate_video_thumbnail.
+Reports milliseconds per file and the brightness/variance of the chosen
+frame.
+
+Usage:
+    python benchmarks/bench_video_thumbnails.py [--seconds 10 60] [--resolution 1280x720]
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.media_handler import generate_video_thumbnail, read_representative_frame  # noqa: E402
+
+
+def write_video(path, seconds, width, height, fps=25):
+    """Write a video that starts black and shows moving gradients afterwards."""
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    xs = np.linspace(0, 255, width, dtype=np.float32)
+    ys = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    fade_frames = fps  # one second of black
+    for i in range(seconds * fps):
+        if i < fade_frames:
+            frame = np.zeros((height, width, 3), dtype=np.uint8)
+        else:
+            base = (xs + ys + i * 3) % 256
+            frame = np.stack([base, 255 - base, (base * 2) % 256], axis=2).astype(np.uint8)
+        writer.write(frame)
+    writer.release()
+
+
+def first_frame(path):
+    """The previous extraction: decode the first frame only."""
+    cap = cv2.VideoCapture(str(path))
+    ret, frame = cap.read()
+    cap.release()
+    return frame if ret else None
+
+
+def representative_frame(path):
+    cap = cv2.VideoCapture(str(path))
+    try:
+        return read_representative_frame(cap)
+    finally:
+        cap.release()
+
+
+def measure(func, path, repeat):
+    timings = []
+    frame = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        frame = func(path)
+        timings.append(time.perf_counter() - start)
+    return frame, sorted(timings)[len(timings) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=int, nargs="+", default=[10, 60])
+    parser.add_argument("--resolution", default="1280x720")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    width, height = (int(v) for v in args.resolution.split("x"))
+
+    print(f"{'video':>10} {'engine':>15} {'ms/file':>8} {'brightness':>10} {'stddev':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for seconds in args.seconds:
+            path = Path(tmp) / f"video_{seconds}s.mp4"
+            write_video(path, seconds, width, height)
+            for name, func in (("first-frame", first_frame), ("representative", representative_frame)):
+                frame, median = measure(func, path, args.repeat)
+                gray = frame.mean(axis=2)
+                print(f"{seconds:>9}s {name:>15} {median * 1000:>8.1f} {gray.mean():>10.1f} {gray.std():>8.1f}")
+
+            start = time.perf_counter()
+            generate_video_thumbnail(path)
+            print(f"{seconds:>9}s {'full thumbnail':>15} {(time.perf_counter() - start) * 1000:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+"""
+Deterministic media corpus for the benchmark suite.
+
+Synthesizes, from fixed seeds:
+- photos/     camera-sized JPEGs
+- animations/ animated GIFs with moving shapes
+- videos/     short MP4s written with OpenCV's VideoWriter
+- large_dir/  a flat directory of 10k+ small JPEGs (with spread mtimes and
+              sizes, so every listing sort order differs) and a few subdirectories
+- streaming/  one large file served by the ranged streaming benchmarks
+
+A corpus.json manifest records the scale and the file sizes. An existing
+corpus with the same scale and generator version is reused, so repeated
+runs (e.g. on two commits) measure the same files without regenerating.
+
+Usage:
+    python benchmarks/corpus.py [--scale small|default] [--root DIR] [--force]
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Bump when the generated files change, so stale corpora are regenerated
+CORPUS_VERSION = 1
+
+SCALES = {
+    "small": {
+        "photos": 2,
+        "photo_size": [2000, 1500],
+        "animations": 1,
+        "animation_frames": 30,
+        "videos": 1,
+        "video_seconds": 2,
+        "large_dir_files": 10000,
+        "stream_mb": 32,
+    },
+    "default": {
+        "photos": 6,
+        "photo_size": [4000, 3000],
+        "animations": 3,
+        "animation_frames": 120,
+        "videos": 2,
+        "video_seconds": 10,
+        "large_dir_files": 20000,
+        "stream_mb": 256,
+    },
+}
+
+MANIFEST_NAME = "corpus.json"
+
+# mtimes of large_dir files are spread over a year from this instant
+BASE_MTIME = 1_700_000_000
+
+
+def get_default_root(scale):
+    return Path(tempfile.gettempdir()) / "media-vault-bench-corpus" / scale
+
+
+def noise_image(rng, width, height):
+    """Smooth gradients with fine noise: compresses like a photo, not like flat colour or pure noise."""
+    import numpy as np
+
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    phase = rng.uniform(0, 2 * np.pi, size=3)
+    channels = [
+        127 + 80 * np.sin(x / rng.uniform(80, 400) + phase[c]) * np.cos(y / rng.uniform(80, 400))
+        for c in range(3)
+    ]
+    image = np.stack(channels, axis=-1) + rng.normal(0, 18, size=(height, width, 3))
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+
+def write_photos(directory, spec, rng):
+    from PIL import Image
+
+    width, height = spec["photo_size"]
+    for i in range(spec["photos"]):
+        Image.fromarray(noise_image(rng, width, height)).save(directory / f"photo_{i:02d}.jpg", quality=90)
+
+
+def write_animations(directory, spec, rng):
+    from PIL import Image, ImageDraw
+
+    width, height = 480, 270
+    for i in range(spec["animations"]):
+        background = Image.fromarray(noise_image(rng, width, height)).quantize(colors=64)
+        frames = []
+        for frame in range(spec["animation_frames"]):
+            img = background.convert("RGB")
+            draw = ImageDraw.Draw(img)
+            x = (frame * 7 + i * 40) % width
+            y = (frame * 3 + i * 25) % height
+            draw.ellipse((x - 30, y - 30, x + 30, y + 30), fill=(255, 200 - i * 40, 40))
+            draw.rectangle((width - x - 20, y, width - x + 20, y + 40), fill=(40, 80, 255))
+            frames.append(img.quantize(colors=64))
+        frames[0].save(
+            directory / f"animation_{i:02d}.gif", save_all=True, append_images=frames[1:], duration=40, loop=0
+        )
+
+
+def write_videos(directory, spec, rng):
+    import cv2
+    import numpy as np
+
+    width, height, fps = 1280, 720, 25
+    for i in range(spec["videos"]):
+        base = noise_image(rng, width, height)
+        writer = cv2.VideoWriter(
+            str(directory / f"video_{i:02d}.mp4"), cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height)
+        )
+        for frame in range(fps * spec["video_seconds"]):
+            writer.write(np.roll(base, frame * 6 + i * 50, axis=1))
+        writer.release()
+
+
+def write_large_dir(directory, spec, rng):
+    """Write many small JPEGs; trailing padding after the JPEG end marker varies the sizes."""
+    import io
+
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.fromarray(noise_image(rng, 64, 48)).save(buffer, format="JPEG", quality=80)
+    data = buffer.getvalue()
+
+    count = spec["large_dir_files"]
+    for i in range(count // 100):
+        (directory / f"subdir_{i:03d}").mkdir()
+    for i in range(count):
+        path = directory / f"file_{i:06d}.jpg"
+        path.write_bytes(data + b"\0" * ((i * 7919) % 4096))
+        # A permutation of the names, so mtime order is unrelated to name order
+        mtime = BASE_MTIME + (i * 7919) % count * (365 * 24 * 3600 // count)
+        os.utime(path, (mtime, mtime))
+
+
+def write_stream_file(directory, spec, rng):
+    block = rng.bytes(1024 * 1024)
+    with open(directory / "stream.mp4", "wb") as f:
+        for _ in range(spec["stream_mb"]):
+            f.write(block)
+
+
+WRITERS = (
+    ("photos", write_photos),
+    ("animations", write_animations),
+    ("videos", write_videos),
+    ("large_dir", write_large_dir),
+    ("streaming", write_stream_file),
+)
+
+
+def read_manifest(root):
+    try:
+        return json.loads((Path(root) / MANIFEST_NAME).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def ensure_corpus(root=None, scale="default", force=False, log=print):
+    """
+    Generate the corpus for a scale below root unless an identical one exists.
+
+    Returns:
+        The manifest dict (root, scale, version, spec and per-directory file counts and bytes)
+    """
+    import numpy as np
+
+    root = Path(root) if root else get_default_root(scale)
+    spec = SCALES[scale]
+    manifest = read_manifest(root)
+    if not force and manifest and manifest["version"] == CORPUS_VERSION and manifest["spec"] == spec:
+        return manifest
+
+    if root.exists():
+        # Only replace earlier corpora, never an unrelated directory
+        if manifest is None and any(root.iterdir()):
+            raise SystemExit(f"{root} is not empty and holds no {MANIFEST_NAME}")
+        shutil.rmtree(root)
+    root.mkdir(parents=True)
+    began = time.perf_counter()
+    contents = {}
+    for seed, (name, writer) in enumerate(WRITERS):
+        directory = root / name
+        directory.mkdir()
+        log(f"generating {name} ...")
+        writer(directory, spec, np.random.default_rng(seed))
+        files = [p for p in directory.iterdir() if p.is_file()]
+        contents[name] = {"files": len(files), "bytes": sum(p.stat().st_size for p in files)}
+
+    manifest = {
+        "root": str(root),
+        "scale": scale,
+        "version": CORPUS_VERSION,
+        "spec": spec,
+        "contents": contents,
+    }
+    # Written last: an interrupted generation is redone on the next run
+    (root / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2))
+    log(f"corpus written to {root} in {time.perf_counter() - began:.1f}s")
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=list(SCALES), default="default")
+    parser.add_argument("--root", help="Corpus directory (default: a per-scale directory below the system temp dir)")
+    parser.add_argument("--force", action="store_true", help="Regenerate even if an identical corpus exists")
+    args = parser.parse_args()
+
+    manifest = ensure_corpus(args.root, args.scale, args.force)
+    json.dump(manifest, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+"""
+Load test with mixed gallery traffic.
+
+Generates a corpus of large JPEGs and a few videos, starts Gunicorn in each
+serving mode and hammers it with concurrent clients issuing a mix of
+directory listings, ranged media reads and (mostly uncached) thumbnail
+requests. Reports p50/p99 latency per request type and how many thumbnail
+requests were shed with 503.
+
+Modes:
+- sync:     the previous setup, one sync worker generating thumbnails inline
+- threaded: gunicorn.conf.py (gthread workers) with a bounded thumbnail pool
+
+Usage:
+    python benchmarks/load_test.py [--duration 20] [--clients 16] [--images 300]
+    python benchmarks/load_test.py --url http://localhost:5000 --corpus /path/to/media
+"""
+import argparse
+import os
+import random
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+from urllib.parse import quote
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Share of each request type in the traffic mix
+TRAFFIC_MIX = (("list", 0.4), ("media", 0.4), ("thumbnail", 0.2))
+
+
+def write_corpus(media_dir, images, videos):
+    """Write large noisy JPEGs and short MP4s into media_dir/gallery."""
+    import cv2
+    import numpy as np
+    from PIL import Image
+
+    gallery = Path(media_dir) / "gallery"
+    gallery.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(0)
+    base = rng.integers(0, 255, size=(1500, 2000, 3), dtype=np.uint8)
+    for i in range(images):
+        Image.fromarray(np.roll(base, i * 7, axis=1)).save(gallery / f"image_{i:04d}.jpg", quality=90)
+    for i in range(videos):
+        writer = cv2.VideoWriter(str(gallery / f"video_{i:02d}.mp4"), cv2.VideoWriter_fourcc(*"mp4v"), 25, (1280, 720))
+        for frame in range(25 * 10):
+            writer.write(np.roll(base[:720, :1280], frame * 5 + i, axis=0))
+        writer.release()
+    return sorted(p.name for p in gallery.iterdir())
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(mode, media_dir, cache_dir, pool_workers):
+    """Start Gunicorn in the given mode and wait until it answers."""
+    port = free_port()
+    env = dict(
+        os.environ,
+        FLASK_MEDIA_ROOT=str(media_dir),
+        FLASK_THUMBNAIL_CACHE_ROOT=str(cache_dir),
+        GUNICORN_BIND=f"127.0.0.1:{port}",
+    )
+    if mode == "sync":
+        command = ["gunicorn", "--bind", f"127.0.0.1:{port}", "--workers", "1", "app.main:create_app()"]
+    else:
+        env["FLASK_THUMBNAIL_POOL_WORKERS"] = str(pool_workers)
+        command = ["gunicorn", "--config", "gunicorn.conf.py", "app.main:create_app()"]
+
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(200):
+        try:
+            urllib.request.urlopen(f"{url}/api/list/?limit=1", timeout=1).read()
+            return process, url
+        except (urllib.error.URLError, ConnectionError, socket.timeout):
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f"Gunicorn did not start in {mode} mode")
+
+
+def request(url, headers=None):
+    """Issue a GET and return (status, seconds)."""
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, headers=headers or {}), timeout=120) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return status, time.perf_counter() - start
+
+
+def run_clients(url, names, duration, clients):
+    """Run concurrent clients for duration seconds and collect (type, status, seconds)."""
+    videos = [name for name in names if name.endswith(".mp4")]
+    thumbnail_targets = [(name, width) for width in (150, 300, 600) for name in names]
+    random.Random(1).shuffle(thumbnail_targets)
+    thumbnail_lock = threading.Lock()
+    results = []
+    deadline = time.perf_counter() + duration
+
+    def client(seed):
+        rng = random.Random(seed)
+        kinds, weights = zip(*TRAFFIC_MIX)
+        while time.perf_counter() < deadline:
+            kind = rng.choices(kinds, weights)[0]
+            if kind == "list":
+                offset = rng.randrange(0, max(len(names) - 20, 1))
+                status, seconds = request(f"{url}/api/list/gallery?offset={offset}&limit=20")
+            elif kind == "media":
+                start = rng.randrange(0, 1024 * 1024)
+                status, seconds = request(
+                    f"{url}/media/gallery/{quote(rng.choice(videos))}",
+                    headers={"Range": f"bytes={start}-{start + 256 * 1024 - 1}"},
+                )
+            else:
+                with thumbnail_lock:
+                    name, width = thumbnail_targets.pop() if thumbnail_targets else (rng.choice(names), 150)
+                status, seconds = request(f"{url}/api/thumbnails/gallery/{quote(name)}?w={width}")
+            results.append((kind, status, seconds))
+
+    threads = [threading.Thread(target=client, args=(seed,)) for seed in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else float("nan")
+
+
+def report(mode, results, duration):
+    for kind, _ in TRAFFIC_MIX:
+        ok = [seconds for k, status, seconds in results if k == kind and status < 500]
+        shed = sum(1 for k, status, _ in results if k == kind and status == 503)
+        print(
+            f"{mode:>9} {kind:>10} {len(ok) / duration:>7.1f} {percentile(ok, 0.5) * 1000:>8.1f} "
+            f"{percentile(ok, 0.99) * 1000:>8.1f} {shed:>5}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--images", type=int, default=300)
+    parser.add_argument("--videos", type=int, default=4)
+    parser.add_argument("--pool-workers", type=int, default=os.cpu_count())
+    parser.add_argument("--modes", nargs="+", choices=["sync", "threaded"], default=["sync", "threaded"])
+    parser.add_argument("--url", help="Test a running server instead (needs --corpus)")
+    parser.add_argument("--corpus", help="Media root of the running server, with a gallery/ directory")
+    args = parser.parse_args()
+
+    print(f"{'mode':>9} {'type':>10} {'req/s':>7} {'p50 ms':>8} {'p99 ms':>8} {'503s':>5}")
+    if args.url:
+        names = sorted(p.name for p in (Path(args.corpus) / "gallery").iterdir())
+        report("external", run_clients(args.url, names, args.duration, args.clients), args.duration)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        names = write_corpus(Path(tmp) / "media", args.images, args.videos)
+        for mode in args.modes:
+            process, url = start_server(mode, Path(tmp) / "media", Path(tmp) / f"thumbnails_{mode}", args.pool_workers)
+            try:
+                report(mode, run_clients(url, names, args.duration, args.clients), args.duration)
+            finally:
+                process.terminate()
+                process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,465 @@
+#!/usr/bin/env python
+"""
+Benchmark suite for the hot paths: directory listing, thumbnailing (cold
+and warm) and ranged media streaming.
+
+Cases run against the deterministic corpus of corpus.py (generated on the
+first run and reused afterwards). Timing follows pytest-benchmark: each
+case is calibrated to enough iterations per round to dwarf the timer
+resolution, run for a number of rounds, and summarized as min, median,
+mean, stddev, IQR and operations per second.
+
+Results are written as JSON in pytest-benchmark's layout (plus the commit
+and corpus they were taken on), so runs on two commits can be compared:
+
+    git checkout main && python benchmarks/suite.py --json main.json
+    git checkout my-branch && python benchmarks/suite.py --compare main.json
+
+Medians slower than the baseline by more than --threshold percent are
+flagged and make the command exit with status 1.
+
+The file names do not match pytest's test_*.py pattern, so the suite is
+never collected by a pytest run.
+
+Usage:
+    python benchmarks/suite.py [--scale small|default] [-k listing] [--json out.json] [--compare baseline.json]
+    python benchmarks/suite.py compare baseline.json results.json [--threshold 10]
+    python benchmarks/suite.py --list
+"""
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from corpus import SCALES, ensure_corpus  # noqa: E402
+
+# Bump when cases change in a way that makes older results incomparable
+SUITE_VERSION = 1
+
+# Calibrated cases run enough iterations per round to take at least this long
+MIN_ROUND_SECONDS = 0.001
+
+# Upper bound on rounds of fast cases
+MAX_ROUNDS = 10000
+
+Case = namedtuple("Case", "name group function params")
+
+CASES = []
+
+
+def case(group, **params):
+    """Register a benchmark case; stack the decorator to run it with several parameter sets."""
+    def register(function):
+        name = f"{group}.{function.__name__}"
+        if params:
+            name += "[" + ",".join(str(value) for value in params.values()) + "]"
+        # Stacked decorators apply bottom-up; keep the parameter sets in source order
+        position = next((i for i, c in enumerate(CASES) if c.function is function), len(CASES))
+        CASES.insert(position, Case(name, group, function, params))
+        return function
+    return register
+
+
+def summarize(timings, iterations):
+    """Summarize per-iteration timings of each round like pytest-benchmark does."""
+    if len(timings) > 1:
+        q1, median, q3 = statistics.quantiles(timings, n=4, method="inclusive")
+        stddev = statistics.stdev(timings)
+    else:
+        q1 = median = q3 = timings[0]
+        stddev = 0.0
+    mean = statistics.fmean(timings)
+    return {
+        "min": min(timings),
+        "max": max(timings),
+        "mean": mean,
+        "stddev": stddev,
+        "median": median,
+        "q1": q1,
+        "q3": q3,
+        "iqr": q3 - q1,
+        "ops": 1 / mean if mean else 0.0,
+        "rounds": len(timings),
+        "iterations": iterations,
+        "total": sum(timings) * iterations,
+    }
+
+
+class Benchmark:
+    """
+    The timer handed to every case, modelled on pytest-benchmark's fixture.
+
+    Call it with a function to calibrate and time it, or use pedantic() to
+    control rounds and run a setup function (untimed) before each round.
+    Cases may put extra results in extra_info; a bytes_per_call entry is
+    turned into MiB/s throughput.
+    """
+
+    def __init__(self, max_time=1.0, min_rounds=5):
+        self.max_time = max_time
+        self.min_rounds = min_rounds
+        self.extra_info = {}
+        self.stats = None
+
+    def __call__(self, function, *args, **kwargs):
+        # The first call warms caches and imports, the second estimates the duration
+        function(*args, **kwargs)
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        estimate = max(time.perf_counter() - start, 1e-9)
+
+        iterations = max(1, int(MIN_ROUND_SECONDS / estimate))
+        rounds = min(MAX_ROUNDS, max(self.min_rounds, int(self.max_time / (estimate * iterations))))
+        timings = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            for _ in range(iterations):
+                function(*args, **kwargs)
+            timings.append((time.perf_counter() - start) / iterations)
+        self._record(timings, iterations)
+        return result
+
+    def pedantic(self, function, args=(), kwargs=None, setup=None, rounds=1, warmup_rounds=0):
+        """Time one call per round, running setup (untimed) before each."""
+        kwargs = kwargs or {}
+        timings = []
+        result = None
+        for round_number in range(warmup_rounds + rounds):
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            result = function(*args, **kwargs)
+            if round_number >= warmup_rounds:
+                timings.append(time.perf_counter() - start)
+        self._record(timings, 1)
+        return result
+
+    def _record(self, timings, iterations):
+        self.stats = summarize(timings, iterations)
+        bytes_per_call = self.extra_info.get("bytes_per_call")
+        if bytes_per_call:
+            self.extra_info["mib_per_s"] = bytes_per_call / self.stats["median"] / 1024 / 1024
+
+
+class Environment:
+    """Corpus paths and the app the cases run against."""
+
+    def __init__(self, manifest, cache_root):
+        from app import create_app
+
+        self.media_root = Path(manifest["root"])
+        self.app = create_app({
+            "MEDIA_ROOT": str(self.media_root),
+            "THUMBNAIL_CACHE_ROOT": str(cache_root),
+            "LOG_LEVEL": "WARNING",
+        })
+        self.client = self.app.test_client()
+        self.large_dir = self.media_root / "large_dir"
+        self.stream_file = self.media_root / "streaming" / "stream.mp4"
+        self.sources = {
+            "photo": sorted((self.media_root / "photos").iterdir()),
+            "gif": sorted((self.media_root / "animations").iterdir()),
+            "video": sorted((self.media_root / "videos").iterdir()),
+        }
+
+    def rel(self, path):
+        return path.relative_to(self.media_root).as_posix()
+
+
+# Listing
+
+@case("listing")
+def first_page_cold(benchmark, env):
+    """First page of the large directory, rescanned every round."""
+    from app.directory_index import get_directory_index
+    from app.media_handler import list_directory
+
+    index = get_directory_index()
+    benchmark.pedantic(
+        list_directory, args=(env.large_dir,), kwargs={"limit": 100},
+        setup=lambda: index.invalidate(env.large_dir), rounds=20, warmup_rounds=1,
+    )
+
+
+@case("listing", sort="name")
+@case("listing", sort="-mtime")
+@case("listing", sort="size")
+def first_page_warm(benchmark, env, sort):
+    """First page of the large directory from the cached listing."""
+    from app.media_handler import list_directory
+
+    benchmark(list_directory, env.large_dir, limit=100, sort=sort.lstrip("-"), descending=sort.startswith("-"))
+
+
+@case("listing")
+def deep_page_cursor(benchmark, env):
+    """A page near the end of the large directory, addressed by cursor."""
+    from app.media_handler import list_directory
+
+    total = list_directory(env.large_dir, limit=1, sort="mtime")["total"]
+    cursor = list_directory(env.large_dir, offset=total - 200, limit=100, sort="mtime")["next_cursor"]
+    benchmark(list_directory, env.large_dir, limit=100, sort="mtime", cursor=cursor)
+
+
+@case("listing")
+def api_first_page(benchmark, env):
+    """GET /api/list of the large directory, including routing and JSON encoding."""
+    url = f"/api/list/{env.rel(env.large_dir)}?limit=100"
+    benchmark(env.client.get, url)
+
+
+# Thumbnailing
+
+@case("thumbnail", source="photo", format="jpeg")
+@case("thumbnail", source="photo", format="webp")
+@case("thumbnail", source="gif", format="jpeg")
+@case("thumbnail", source="video", format="jpeg")
+def generate_cold(benchmark, env, source, format):
+    """Generate a 300px thumbnail with no cache involved, cycling through the corpus files."""
+    from app.media_handler import generate_thumbnail
+
+    files = itertools.cycle(env.sources[source])
+    benchmark(lambda: generate_thumbnail(next(files), width=300, output_format=format))
+
+
+@case("thumbnail", tier="memory")
+@case("thumbnail", tier="disk")
+def get_warm(benchmark, env, tier):
+    """Get cached 300px thumbnails of every corpus source from one cache tier."""
+    from app.media_handler import get_thumbnail_entry
+    from app.thumbnail_cache import get_memory_cache, set_memory_cache_size
+
+    paths = [path for files in env.sources.values() for path in files]
+    for path in paths:
+        get_thumbnail_entry(path, env.media_root, width=300, output_format="webp")
+
+    memory_budget = get_memory_cache().max_bytes
+    if tier == "disk":
+        set_memory_cache_size(0)
+    try:
+        files = itertools.cycle(paths)
+        benchmark(lambda: get_thumbnail_entry(next(files), env.media_root, width=300, output_format="webp"))
+    finally:
+        set_memory_cache_size(memory_budget / 1024 / 1024)
+
+
+@case("thumbnail")
+def api_warm(benchmark, env):
+    """GET /api/thumbnails of a photo cached in memory, including routing and validators."""
+    url = f"/api/thumbnails/{env.rel(env.sources['photo'][0])}?w=300"
+    env.client.get(url, headers={"Accept": "image/webp"})
+    benchmark(env.client.get, url, headers={"Accept": "image/webp"})
+
+
+# Streaming
+
+def read_media(client, url, range_header):
+    """Request a media URL and consume the streamed body; returns the body length."""
+    response = client.get(url, headers={"Range": range_header}, buffered=False)
+    sent = sum(len(chunk) for chunk in response.response)
+    response.close()
+    return sent
+
+
+@case("streaming", range_kb=64)
+@case("streaming", range_kb=1024)
+def ranged_reads(benchmark, env, range_kb):
+    """Ranged reads at seeded random offsets of the large file, like a seeking video player."""
+    url = f"/media/{env.rel(env.stream_file)}"
+    length = range_kb * 1024
+    file_size = env.stream_file.stat().st_size
+    rng = random.Random(0)
+    offsets = itertools.cycle([rng.randrange(0, file_size - length) for _ in range(256)])
+    benchmark.extra_info["bytes_per_call"] = length
+    benchmark(lambda: read_media(env.client, url, f"bytes={(start := next(offsets))}-{start + length - 1}"))
+
+
+@case("streaming")
+def multipart_ranges(benchmark, env):
+    """Eight 64 KiB ranges spread over the large file in one multipart/byteranges response."""
+    url = f"/media/{env.rel(env.stream_file)}"
+    file_size = env.stream_file.stat().st_size
+    step = file_size // 8
+    ranges = ",".join(f"{i * step}-{i * step + 65535}" for i in range(8))
+    benchmark.extra_info["bytes_per_call"] = 8 * 65536
+    benchmark(read_media, env.client, url, f"bytes={ranges}")
+
+
+@case("streaming")
+def full_file(benchmark, env):
+    """The whole large file as one open-ended range."""
+    url = f"/media/{env.rel(env.stream_file)}"
+    benchmark.extra_info["bytes_per_call"] = env.stream_file.stat().st_size
+    benchmark.pedantic(read_media, args=(env.client, url, "bytes=0-"), rounds=5, warmup_rounds=1)
+
+
+def get_commit_info():
+    def git(*args):
+        return subprocess.run(
+            ["git", *args], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+
+    try:
+        return {
+            "id": git("rev-parse", "HEAD"),
+            "branch": git("rev-parse", "--abbrev-ref", "HEAD"),
+            "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+            "time": git("show", "-s", "--format=%cI", "HEAD"),
+        }
+    except (OSError, subprocess.CalledProcessError):
+        return {}
+
+
+def get_machine_info():
+    return {
+        "node": platform.node(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "system": platform.system(),
+        "release": platform.release(),
+        "cpu_count": os.cpu_count(),
+        "python_version": platform.python_version(),
+        "python_implementation": platform.python_implementation(),
+    }
+
+
+def format_time(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+def select_cases(patterns):
+    if not patterns:
+        return list(CASES)
+    return [c for c in CASES if any(pattern in c.name for pattern in patterns)]
+
+
+def run(args):
+    manifest = ensure_corpus(args.corpus, args.scale)
+    cases = select_cases(args.filter)
+    print(f"{len(cases)} cases on the {args.scale} corpus in {manifest['root']}")
+    print(f"{'name':<42} {'median':>11} {'iqr':>11} {'rounds':>7} {'ops/s':>10}  extra")
+
+    results = []
+    with tempfile.TemporaryDirectory() as cache_root:
+        env = Environment(manifest, cache_root)
+        for bench_case in cases:
+            benchmark = Benchmark(args.max_time, args.min_rounds)
+            bench_case.function(benchmark, env, **bench_case.params)
+            stats = benchmark.stats
+            extra = f"{benchmark.extra_info['mib_per_s']:.0f} MiB/s" if "mib_per_s" in benchmark.extra_info else ""
+            print(
+                f"{bench_case.name:<42} {format_time(stats['median']):>11} {format_time(stats['iqr']):>11} "
+                f"{stats['rounds']:>7} {stats['ops']:>10.1f}  {extra}"
+            )
+            results.append({
+                "name": bench_case.name,
+                "group": bench_case.group,
+                "params": bench_case.params,
+                "stats": stats,
+                "extra_info": benchmark.extra_info,
+            })
+
+    report = {
+        "suite_version": SUITE_VERSION,
+        "datetime": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "machine_info": get_machine_info(),
+        "commit_info": get_commit_info(),
+        "corpus": {key: manifest[key] for key in ("scale", "version", "spec", "contents")},
+        "benchmarks": results,
+    }
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+        print(f"results written to {args.json}")
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        return 1 if compare(baseline, report, args.threshold) else 0
+    return 0
+
+
+def compare(baseline, current, threshold):
+    """
+    Print median changes of the cases both runs have in common.
+
+    Returns:
+        Number of cases slower than the baseline by more than threshold percent
+    """
+    for key, what in (("corpus", "corpora"), ("machine_info", "machines"), ("suite_version", "suite versions")):
+        if baseline.get(key) != current.get(key):
+            print(f"warning: the runs used different {what}; changes may not be meaningful")
+
+    def describe(report):
+        commit = report.get("commit_info", {})
+        return f"{commit.get('id', 'unknown')[:10]}{' (dirty)' if commit.get('dirty') else ''}"
+
+    print(f"baseline {describe(baseline)} -> current {describe(current)}")
+    print(f"{'name':<42} {'baseline':>11} {'current':>11} {'change':>8}")
+    previous = {bench["name"]: bench for bench in baseline["benchmarks"]}
+    regressions = 0
+    for bench in current["benchmarks"]:
+        old = previous.pop(bench["name"], None)
+        if old is None:
+            print(f"{bench['name']:<42} {'-':>11} {format_time(bench['stats']['median']):>11}   (new)")
+            continue
+        before, after = old["stats"]["median"], bench["stats"]["median"]
+        change = (after - before) / before * 100
+        flag = ""
+        if change > threshold:
+            regressions += 1
+            flag = "  REGRESSED"
+        elif change < -threshold:
+            flag = "  improved"
+        print(f"{bench['name']:<42} {format_time(before):>11} {format_time(after):>11} {change:>+7.1f}%{flag}")
+    for name in previous:
+        print(f"{name:<42} {'':>11} {'-':>11}   (removed)")
+    print(f"{regressions} regression(s) beyond {threshold:.0f}%")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=list(SCALES), default="default")
+    parser.add_argument("--corpus", help="Corpus directory (default: a per-scale directory below the system temp dir)")
+    parser.add_argument("-k", "--filter", nargs="+", help="Only run cases whose name contains one of these")
+    parser.add_argument("--max-time", type=float, default=1.0, help="Target seconds of timed rounds per case")
+    parser.add_argument("--min-rounds", type=int, default=5)
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--compare", help="Compare the results with this earlier --json file")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Percent slowdown flagged as a regression")
+    parser.add_argument("--list", action="store_true", help="List the cases and exit")
+    subparsers = parser.add_subparsers(dest="command")
+    compare_parser = subparsers.add_parser("compare", help="Compare two --json files without running")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=10.0)
+    args = parser.parse_args()
+
+    if args.list:
+        for bench_case in select_cases(args.filter):
+            print(f"{bench_case.name:<42} {bench_case.function.__doc__}")
+        return 0
+    if args.command == "compare":
+        baseline = json.loads(Path(args.baseline).read_text())
+        current = json.loads(Path(args.current).read_text())
+        return 1 if compare(baseline, current, args.threshold) else 0
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,15 @@
+"""
+Gunicorn settings for production serving.
+
+Threaded workers keep I/O-bound routes (media streaming, listings) responsive
+while CPU-heavy thumbnail work runs in each worker's thumbnail pool (see
+THUMBNAIL_POOL_WORKERS). Override with GUNICORN_* environment variables.
+"""
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+worker_class = "gthread"
+workers = int(os.environ.get("GUNICORN_WORKERS", 2))
+threads = int(os.environ.get("GUNICORN_THREADS", 16))
+# Long video streams are fine with gthread; this only guards against stuck workers
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
@@ -0,0 +1,136 @@
+import os
+
+import pytest
+from PIL import Image
+
+from app.catalog import MediaCatalog, build_match_query, decode_cursor, encode_cursor
+
+
+def write_image(path, size=(8, 6), padding=0, mtime=None):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    Image.new("RGB", size).save(path)
+    if padding:
+        with open(path, "ab") as f:
+            f.write(bytes(padding))
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def keep_directory_mtime(path):
+    """Restore a directory's mtime, as if its entries had not changed."""
+    st = os.stat(path)
+    return lambda: os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+
+@pytest.fixture
+def media(tmp_path):
+    root = tmp_path / "media"
+    write_image(root / "beach" / "Sunset Beach.jpg", (40, 30), padding=300, mtime=1_000)
+    write_image(root / "beach" / "sunrise.png", padding=100, mtime=3_000)
+    write_image(root / "city" / "night.jpg", padding=200, mtime=2_000)
+    write_image(root / "city" / "old" / "beach_party.gif", mtime=4_000)
+    (root / "city" / "notes.txt").write_text("not media")
+    write_image(root / ".hidden" / "secret.jpg")
+    return root
+
+
+@pytest.fixture
+def catalog(tmp_path, media):
+    catalog = MediaCatalog(tmp_path / "catalog.sqlite3")
+    catalog.crawl(media)
+    return catalog
+
+
+def paths(results):
+    return [item["path"] for item in results[0]]
+
+
+def test_crawl_catalogs_media_files(catalog):
+    assert catalog.count() == 4
+    (item,), _ = catalog.search(q="sunset")
+    assert item["path"] == "beach/Sunset Beach.jpg"
+    assert (item["width"], item["height"]) == (40, 30)
+    assert item["media_type"] == "image"
+
+
+@pytest.mark.parametrize("q, expected", [
+    # Results are ordered by name, ignoring case
+    ("beach", ["city/old/beach_party.gif", "beach/sunrise.png", "beach/Sunset Beach.jpg"]),
+    ("sun", ["beach/sunrise.png", "beach/Sunset Beach.jpg"]),
+    ("sun beach", ["beach/sunrise.png", "beach/Sunset Beach.jpg"]),
+    ("old party", ["city/old/beach_party.gif"]),
+    ("NIGHT", ["city/night.jpg"]),
+    ("notes", []),
+    ("secret", []),
+])
+def test_search_matches_every_word_as_a_prefix(catalog, q, expected):
+    assert paths(catalog.search(q=q)) == expected
+
+
+def test_build_match_query_ignores_fts_syntax():
+    assert build_match_query('beach" OR -x*') == '"beach"* "OR"* "x"*'
+    assert build_match_query("  ") == ""
+
+
+@pytest.mark.parametrize("sort, descending", [("name", False), ("mtime", False), ("size", True), ("path", True)])
+def test_cursor_pages_match_a_single_page(catalog, sort, descending):
+    everything = paths(catalog.search(sort=sort, descending=descending, limit=100))
+    assert len(everything) == 4
+
+    paged = []
+    cursor = None
+    while True:
+        results, cursor = catalog.search(sort=sort, descending=descending, limit=1, cursor=cursor)
+        paged.extend(item["path"] for item in results)
+        if cursor is None:
+            break
+    assert paged == everything
+
+
+def test_sort_and_filters(catalog):
+    assert paths(catalog.search(sort="mtime")) == [
+        "beach/Sunset Beach.jpg", "city/night.jpg", "beach/sunrise.png", "city/old/beach_party.gif",
+    ]
+    sizes = [item["size"] for item in catalog.search(sort="size", descending=True)[0]]
+    assert sizes == sorted(sizes, reverse=True)
+    assert paths(catalog.search(min_size=sizes[1])) == ["city/night.jpg", "beach/Sunset Beach.jpg"]
+    assert catalog.search(media_type="video") == ([], None)
+
+
+def test_search_rejects_bad_sort_and_cursor(catalog):
+    with pytest.raises(ValueError):
+        catalog.search(sort="width")
+    with pytest.raises(ValueError):
+        catalog.search(cursor="not a cursor")
+    assert decode_cursor(encode_cursor("name.jpg", 7)) == ("name.jpg", 7)
+
+
+def test_incremental_crawl_skips_unchanged_directories(catalog, media):
+    stats = catalog.crawl(media)
+    assert stats["skipped"] == stats["directories"] == 4
+    assert stats["added"] == stats["updated"] == stats["removed"] == 0
+
+
+def test_crawl_updates_files_rewritten_in_place(catalog, media):
+    restore = keep_directory_mtime(media / "beach")
+    write_image(media / "beach" / "sunrise.png", padding=5000, mtime=5_000)
+    restore()
+
+    stats = catalog.crawl(media)
+    assert stats["updated"] == 1
+    assert paths(catalog.search(sort="size", descending=True, limit=1)) == ["beach/sunrise.png"]
+    assert paths(catalog.search(sort="mtime", descending=True, limit=1)) == ["beach/sunrise.png"]
+
+
+def test_crawl_applies_additions_and_removals(catalog, media):
+    write_image(media / "city" / "dawn.jpg")
+    (media / "beach" / "sunrise.png").unlink()
+    for path in (media / "city" / "old").iterdir():
+        path.unlink()
+    (media / "city" / "old").rmdir()
+
+    stats = catalog.crawl(media)
+    assert stats["added"] == 1
+    assert stats["removed"] == 2
+    assert paths(catalog.search(sort="path")) == ["beach/Sunset Beach.jpg", "city/dawn.jpg", "city/night.jpg"]
+    assert paths(catalog.search(q="party")) == []
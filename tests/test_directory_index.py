@@ -0,0 +1,136 @@
+import os
+
+import pytest
+
+from app.directory_index import (
+    DirectoryIndex,
+    DirectoryListing,
+    IndexEntry,
+    decode_listing_cursor,
+    encode_listing_cursor,
+    sort_key,
+)
+
+
+def make_listing(entries):
+    return DirectoryListing(sorted(entries, key=sort_key))
+
+
+def sample_entries():
+    entries = [IndexEntry(name, True, None, 0) for name in ("beta", "Alpha", "gamma")]
+    # Equal mtimes and sizes, so ties are broken by name
+    for i, name in enumerate(["e.jpg", "B.jpg", "a.jpg", "d.mp4", "C.png", "f.gif", "g.jpg"]):
+        entries.append(IndexEntry(name, False, (i * 37) % 5 * 100, 1_000 + (i * 13) % 4))
+    return entries
+
+
+def expected_order(entries, sort, descending):
+    directories = sorted((e for e in entries if e.is_dir), key=sort_key)
+    files = [e for e in entries if not e.is_dir]
+    name_key = lambda e: (e.name.lower(), e.name)  # noqa: E731
+    if sort == "mtime":
+        files.sort(key=lambda e: (e.mtime_ns,) + name_key(e))
+    elif sort == "size":
+        files.sort(key=lambda e: (e.size,) + name_key(e))
+    else:
+        files.sort(key=name_key)
+    if descending:
+        files.reverse()
+    return [e.name for e in directories + files]
+
+
+def page_by_cursor(listing, sort, descending, limit):
+    names = []
+    after = None
+    while True:
+        items, _ = listing.page(sort, descending, limit=limit, after=after)
+        names.extend(item.name for item in items)
+        if len(items) < limit:
+            return names
+        # Round trip through the opaque form, as /api/list does
+        cursor = encode_listing_cursor(sort, descending, items[-1])
+        after = decode_listing_cursor(cursor, sort, descending)
+
+
+@pytest.mark.parametrize("sort", ["name", "mtime", "size"])
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("limit", [1, 2, 3, 4, 100])
+def test_cursor_pages_cover_every_entry_once(sort, descending, limit):
+    entries = sample_entries()
+    listing = make_listing(entries)
+    assert page_by_cursor(listing, sort, descending, limit) == expected_order(entries, sort, descending)
+
+
+@pytest.mark.parametrize("sort", ["name", "mtime", "size"])
+@pytest.mark.parametrize("descending", [False, True])
+def test_offset_pages_match_cursor_pages(sort, descending):
+    entries = sample_entries()
+    listing = make_listing(entries)
+    names = []
+    for offset in range(0, len(entries), 4):
+        items, start = listing.page(sort, descending, offset=offset, limit=4)
+        assert start == offset
+        names.extend(item.name for item in items)
+    assert names == expected_order(entries, sort, descending)
+
+
+def test_cursor_survives_inserted_and_removed_entries():
+    entries = sample_entries()
+    first, _ = make_listing(entries).page("name", limit=4)
+    last_seen = first[-1]
+    assert last_seen.name == "a.jpg"
+    cursor = encode_listing_cursor("name", False, last_seen)
+
+    # A file sorting before the cursor is added and the cursor entry itself is removed
+    changed = [e for e in entries if e.name != last_seen.name] + [IndexEntry("0.jpg", False, 1, 1)]
+    after = decode_listing_cursor(cursor, "name", False)
+    items, _ = make_listing(changed).page("name", limit=3, after=after)
+    assert [item.name for item in items] == ["B.jpg", "C.png", "d.mp4"]
+
+
+def test_cursor_in_directories_continues_into_files():
+    listing = make_listing(sample_entries())
+    directories, _ = listing.page("size", limit=3)
+    after = decode_listing_cursor(encode_listing_cursor("size", True, directories[-1]), "size", True)
+    items, start = listing.page("size", True, limit=1, after=after)
+    assert start == 3
+    assert not items[0].is_dir
+
+
+def test_page_past_the_end():
+    listing = make_listing(sample_entries())
+    assert listing.page(offset=100, limit=10) == ([], 100)
+    assert listing.page(limit=0)[0] == []
+
+
+def test_decode_rejects_cursor_of_another_order():
+    cursor = encode_listing_cursor("mtime", False, IndexEntry("a.jpg", False, 1, 2))
+    assert decode_listing_cursor(cursor, "mtime", False) == ("f", (2, "a.jpg", "a.jpg"))
+    with pytest.raises(ValueError):
+        decode_listing_cursor(cursor, "size", False)
+    with pytest.raises(ValueError):
+        decode_listing_cursor(cursor, "mtime", True)
+
+
+@pytest.mark.parametrize("cursor", ["", "!!!", "bm90IGpzb24", "WyJuYW1lIiwgZmFsc2UsICJ4IiwgWyJhIiwgImEiXV0"])
+def test_decode_rejects_malformed_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_listing_cursor(cursor, "name", False)
+
+
+def test_directory_index_rescans_changed_directory(tmp_path):
+    (tmp_path / "b.jpg").write_bytes(b"1")
+    (tmp_path / "sub").mkdir()
+    (tmp_path / ".hidden").write_bytes(b"")
+    index = DirectoryIndex(tmp_path / "index" / "listings.sqlite3")
+    assert [e.name for e in index.get(tmp_path)] == ["index", "sub", "b.jpg"]
+
+    (tmp_path / "a.jpg").write_bytes(b"22")
+    # Make sure the directory mtime changes even on coarse-grained filesystems
+    st = os.stat(tmp_path)
+    os.utime(tmp_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    assert [e.name for e in index.get(tmp_path)] == ["index", "sub", "a.jpg", "b.jpg"]
+
+    # A second index over the same database loads the persisted listing
+    reloaded = DirectoryIndex(tmp_path / "index" / "listings.sqlite3")
+    assert [(e.name, e.size) for e in reloaded.get(tmp_path)][2:] == [("a.jpg", 2), ("b.jpg", 1)]
@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from flask import Flask
+from werkzeug.http import http_date
+
+from app.http_cache import if_range_matches, is_not_modified
+
+ETAG = "abc123"
+LAST_MODIFIED = datetime(2024, 5, 1, 12, 0, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def flask_app():
+    return Flask(__name__)
+
+
+def check_not_modified(flask_app, headers, method="GET"):
+    with flask_app.test_request_context("/", method=method, headers=headers):
+        return is_not_modified(ETAG, LAST_MODIFIED)
+
+
+def check_if_range(flask_app, headers):
+    with flask_app.test_request_context("/", headers=headers):
+        return if_range_matches(ETAG, LAST_MODIFIED)
+
+
+@pytest.mark.parametrize("if_none_match, expected", [
+    (f'"{ETAG}"', True),
+    (f'W/"{ETAG}"', True),
+    (f'"other", "{ETAG}"', True),
+    ("*", True),
+    ('"other"', False),
+])
+def test_if_none_match(flask_app, if_none_match, expected):
+    assert check_not_modified(flask_app, {"If-None-Match": if_none_match}) is expected
+
+
+def test_if_none_match_takes_precedence_over_if_modified_since(flask_app):
+    headers = {"If-None-Match": '"other"', "If-Modified-Since": http_date(LAST_MODIFIED)}
+    assert check_not_modified(flask_app, headers) is False
+
+
+@pytest.mark.parametrize("since, expected", [
+    (LAST_MODIFIED, True),
+    (LAST_MODIFIED + timedelta(days=1), True),
+    (LAST_MODIFIED - timedelta(seconds=1), False),
+])
+def test_if_modified_since(flask_app, since, expected):
+    assert check_not_modified(flask_app, {"If-Modified-Since": http_date(since)}) is expected
+
+
+def test_no_conditional_headers(flask_app):
+    assert check_not_modified(flask_app, {}) is False
+
+
+def test_not_modified_only_for_safe_methods(flask_app):
+    assert check_not_modified(flask_app, {"If-None-Match": f'"{ETAG}"'}, method="HEAD") is True
+    assert check_not_modified(flask_app, {"If-None-Match": f'"{ETAG}"'}, method="POST") is False
+
+
+def test_if_range_absent(flask_app):
+    assert check_if_range(flask_app, {}) is True
+
+
+@pytest.mark.parametrize("if_range, expected", [
+    (f'"{ETAG}"', True),
+    ('"other"', False),
+    # If-Range requires a strong match
+    (f'W/"{ETAG}"', False),
+    (http_date(LAST_MODIFIED), True),
+    (http_date(LAST_MODIFIED - timedelta(seconds=1)), False),
+    (http_date(LAST_MODIFIED + timedelta(seconds=1)), False),
+])
+def test_if_range(flask_app, if_range, expected):
+    assert check_if_range(flask_app, {"If-Range": if_range}) is expected
+
+
+def test_if_range_date_without_last_modified(flask_app):
+    with flask_app.test_request_context("/", headers={"If-Range": http_date(LAST_MODIFIED)}):
+        assert if_range_matches(ETAG) is False
@@ -0,0 +1,146 @@
+import pytest
+
+import app.packed_store as packed_store
+from app.packed_store import PackedThumbnailStore
+
+
+@pytest.fixture
+def small_segments(monkeypatch):
+    # Ten 100 byte entries per segment
+    monkeypatch.setattr(packed_store, "SEGMENT_MAX_BYTES", 1000)
+
+
+def value(i, size=100):
+    return bytes([i % 256]) * size
+
+
+def fill(store, count, size=100):
+    for i in range(count):
+        store.put(f"k{i}", value(i, size))
+
+
+def segment_sizes(store):
+    return {segment: store.get_segment_path(segment).stat().st_size for segment in store.list_segments()}
+
+
+def assert_readable(store, indexes, size=100):
+    for i in indexes:
+        assert bytes(store.get(f"k{i}")) == value(i, size)
+
+
+def test_put_get_delete(tmp_path):
+    store = PackedThumbnailStore(tmp_path)
+    store.put("a", b"first")
+    store.put("b", b"second")
+    store.put("a", b"replaced")
+    assert bytes(store.get("a")) == b"replaced"
+    assert bytes(store.get("b")) == b"second"
+    assert store.contains("a")
+    assert store.delete("a") == len(b"replaced")
+    assert store.delete("a") == 0
+    assert store.get("a") is None
+    assert not store.contains("a")
+
+
+def test_appends_roll_over_to_new_segments(tmp_path, small_segments):
+    store = PackedThumbnailStore(tmp_path)
+    fill(store, 25)
+    assert segment_sizes(store) == {1: 1000, 2: 1000, 3: 500}
+    assert_readable(store, range(25))
+
+
+def test_compact_rewrites_mostly_dead_segments(tmp_path, small_segments):
+    store = PackedThumbnailStore(tmp_path)
+    fill(store, 25)
+    # Segment 1 is 60% dead, segment 2 10% dead
+    for i in [0, 1, 2, 3, 4, 5, 10]:
+        store.delete(f"k{i}")
+
+    stats = store.compact()
+    assert stats["segments_compacted"] == 1
+    assert stats["compacted_bytes"] == 600
+    # The live entries of segment 1 were appended to the active segment 3
+    assert segment_sizes(store) == {2: 1000, 3: 900}
+    assert stats["segment_bytes"] == 1900
+    assert_readable(store, [i for i in range(25) if i not in {0, 1, 2, 3, 4, 5, 10}])
+
+
+def test_compact_keeps_segments_below_dead_fraction(tmp_path, small_segments):
+    store = PackedThumbnailStore(tmp_path)
+    fill(store, 20)
+    store.delete("k0")
+
+    stats = store.compact()
+    assert stats["segments_compacted"] == 0
+    assert segment_sizes(store) == {1: 1000, 2: 1000}
+
+
+def test_compact_rolls_over_the_active_segment(tmp_path):
+    # The default segment size: a small cache only ever has one segment
+    store = PackedThumbnailStore(tmp_path)
+    fill(store, 10)
+    for i in range(6):
+        store.delete(f"k{i}")
+
+    stats = store.compact()
+    assert stats["segments_compacted"] == 1
+    assert stats["compacted_bytes"] == 600
+    assert segment_sizes(store) == {2: 400}
+    assert_readable(store, range(6, 10))
+
+    # New entries go to the new segment
+    store.put("new", b"abc")
+    assert segment_sizes(store) == {2: 403}
+
+
+def test_compacting_everything_never_reuses_segment_numbers(tmp_path):
+    store = PackedThumbnailStore(tmp_path)
+    fill(store, 3)
+    for i in range(3):
+        store.delete(f"k{i}")
+
+    store.compact()
+    assert segment_sizes(store) == {2: 0}
+    store.put("next", b"data")
+    assert store.list_segments() == [2]
+    assert bytes(store.get("next")) == b"data"
+
+
+def test_compact_moves_entries_across_several_target_segments(tmp_path, small_segments):
+    store = PackedThumbnailStore(tmp_path)
+    fill(store, 40)
+    # Segments 1-3 are 30% dead; their 21 live entries need three target segments
+    dead = {0, 1, 2, 10, 11, 12, 20, 21, 22}
+    for i in dead:
+        store.delete(f"k{i}")
+
+    stats = store.compact()
+    assert stats["segments_compacted"] == 3
+    # Segment 4 was full, so the moved entries start a new segment
+    assert segment_sizes(store) == {4: 1000, 5: 1000, 6: 1000, 7: 100}
+    assert_readable(store, [i for i in range(40) if i not in dead])
+
+
+def test_gc_compacts_and_reports_disk_usage(tmp_path):
+    store = PackedThumbnailStore(tmp_path)
+    fill(store, 10)
+
+    stats = store.gc(max_bytes=500)
+    assert stats["evicted"] == 6
+    assert stats["segments_compacted"] == 1
+    assert stats["segment_bytes"] == 400
+    assert store.stats()["segment_bytes"] == 400
+    assert store.stats()["live_bytes"] == 400
+
+
+def test_index_is_shared_between_instances(tmp_path, small_segments):
+    store = PackedThumbnailStore(tmp_path)
+    fill(store, 15)
+    other = PackedThumbnailStore(tmp_path)
+    for i in range(8):
+        other.delete(f"k{i}")
+    other.compact()
+
+    # Entries moved by the other instance are found at their new place
+    assert_readable(store, range(8, 15))
+    assert store.get("k0") is None
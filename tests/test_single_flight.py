@@ -0,0 +1,86 @@
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+from app.concurrency import file_lock
+from app.single_flight import LOCK_STRIPES, KeyedLocks, _KEYED_LOCKS, get_lock_file_path, single_flight
+
+
+def run_concurrently(count, target):
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_same_key_generates_once(tmp_path):
+    generated = []
+    cache = {}
+
+    def request(i):
+        if "thumb" in cache:
+            return
+        with single_flight("thumb", tmp_path):
+            # Re-check after acquiring the lock, as callers do
+            if "thumb" in cache:
+                return
+            time.sleep(0.05)
+            generated.append(i)
+            cache["thumb"] = b"data"
+
+    run_concurrently(8, request)
+    assert len(generated) == 1
+
+
+def test_different_keys_do_not_wait_for_each_other():
+    inside = threading.Barrier(2, timeout=5)
+
+    def request(i):
+        with single_flight(f"key-{i}"):
+            # Both threads hold their lock at the same time, or the barrier times out
+            inside.wait()
+
+    run_concurrently(2, request)
+
+
+def test_keyed_locks_are_dropped_when_released():
+    locks = KeyedLocks()
+    with locks.hold("a"):
+        with locks.hold("b"):
+            assert set(locks._locks) == {"a", "b"}
+    assert locks._locks == {}
+
+    with single_flight("transient"):
+        pass
+    assert "transient" not in _KEYED_LOCKS._locks
+
+
+def test_lock_files_are_striped(tmp_path):
+    paths = {get_lock_file_path(tmp_path, f"key-{i}") for i in range(5000)}
+    assert len(paths) == LOCK_STRIPES
+    assert get_lock_file_path(tmp_path, "x") == get_lock_file_path(tmp_path, "x")
+
+
+def test_file_lock_excludes_other_processes(tmp_path):
+    lock_path = tmp_path / "locks" / "gc.lock"
+    probe = (
+        "import sys\n"
+        "from app.concurrency import file_lock\n"
+        "with file_lock(sys.argv[1], wait=False) as locked:\n"
+        "    print(locked)\n"
+    )
+
+    def try_lock():
+        result = subprocess.run(
+            [sys.executable, "-c", probe, str(lock_path)], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent.parent,
+        )
+        return result.stdout.strip()
+
+    with file_lock(lock_path) as locked:
+        assert locked is True
+        assert try_lock() == "False"
+    assert try_lock() == "True"
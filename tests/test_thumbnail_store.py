@@ -0,0 +1,102 @@
+import os
+import time
+
+import pytest
+
+from app.packed_store import PackedThumbnailStore
+from app.thumbnail_store import GC_LOW_WATER, FileThumbnailStore, make_cache_key
+
+BACKENDS = [FileThumbnailStore, PackedThumbnailStore]
+
+
+def fill(store, accesses, size=100):
+    """Store one entry per name and replace the access log with (age in seconds, count) per name."""
+    now = int(time.time())
+    keys = {name: make_cache_key(f"{name}.jpg", "fp", "thumb-300", ".jpg") for name in accesses}
+    for name, key in keys.items():
+        store.put(key, bytes(size))
+    # Drop the accesses recorded by put, so only the log below counts
+    store.access_log.flush()
+    store.access_log.rewrite({keys[name]: (now - age, count) for name, (age, count) in accesses.items()})
+    return keys
+
+
+def remaining(store, keys):
+    return sorted(name for name, key in keys.items() if store.contains(key))
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_lru_evicts_least_recently_used_first(tmp_path, backend):
+    store = backend(tmp_path, eviction="lru")
+    keys = fill(store, {"a": (50, 9), "b": (10, 1), "c": (40, 1), "d": (30, 5), "e": (20, 1)})
+
+    # 500 bytes against a 300 byte budget: evict down to GC_LOW_WATER of it
+    stats = store.gc(max_bytes=300)
+    assert stats["bytes"] <= 300 * GC_LOW_WATER
+    assert stats["evicted"] == 3
+    assert stats["bytes_reclaimed"] == 300
+    assert stats["entries"] == 2
+    assert remaining(store, keys) == ["b", "e"]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_lfu_evicts_least_frequently_used_first(tmp_path, backend):
+    store = backend(tmp_path, eviction="lfu")
+    keys = fill(store, {"a": (50, 9), "b": (10, 1), "c": (40, 1), "d": (30, 5), "e": (20, 1)})
+
+    store.gc(max_bytes=300)
+    # Count 1 entries go first, oldest first, leaving the most used ones
+    assert remaining(store, keys) == ["a", "d"]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_within_budget_evicts_nothing(tmp_path, backend):
+    store = backend(tmp_path)
+    keys = fill(store, {"a": (50, 1), "b": (10, 1)})
+
+    stats = store.gc(max_bytes=200)
+    assert stats["evicted"] == 0
+    assert remaining(store, keys) == ["a", "b"]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_max_age_evicts_old_entries_without_a_budget(tmp_path, backend):
+    store = backend(tmp_path)
+    keys = fill(store, {"a": (5000, 9), "b": (10, 1), "c": (4000, 1)})
+
+    stats = store.gc(max_age=3600)
+    assert stats["evicted"] == 2
+    assert remaining(store, keys) == ["b"]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_gc_rewrites_access_log_to_kept_entries(tmp_path, backend):
+    store = backend(tmp_path)
+    keys = fill(store, {"a": (30, 3), "b": (10, 2), "c": (40, 1)})
+
+    store.gc(max_bytes=250)
+    logged = store.access_log.read()
+    assert set(logged) == {keys["b"], keys["a"]}
+    assert logged[keys["a"]][1] == 3
+
+
+def test_unlogged_entries_count_as_accessed_when_stored(tmp_path):
+    store = FileThumbnailStore(tmp_path)
+    keys = fill(store, {"a": (10, 1), "b": (20, 1)})
+    unlogged = make_cache_key("c.jpg", "fp", "thumb-300", ".jpg")
+    store.put(unlogged, bytes(100))
+    store.access_log.flush()
+    store.access_log.rewrite({key: value for key, value in store.access_log.read().items() if key != unlogged})
+    stored = time.time() - 1000
+    os.utime(store.get_path(unlogged), (stored, stored))
+
+    store.gc(max_bytes=250)
+    assert not store.contains(unlogged)
+    assert remaining(store, keys) == ["a", "b"]
+
+
+def test_access_log_sums_lines_of_all_writers(tmp_path):
+    store = FileThumbnailStore(tmp_path)
+    key = make_cache_key("a.jpg", "fp", "thumb-300", ".jpg")
+    store.access_log.path.write_text(f"100 {key} 2\n300 {key} 1\n200 {key} 4\ngarbage\n")
+    assert store.access_log.read() == {key: [300, 7]}
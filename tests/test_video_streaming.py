@@ -0,0 +1,83 @@
+import pytest
+
+from app.video_streaming import MAX_RANGES, RANGE_COALESCE_GAP, coalesce_ranges, parse_range_header
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-499", [(0, 499)]),
+    ("bytes=0-", [(0, 999)]),
+    ("bytes=100-", [(100, 999)]),
+    ("bytes=-500", [(500, 999)]),
+    # Ends and suffixes beyond the file are clamped to it
+    ("bytes=900-2000", [(900, 999)]),
+    ("bytes=-5000", [(0, 999)]),
+    ("bytes=999-999", [(999, 999)]),
+    ("BYTES = 0-9", [(0, 9)]),
+    ("bytes=0-9, 500-509", [(0, 9), (500, 509)]),
+    # Sorted by start
+    ("bytes=500-509,0-9", [(0, 9), (500, 509)]),
+])
+def test_parse_range_header(header, expected):
+    assert parse_range_header(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=5000-6000", "bytes=-0", "bytes=1000-,2000-"])
+def test_parse_range_header_unsatisfiable(header):
+    assert parse_range_header(header, 1000) == []
+
+
+def test_parse_range_header_drops_only_unsatisfiable_ranges():
+    assert parse_range_header("bytes=0-9,2000-2100", 1000) == [(0, 9)]
+
+
+def test_parse_range_header_empty_file():
+    assert parse_range_header("bytes=-10", 0) == []
+    assert parse_range_header("bytes=0-", 0) == []
+
+
+@pytest.mark.parametrize("header", [
+    None,
+    "",
+    "items=0-10",
+    "bytes=",
+    "bytes=,",
+    "bytes=10",
+    "bytes=-",
+    "bytes=a-10",
+    "bytes=0-b",
+    "bytes=-1-2",
+    "bytes=500-100",
+    "bytes=0x10-20",
+])
+def test_parse_range_header_malformed(header):
+    assert parse_range_header(header, 1000) is None
+
+
+def test_parse_range_header_too_many_ranges():
+    spread = ",".join(f"{i * 1000}-{i * 1000 + 9}" for i in range(MAX_RANGES + 1))
+    assert parse_range_header(f"bytes={spread}", 10**6) is None
+    spread = ",".join(f"{i * 1000}-{i * 1000 + 9}" for i in range(MAX_RANGES))
+    assert len(parse_range_header(f"bytes={spread}", 10**6)) == MAX_RANGES
+
+
+def test_parse_range_header_coalesces():
+    assert parse_range_header("bytes=0-99,50-149,-10", 1000) == [(0, 149), (990, 999)]
+
+
+def test_coalesce_ranges_overlapping_and_adjacent():
+    assert coalesce_ranges([(10, 20), (0, 15)]) == [(0, 20)]
+    assert coalesce_ranges([(0, 9), (10, 19)]) == [(0, 19)]
+    # A contained range does not shrink the one containing it
+    assert coalesce_ranges([(0, 100), (10, 20)]) == [(0, 100)]
+
+
+def test_coalesce_ranges_gap_threshold():
+    end = 99
+    within = end + 1 + RANGE_COALESCE_GAP
+    assert coalesce_ranges([(0, end), (within, within + 9)]) == [(0, within + 9)]
+    beyond = within + 1
+    assert coalesce_ranges([(0, end), (beyond, beyond + 9)]) == [(0, end), (beyond, beyond + 9)]
+
+
+def test_coalesce_ranges_empty():
+    assert coalesce_ranges([]) == []